@@ -1,20 +1,48 @@
+import argparse
+import atexit
+import bisect
+import gzip
+import json
+import mmap
+import operator
 import os
+import queue
 import random
+import struct
+import subprocess
 import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from fractions import Fraction
 import pygame
+try:
+    import numpy as np
+except ImportError:  # optional: fights run without particles
+    np = None
 
 # ---------------- Constants ----------------
 SCREEN_WIDTH, SCREEN_HEIGHT = 960, 540
-FPS = 60
+FPS = 60  # simulation rate; the fight always advances in 1/FPS steps
+MAX_RENDER_FPS = 240  # render cap for the fight loop (0 = uncapped)
+MAX_STEPS_PER_FRAME = 5  # catch-up limit after a slow frame; older time is dropped
+DIRTY_RECTS = True  # fight frames restore / push only the regions that changed
 GRAVITY = 1
-ATTACK_DURATION_FRAMES = int(0.3 * FPS)  # ~0.3s at 60FPS
-PROJECTILE_SPEED = 10
-MOVE_SPEED = int(round(5 * 1.4))  # +40% player speed
-BOT_SPEED = int(round(3 * 1.4))   # +40% bot speed
+BLOCK_DIVISOR = 4    # blocked melee damage is divided by this
+# fighters, moves and projectiles (see Fighter Data); read at import, so found next to this file
+ROSTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fighters.json")
 
 IMG_PATH = "img"
 SPRITES_PATH = "sprites"
 SOUND_PATH = "sound"
+REPLAY_PATH = "replays"
+BUNDLE_PATH = "bundle"  # baked atlas of the scaled / flipped images, rebuilt when sources change
+RECORD_REPLAYS = True  # every fight writes its input log to REPLAY_PATH
+MAX_REPLAYS = 200  # the oldest replays beyond this are deleted
+TELEMETRY_PATH = "telemetry"
+TELEMETRY = True  # every fight streams its events to TELEMETRY_PATH (see telemetry_report.py)
+PARTY_FIGHTERS = 4  # Party mode: both players plus bots, 4 to 8 fighters (Settings)
 
 BACKGROUND_IMAGES = [
     "classroom.jpg",
@@ -46,33 +74,120 @@ CONTROLS = {
 }
 
 # ---------------- Audio Manager ----------------
+MIXER_FREQUENCY = 44100  # effects are resampled to this once, when decoded
+MIXER_BUFFER = 512  # samples; small, so effects land on the hit that triggered them
+SFX_CHANNELS = 6  # mixer channels the effects share
+# effect -> (priority, max simultaneous voices, min ms between two starts)
+SFX_VOICES = {
+    "special": (3, 2, 80),
+    "block": (2, 2, 60),
+    "kick": (1, 2, 50),
+    "punch": (1, 2, 50),
+}
+
+
+class VoiceManager:
+    # Budgets the mixer channels between effects. A retrigger sooner than its effect allows
+    # is dropped, an effect at its voice limit restarts its own oldest voice, and with every
+    # channel busy the oldest voice of the lowest priority not above the new one is stolen.
+    def __init__(self, voices: dict = SFX_VOICES, channels: int = SFX_CHANNELS):
+        self.voices = voices
+        pygame.mixer.set_num_channels(channels)
+        self.channels = [pygame.mixer.Channel(k) for k in range(channels)]
+        self.playing = [None] * channels  # (name, priority, started ms) last started per channel
+        self.last_start = {}
+        self.played = 0
+        self.throttled = 0  # dropped: retriggered too soon
+        self.dropped = 0    # dropped: every channel busy with higher priority voices
+        self.stolen = 0     # started by cutting another voice short
+
+    def play(self, name: str, snd, now: int | None = None) -> bool:
+        priority, limit, gap = self.voices.get(name, (0, len(self.channels), 0))
+        now = pygame.time.get_ticks() if now is None else now
+        last = self.last_start.get(name)
+        if last is not None and now - last < gap:
+            self.throttled += 1
+            return False
+        free = victim = None
+        same = []
+        for k, channel in enumerate(self.channels):
+            voice = self.playing[k]
+            if voice is None or not channel.get_busy():
+                if free is None:
+                    free = k
+                continue
+            if voice[0] == name:
+                same.append(k)
+            if voice[1] <= priority and (victim is None or voice[1:] < self.playing[victim][1:]):
+                victim = k
+        if len(same) >= limit:
+            k = min(same, key=lambda j: self.playing[j][2])
+            self.stolen += 1
+        elif free is not None:
+            k = free
+        elif victim is not None:
+            k = victim
+            self.stolen += 1
+        else:
+            self.dropped += 1
+            return False
+        self.channels[k].play(snd)
+        self.playing[k] = (name, priority, now)
+        self.last_start[name] = now
+        self.played += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "played": self.played,
+            "throttled": self.throttled,
+            "dropped": self.dropped,
+            "stolen": self.stolen,
+            "busy": sum(1 for c in self.channels if c.get_busy()),
+        }
+
+
 class AudioManager:
-    def __init__(self, sound_dir: str, music_file: str, sfx_volume: float = 0.8, music_volume: float = 0.6):
+    SFX_FILES = {
+        "punch": "punch.wav",
+        "kick": "kick.wav",
+        "special": "special.wav",
+        "block": "block.wav",
+    }
+
+    def __init__(self, sound_dir: str, music_file: str, sfx_volume: float = 0.8, music_volume: float = 0.6,
+                 load_effects: bool = True):
+        # load_effects=False: the effects arrive later through add_sfx (see Preloader)
         self.sound_dir = sound_dir
         self.music_file = music_file
         self._music_volume = max(0.0, min(1.0, music_volume))
         self._muted = False
+        self._music_started = False
         self.sfx = {}
-        self._load_effects()
+        try:
+            self.voices = VoiceManager()
+        except pygame.error:
+            self.voices = None  # no mixer: effects stay silent
+        if load_effects:
+            self._load_effects()
         self._load_music()
 
+    def sfx_paths(self) -> dict:
+        return {name: os.path.join(self.sound_dir, file) for name, file in self.SFX_FILES.items()}
+
     def _load_effects(self):
-        mapping = {
-            "punch": "punch.wav",
-            "kick": "kick.wav",
-            "special": "special.wav",
-            "block": "block.wav",
-        }
-        for name, file in mapping.items():
-            path = os.path.join(self.sound_dir, file)
+        for name, path in self.sfx_paths().items():
             if os.path.exists(path):
                 try:
-                    snd = pygame.mixer.Sound(path)
-                    snd.set_volume(0.8)
-                    self.sfx[name] = snd
+                    self.add_sfx(name, pygame.mixer.Sound(path))
                 except Exception:
                     pass
 
+    def add_sfx(self, name: str, snd):
+        if snd is not None:
+            snd.set_volume(0.8)
+            self.sfx[name] = snd
+
     def _load_music(self):
         try:
             if os.path.exists(self.music_file):
@@ -84,6 +199,23 @@ class AudioManager:
     def play_music(self, loop: int = -1):
         try:
             pygame.mixer.music.play(loop)
+            self._music_started = True
+        except Exception:
+            pass
+
+    def pause_music(self):
+        # between fights: paused rather than stopped, the stream stays open and warm
+        try:
+            pygame.mixer.music.pause()
+        except Exception:
+            pass
+
+    def resume_music(self, loop: int = -1):
+        if not self._music_started:
+            self.play_music(loop)
+            return
+        try:
+            pygame.mixer.music.unpause()
         except Exception:
             pass
 
@@ -107,15 +239,63 @@ class AudioManager:
 
     def play_sfx(self, name: str):
         snd = self.sfx.get(name)
-        if snd:
+        if snd and self.voices:
             try:
-                snd.play()
+                self.voices.play(name, snd)
             except Exception:
                 pass
 
 
 audio_manager: AudioManager | None = None
 
+# ---------------- Display ----------------
+# Everything is drawn on a fixed canvas, the display surface, and SDL's renderer scales it
+# to the window (pygame.SCALED): no per-frame scaling on the CPU. Menus and the HUD are laid
+# out for SCREEN_WIDTH x SCREEN_HEIGHT and placed through ui(); the sim never sees the canvas.
+RENDER_SCALE = 1.0  # canvas size relative to SCREEN_WIDTH x SCREEN_HEIGHT; lower for weak machines
+RENDER_SCALES = (1.0, 0.75, 0.5)
+DISPLAY_SCALING = "integer"  # "integer": whole multiples, sharp pixels; "letterbox": fill, keeping the aspect ratio
+DISPLAY_SCALINGS = ("integer", "letterbox")
+DISPLAY_FULLSCREEN = False  # fullscreen always fills the screen, letterboxed
+FULLSCREEN_KEY = pygame.K_F11
+
+
+def canvas_size() -> tuple:
+    return round(SCREEN_WIDTH * RENDER_SCALE), round(SCREEN_HEIGHT * RENDER_SCALE)
+
+
+def ui(value: float) -> int:
+    # layout value (SCREEN_WIDTH x SCREEN_HEIGHT units) -> canvas pixels
+    return round(value * RENDER_SCALE)
+
+
+def open_display() -> pygame.Surface:
+    # (re)opens the window for the current settings; pygame can only set up a SCALED
+    # renderer once per display init, so changing them restarts the display module
+    if pygame.display.get_surface() is not None:
+        pygame.display.quit()
+        pygame.display.init()
+    # pygame's switch between whole-multiple and fractional SCALED sizes
+    if DISPLAY_SCALING == "letterbox":
+        os.environ["SDL_HINT_RENDER_SCALE_QUALITY"] = "1"
+    else:
+        os.environ.pop("SDL_HINT_RENDER_SCALE_QUALITY", None)
+    flags = pygame.SCALED | (pygame.FULLSCREEN if DISPLAY_FULLSCREEN else pygame.RESIZABLE)
+    try:
+        screen = pygame.display.set_mode(canvas_size(), flags)
+    except pygame.error:
+        # no renderer to scale with: a plain window the size of the canvas
+        screen = pygame.display.set_mode(canvas_size())
+    pygame.display.set_caption("School Fighter")
+    return screen
+
+
+def toggle_fullscreen() -> pygame.Surface:
+    global DISPLAY_FULLSCREEN
+    DISPLAY_FULLSCREEN = not DISPLAY_FULLSCREEN
+    return open_display()
+
+
 # ---------------- Helpers ----------------
 
 def load_image(path: str) -> pygame.Surface:
@@ -130,441 +310,2591 @@ def scale_to_height(img: pygame.Surface, target_h: int) -> pygame.Surface:
 
 
 def draw_text(surface, text, size, x, y, color=(255, 255, 255)):
-    font = pygame.font.SysFont("arial", size)
-    txt = font.render(text, True, color)
-    surface.blit(txt, (x, y))
+    # size and position in layout units, see ui()
+    surface.blit(text_cache.render(text, ui(size), color), (ui(x), ui(y)))
+
+
+def draw_health_bar(surface, x, y, health, width=200, height=20, full=100):
+    health = max(0, min(full, int(health)))
+    pygame.draw.rect(surface, (255, 0, 0), (x, y, width, height))
+    pygame.draw.rect(surface, (0, 255, 0), (x, y, width * health // full, height))
+
+
+# ---------------- Asset Cache ----------------
+class AssetCache:
+    # Decoded + scaled Surfaces shared process-wide, keyed by (path, height, size, flip, alpha)
+    def __init__(self):
+        self._surfaces = {}
+        self._decoded = {}  # path -> surface decoded off the main thread, not converted yet
+        self.bundle = None  # AssetBundle consulted before any file is decoded
+        self.hits = 0
+        self.misses = 0
+        self.baked = 0
+
+    def provide(self, path: str, decoded: pygame.Surface):
+        self._decoded[path] = decoded
+
+    def drop_decoded(self, path: str):
+        self._decoded.pop(path, None)
+
+    def get(self, path: str, height: int | None = None, size: tuple | None = None,
+            flip: bool = False, alpha: bool = True, fallback=None) -> pygame.Surface:
+        key = (path, height, size, flip, alpha)
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            return surf
+        self.misses += 1
+        if self.bundle is not None:
+            surf = self.bundle.get(key)
+            if surf is not None:
+                self.baked += 1
+                self._surfaces[key] = surf
+                return surf
+        if flip:
+            # mirror the cached unflipped variant instead of decoding again
+            surf = pygame.transform.flip(self.get(path, height, size, False, alpha, fallback), True, False)
+        else:
+            decoded = self._decoded.get(path)
+            if decoded is not None:
+                img = decoded.convert_alpha() if alpha else decoded.convert()
+            elif os.path.exists(path):
+                img = load_image(path) if alpha else pygame.image.load(path).convert()
+            elif fallback is not None:
+                img = fallback()
+            else:
+                raise FileNotFoundError(path)
+            if size is not None:
+                img = pygame.transform.smoothscale(img, size)
+            elif height is not None:
+                img = scale_to_height(img, height)
+            surf = img
+        self._surfaces[key] = surf
+        return surf
+
+    def evict(self, prefix: str, keep: str | None = None) -> int:
+        # drop every entry whose path starts with prefix (e.g. stage backgrounds on stage change)
+        doomed = [k for k in self._surfaces if k[0].startswith(prefix) and k[0] != keep]
+        for k in doomed:
+            del self._surfaces[k]
+        return len(doomed)
+
+    def purge(self):
+        self._surfaces.clear()
+        self._decoded.clear()
+
+    def memory_bytes(self) -> int:
+        # atlas frames share their parent's pixels, count only their own rows
+        return sum((s.get_pitch() if s.get_parent() is None else s.get_width() * s.get_bytesize())
+                   * s.get_height() for s in self._surfaces.values())
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "baked": self.baked,
+            "entries": len(self._surfaces),
+            "bytes": self.memory_bytes(),
+        }
 
 
-def draw_health_bar(surface, x, y, health):
-    health = max(0, min(100, int(health)))
-    pygame.draw.rect(surface, (255, 0, 0), (x, y, 200, 20))
-    pygame.draw.rect(surface, (0, 255, 0), (x, y, 2 * health, 20))
+assets = AssetCache()
+
+
+# ---------------- Text Cache ----------------
+class TextCache:
+    # SysFont objects per size, plus a bounded LRU of rendered labels keyed by (text, size, color)
+    def __init__(self, max_entries: int = 256, font_name: str = "arial"):
+        self.max_entries = max_entries
+        self.font_name = font_name
+        self._fonts = {}
+        self._surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size: int) -> pygame.font.Font:
+        font = self._fonts.get(size)
+        if font is None:
+            font = self._fonts[size] = pygame.font.SysFont(self.font_name, size)
+        return font
+
+    def render(self, text: str, size: int, color=(255, 255, 255)) -> pygame.Surface:
+        key = (text, size, tuple(color))
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = self.font(size).render(text, True, color)
+        self._surfaces[key] = surf
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self._fonts.clear()
+        self._surfaces.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "fonts": len(self._fonts),
+            "entries": len(self._surfaces),
+        }
 
 
-# ---------------- Sprites Loading ----------------
+text_cache = TextCache()
+
+
+# ---------------- Fighter Data ----------------
+# Fighters, their moves and projectiles come from ROSTER_PATH. A fighter may name a "base"
+# it inherits from, overriding single fields or single actions. An action with a "duration"
+# is a move. Hurtboxes are [width, height] fractions of the sprite frame, centered and
+# standing on its bottom edge: one per fighter, per action, or per frame ("hurtboxes").
+# Each fighter is compiled against its sprite sizes into flat per-tick tables, so the sim
+# only ever indexes them.
+
+def merge_spec(base: dict, over: dict) -> dict:
+    # over's fields replace base's; actions are merged one by one
+    out = dict(base, **over)
+    actions = {name: dict(spec) for name, spec in base.get("actions", {}).items()}
+    for name, spec in over.get("actions", {}).items():
+        actions[name] = dict(actions.get(name, {}), **spec)
+    out["actions"] = actions
+    return out
+
+
+def resolve_fighters(specs: dict) -> dict:
+    out = {}
+
+    def resolve(name: str) -> dict:
+        if name not in out:
+            spec = specs[name]
+            out[name] = merge_spec(resolve(spec["base"]), spec) if "base" in spec else spec
+        return out[name]
+
+    for name in specs:
+        resolve(name)
+    return out
+
+
+def load_roster(path: str = ROSTER_PATH) -> dict:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+ROSTER_DATA = load_roster()  # as read; tournament.py tunes copies of it
+ROSTER = {}  # fighter name -> spec with its base merged in
+PROJECTILES = {}  # projectile kind -> spec
+_fighter_tables = {}  # (name, frame sizes) -> FighterData
+_projectile_tables = {}  # kind -> ProjectileData
+
 
-def load_sprites() -> dict:
-    def frames(prefix: str, action: str, idx=None, single=False):
-        out = []
-        if single:
-            p = os.path.join(SPRITES_PATH, f"{prefix}_{action}.png")
-            if os.path.exists(p):
-                out.append(load_image(p))
+def set_roster(data: dict):
+    global ROSTER, PROJECTILES
+    ROSTER = resolve_fighters(data["fighters"])
+    PROJECTILES = data["projectiles"]
+    _fighter_tables.clear()
+    _projectile_tables.clear()
+
+
+set_roster(ROSTER_DATA)
+
+
+def fraction(value) -> Fraction:
+    # "1/3", 0.5 or 1, exactly: int(size * fraction) never lands one pixel off
+    return Fraction(str(value))
+
+
+class MoveData:
+    __slots__ = ("name", "duration", "cooldown", "damage", "launch")
+
+    def __init__(self, name: str, spec: dict):
+        self.name = name
+        self.duration = spec["duration"]  # ticks the move locks the fighter in
+        self.cooldown = spec.get("cooldown", 0)
+        self.damage = spec.get("damage", 0)  # melee, dealt when the move starts
+        self.launch = spec.get("launch", 0)  # ticks until the fighter's projectile leaves; 0 = melee
+
+
+class ProjectileData:
+    __slots__ = ("kind", "size", "hit", "speed", "damage")
+
+    def __init__(self, kind: str, spec: dict, size: tuple):
+        self.kind = kind
+        self.size = size
+        w, h = spec.get("hitbox", (1, 1))
+        self.hit = (max(1, int(size[0] * fraction(w))), max(1, int(size[1] * fraction(h))))
+        self.speed = spec["speed"]
+        self.damage = spec["damage"]
+
+
+class FighterData:
+    # One roster entry compiled for the sim. fit[action][attack_frames_left] is the frame's
+    # (w, h, hurtbox offsets from (cx, bottom)), frames[action][attack_frames_left] its index
+    __slots__ = ("name", "health", "walk_speed", "bot_speed", "jump_velocity", "max_jumps", "projectile",
+                 "projectile_dy", "moves", "bot_moves", "frames", "fit", "widest")
+
+    def __init__(self, name: str, spec: dict, sizes: dict):
+        self.name = name
+        self.health = spec["health"]
+        self.walk_speed = spec["walk_speed"]
+        self.bot_speed = spec["bot_speed"]
+        self.jump_velocity = spec["jump_velocity"]
+        self.max_jumps = spec["max_jumps"]
+        self.projectile = projectile_data(spec["projectile"])
+        self.projectile_dy = spec.get("projectile_dy", 0)
+        actions = spec["actions"]
+        self.moves = {action: MoveData(action, a) for action, a in actions.items() if "duration" in a}
+        self.bot_moves = tuple(self.moves)  # what a bot picks from
+        self.widest = max(w for frame_sizes in sizes.values() for w, _ in frame_sizes)
+        # every table covers the longest move: blocking can interrupt any of them
+        longest = max((move.duration for move in self.moves.values()), default=0)
+        self.frames, self.fit = {}, {}
+        for action, a in actions.items():
+            frame_sizes = sizes[action]
+            ticks = frame_ticks(a, len(frame_sizes), longest)
+            boxes = list(a.get("hurtboxes") or [a.get("hurtbox", spec.get("hurtbox", (1, 1)))])
+            boxes += boxes[-1:] * (len(frame_sizes) - len(boxes))
+            fits = []
+            for (w, h), (bw, bh) in zip(frame_sizes, boxes):
+                bw, bh = int(w * fraction(bw)), int(h * fraction(bh))
+                fits.append((w, h, (-(w // 2) + (w - bw) // 2, -bh, bw, bh)))
+            self.frames[action] = ticks
+            self.fit[action] = tuple(fits[t] for t in ticks)
+
+
+def frame_ticks(action: dict, n_frames: int, longest: int) -> tuple:
+    # an "animate" move steps through its frames over its duration, everything else
+    # shows its first frame
+    duration = action.get("duration", 0)
+    if not action.get("animate") or n_frames <= 1 or duration <= 0:
+        return (0,) * (longest + 1)
+    out = []
+    for left in range(longest + 1):
+        elapsed = max(0, duration - left)
+        out.append(min(n_frames - 1, int(elapsed / duration * n_frames)))
+    return tuple(out)
+
+
+def projectile_data(kind: str) -> ProjectileData:
+    data = _projectile_tables.get(kind)
+    if data is None:
+        # also warms the image, so the first special does not decode mid-frame
+        data = _projectile_tables[kind] = ProjectileData(kind, PROJECTILES[kind], projectile_image(kind).get_size())
+    return data
+
+
+def fighter_data(name: str, sprite_set: dict) -> FighterData:
+    # compiled once per roster and set of frame sizes; the sim uses the scale 1 sprites
+    sizes = {action: anim.sizes for action, anim in sprite_set.items()}
+    key = (name, tuple(sizes.items()))
+    data = _fighter_tables.get(key)
+    if data is None:
+        data = _fighter_tables[key] = FighterData(name, ROSTER[name], sizes)
+    return data
+
+
+# ---------------- Sprites Loading ----------------
+class AnimFrames:
+    # Both facings of every frame of one action; which frame shows on a given tick comes
+    # from the fighter's FighterData, so animate() is a pure table lookup
+    __slots__ = ("right", "left", "offsets", "sizes")
+
+    def __init__(self, right, left):
+        self.right = tuple(right)
+        self.left = tuple(left)
+        # topleft relative to midbottom anchor, matching get_rect(midbottom=...)
+        self.sizes = tuple(img.get_size() for img in self.right)
+        self.offsets = tuple((-(w // 2), -h) for w, h in self.sizes)
+
+
+def sprite_prefix(name: str) -> str:
+    # a fighter whose sprites are missing borrows its base's
+    spec = ROSTER[name]
+    if "base" in spec and not os.path.exists(os.path.join(SPRITES_PATH, f"{spec['sprites']}_idle.png")):
+        return sprite_prefix(spec["base"])
+    return spec["sprites"]
+
+
+def sprite_paths(name: str, action: str) -> list:
+    # the action's frame numbers in the file names, a single unnumbered frame without them
+    idx = ROSTER[name]["actions"][action].get("frames")
+    prefix = sprite_prefix(name)
+    names = [f"{prefix}_{action}.png"] if idx is None else [f"{prefix}_{action}{i}.png" for i in idx]
+    return [p for p in (os.path.join(SPRITES_PATH, n) for n in names) if os.path.exists(p)]
+
+
+def load_sprites(scale: float = 1.0) -> dict:
+    # fighter name -> action -> AnimFrames. scale != 1: frames for a smaller canvas; the sim
+    # always takes its geometry from scale 1
+    def frames(name: str, action: str, target_h: int) -> AnimFrames:
+        paths = sprite_paths(name, action)
+        if paths:
+            right = [assets.get(p, height=target_h) for p in paths]
+            left = [assets.get(p, height=target_h, flip=True) for p in paths]
         else:
-            for i in (idx or []):
-                p = os.path.join(SPRITES_PATH, f"{prefix}_{action}{i}.png")
-                if os.path.exists(p):
-                    out.append(load_image(p))
-        return out if out else [pygame.Surface((64, 64), pygame.SRCALPHA)]
-
-    target_h = 140  # reduce size to fit gameplay
-
-    def build(prefix: str):
-        data = {
-            "idle": frames(prefix, "idle", single=True),
-            "walk": frames(prefix, "walk", idx=[0, 1, 2]),
-            "jump": frames(prefix, "jump", single=True),
-            "punch": frames(prefix, "punch", idx=[0, 1, 2]),
-            "kick": frames(prefix, "kick", idx=[0, 1, 2]),
-            # special now explicitly uses 4 frames 0..3
-            "special": frames(prefix, "special", idx=[0, 1, 2, 3]),
-            "block": frames(prefix, "block", single=True),
-        }
-        # scale
-        for k in list(data.keys()):
-            data[k] = [scale_to_height(img, target_h) for img in data[k]]
-        return data
-
-    return {
-        "player1": build("player1"),
-        # If player2 sprites don't exist, fallback to player1 assets
-        "player2": build("player2") if os.path.exists(os.path.join(SPRITES_PATH, "player2_idle.png")) else build("player1"),
-    }
+            blank = scale_to_height(pygame.Surface((64, 64), pygame.SRCALPHA), target_h)
+            right, left = [blank], [blank]
+        return AnimFrames(right, left)
+
+    def build(name: str):
+        target_h = round(ROSTER[name]["height"] * scale)
+        return {action: frames(name, action, target_h) for action in ROSTER[name]["actions"]}
+
+    return {name: build(name) for name in ROSTER}
 
 
 # ---------------- Projectile ----------------
-class Projectile(pygame.sprite.Sprite):
-    def __init__(self, x, y, direction: int, kind: str):
-        super().__init__()
-        self.kind = kind
-        img_file = "fireball.png" if kind == "fireball" else "lightning.png"
-        path = os.path.join(SPRITES_PATH, img_file)
+def projectile_image(kind: str, scale: float = 1.0) -> pygame.Surface:
+    spec = PROJECTILES[kind]
+    path = os.path.join(SPRITES_PATH, spec["image"])
+
+    def placeholder():
+        img = pygame.Surface((32, 16), pygame.SRCALPHA)
+        pygame.draw.circle(img, spec["placeholder"], (16, 8), 8)
+        return img
+
+    # shared, decoded once
+    return assets.get(path, height=round(spec["height"] * scale), fallback=placeholder)
+
+
+# ---------------- Asset Bundle ----------------
+BUNDLE_VERSION = 1
+ATLAS_WIDTH = 1024
+
+
+def bundle_manifest() -> list:
+    # every AssetCache key a fight can ask for: (path, height, size, flip, alpha)
+    keys = []
+    for name, spec in ROSTER.items():
+        for action in spec["actions"]:
+            for path in sprite_paths(name, action):
+                keys += [(path, spec["height"], None, False, True), (path, spec["height"], None, True, True)]
+    for spec in PROJECTILES.values():
+        path = os.path.join(SPRITES_PATH, spec["image"])
         if os.path.exists(path):
-            img = load_image(path)
+            keys.append((path, spec["height"], None, False, True))
+    keys = list(dict.fromkeys(keys))  # fighters sharing sprites
+    for stage in BACKGROUND_IMAGES:
+        path = os.path.join(IMG_PATH, stage)
+        if os.path.exists(path):
+            keys.append((path, None, (SCREEN_WIDTH, SCREEN_HEIGHT), False, False))
+    return keys
+
+
+def bundle_sources(keys: list) -> dict:
+    # path -> [size, mtime_ns]; any difference means the bundle is stale
+    out = {}
+    for key in keys:
+        if key[0] not in out:
+            st = os.stat(key[0])
+            out[key[0]] = [st.st_size, st.st_mtime_ns]
+    return out
+
+
+def bundle_key(entry: list) -> tuple:
+    path, height, size, flip, alpha = entry[:5]
+    return (path, height, tuple(size) if size else None, flip, alpha)
+
+
+class AssetBundle:
+    # Pre-scaled, pre-flipped images baked into one raw file: an RGBA atlas of every sprite
+    # and projectile frame, then each stage background as RGB rows. assets.json indexes it.
+    # Opening maps the file; the atlas is one frombuffer + convert and frames are subsurfaces.
+    def __init__(self, directory: str, index: dict):
+        self.directory = directory
+        with open(os.path.join(directory, "assets.bin"), "rb") as fh:
+            self.data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) != index["bytes"]:
+            raise ValueError("truncated bundle")
+        w, h = index["atlas"]
+        atlas = pygame.image.frombuffer(memoryview(self.data)[:w * h * 4], (w, h), "RGBA")
+        self.atlas = atlas.convert_alpha()
+        self.frames = {bundle_key(e): pygame.Rect(e[5:9]) for e in index["frames"]}
+        self.blobs = {bundle_key(e): e[5:8] for e in index["blobs"]}
+        self.paths = {k[0] for k in self.frames} | {k[0] for k in self.blobs}
+
+    @classmethod
+    def open(cls, directory: str = BUNDLE_PATH):
+        # None when missing, unreadable or stale against the source images
+        try:
+            with open(os.path.join(directory, "assets.json")) as fh:
+                index = json.load(fh)
+            keys = bundle_manifest()
+            if (index.get("version") != BUNDLE_VERSION
+                    or {bundle_key(e) for e in index["frames"] + index["blobs"]} != set(keys)
+                    or index["sources"] != bundle_sources(keys)):
+                return None
+            return cls(directory, index)
+        except (OSError, ValueError, KeyError, TypeError, pygame.error):
+            return None
+
+    def get(self, key: tuple) -> pygame.Surface | None:
+        rect = self.frames.get(key)
+        if rect is not None:
+            return self.atlas.subsurface(rect)
+        blob = self.blobs.get(key)
+        if blob is not None:
+            offset, w, h = blob
+            return pygame.image.frombuffer(memoryview(self.data)[offset:offset + w * h * 3], (w, h), "RGB").convert()
+        return None
+
+
+def bake_bundle(directory: str = BUNDLE_PATH) -> AssetBundle:
+    # renders every manifest entry through the loose-file path, so baked pixels are identical
+    keys = bundle_manifest()
+    loose = AssetCache()
+    frames = [(k, loose.get(*k)) for k in keys if k[4]]
+    blobs = [(k, loose.get(*k)) for k in keys if not k[4]]
+    # shelf packing, tallest first
+    placed = []
+    x = y = shelf = 0
+    for key, img in sorted(frames, key=lambda e: -e[1].get_height()):
+        w, h = img.get_size()
+        if x + w > ATLAS_WIDTH:
+            x, y, shelf = 0, y + shelf, 0
+        placed.append((key, img, x, y))
+        x += w
+        shelf = max(shelf, h)
+    atlas = pygame.Surface((ATLAS_WIDTH, max(1, y + shelf)), pygame.SRCALPHA)
+    index = {"version": BUNDLE_VERSION, "sources": bundle_sources(keys), "atlas": list(atlas.get_size()),
+             "frames": [], "blobs": []}
+    for key, img, x, y in placed:
+        atlas.blit(img, (x, y), special_flags=pygame.BLEND_RGBA_MAX)  # straight copy onto zeroed pixels
+        index["frames"].append(list(key) + [x, y, *img.get_size()])
+    chunks = [pygame.image.tobytes(atlas, "RGBA")]
+    offset = len(chunks[0])
+    for key, img in blobs:
+        chunks.append(pygame.image.tobytes(img, "RGB"))
+        index["blobs"].append(list(key) + [offset, *img.get_size()])
+        offset += len(chunks[-1])
+    index["bytes"] = offset
+    os.makedirs(directory, exist_ok=True)
+    # data first, index last: a bundle interrupted mid-bake reads as stale, never as corrupt
+    for name, write in (("assets.bin", lambda fh: fh.writelines(chunks)),
+                        ("assets.json", lambda fh: fh.write(json.dumps(index).encode()))):
+        tmp = os.path.join(directory, name + ".tmp")
+        with open(tmp, "wb") as fh:
+            write(fh)
+        os.replace(tmp, os.path.join(directory, name))
+    return AssetBundle(directory, index)
+
+
+def load_bundle(directory: str = BUNDLE_PATH) -> AssetBundle | None:
+    # the baked bundle, rebaked if the source images changed; None falls back to loose files
+    bundle = AssetBundle.open(directory)
+    if bundle is None:
+        try:
+            bundle = bake_bundle(directory)
+        except (OSError, pygame.error):
+            return None  # e.g. read-only install
+    return bundle
+
+
+def bake_in_background() -> subprocess.Popen | None:
+    # rebakes the bundle in a headless child (`--bake`) so the first frame never waits on it:
+    # this session reads the loose files through the Preloader, the next launch maps the bundle
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    try:
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--bake"], env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+
+
+# ---------------- Preloader ----------------
+class Preloader:
+    # Decodes image files and sound buffers on a worker thread while the menu runs. The main
+    # thread, which owns the display, finishes each one (convert / scale into the asset cache)
+    # through pump(), a few per frame, or all at once with finish()
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.ready = queue.Queue()
+        self.total = 0
+        self.finished = 0
+        self.thread = threading.Thread(target=self._work, name="preloader", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def add_image(self, path: str, finish):
+        # finish() runs on the main thread once the decoded copy is in the asset cache
+        if assets.bundle is not None and path in assets.bundle.paths:
+            finish()  # baked: nothing to decode
+            return
+        self.total += 1
+        self.jobs.put((path, False, finish))
+
+    def add_sound(self, path: str, finish):
+        # finish(sound) runs on the main thread, with None when the file could not be decoded
+        self.total += 1
+        self.jobs.put((path, True, finish))
+
+    @property
+    def done(self) -> bool:
+        return self.finished >= self.total
+
+    @property
+    def progress(self) -> float:
+        return self.finished / self.total if self.total else 1.0
+
+    def _work(self):
+        while True:
+            path, sound, finish = self.jobs.get()
+            try:
+                data = pygame.mixer.Sound(path) if sound else pygame.image.load(path)
+            except Exception:
+                data = None  # missing or broken: the main thread falls back as it always did
+            self.ready.put((path, sound, finish, data))
+
+    def _complete(self, job: tuple):
+        path, sound, finish, data = job
+        if sound:
+            finish(data)
         else:
-            img = pygame.Surface((32, 16), pygame.SRCALPHA)
-            pygame.draw.circle(img, (255, 140, 0) if kind == "fireball" else (150, 200, 255), (16, 8), 8)
-        # Enlarge special projectiles by 4x compared to previous height
-        self.image = scale_to_height(img, 40 * 4)
-        self.rect = self.image.get_rect(center=(x, y))
-        self.vx = PROJECTILE_SPEED * direction
-
-    def update(self):
-        self.rect.x += self.vx
-        if self.rect.right < 0 or self.rect.left > SCREEN_WIDTH:
-            self.kill()
-
-    def get_hitbox(self) -> pygame.Rect:
-        # Return a reduced hitbox (1/3 width and height), centered on projectile
-        hb = self.rect.copy()
-        new_w = max(1, hb.width // 3)
-        new_h = max(1, hb.height // 3)
-        hb.x += (hb.width - new_w) // 2
-        hb.y += (hb.height - new_h) // 2
-        hb.width = new_w
-        hb.height = new_h
-        return hb
+            if data is not None:
+                assets.provide(path, data)
+            finish()
+            assets.drop_decoded(path)
+        self.finished += 1
+
+    def pump(self, budget_ms: float = 8.0) -> bool:
+        # finish what the worker has decoded so far; True when progress was made
+        deadline = time.perf_counter() + budget_ms / 1000
+        progressed = False
+        while time.perf_counter() < deadline:
+            try:
+                job = self.ready.get_nowait()
+            except queue.Empty:
+                break
+            self._complete(job)
+            progressed = True
+        return progressed
+
+    def finish(self):
+        # block until everything queued so far is ready
+        while not self.done:
+            self._complete(self.ready.get())
+
+
+def queue_fight_assets(preloader: Preloader, audio: AudioManager | None):
+    # what the first fight needs: every sprite frame in both facings, projectiles, effects;
+    # on a smaller canvas also the frames drawn at its scale
+    queued = set()
+    for name, spec in ROSTER.items():
+        heights = {spec["height"], round(spec["height"] * RENDER_SCALE)}
+        for action in spec["actions"]:
+            for path in sprite_paths(name, action):
+                if (path, spec["height"]) not in queued:
+                    queued.add((path, spec["height"]))
+                    preloader.add_image(path, lambda p=path, hs=heights: [
+                        (assets.get(p, height=h), assets.get(p, height=h, flip=True)) for h in hs])
+    for kind, spec in PROJECTILES.items():
+        preloader.add_image(os.path.join(SPRITES_PATH, spec["image"]),
+                            lambda k=kind: (projectile_image(k), projectile_image(k, RENDER_SCALE)))
+    if audio:
+        for name, path in audio.sfx_paths().items():
+            if os.path.exists(path):
+                preloader.add_sound(path, lambda snd, n=name: audio.add_sfx(n, snd))
 
 
-# ---------------- Player ----------------
-class Player(pygame.sprite.Sprite):
-    def __init__(self, x, y, controls, sprites, facing_right=True, is_p1=True):
-        super().__init__()
-        self.controls = controls
-        self.sprites = sprites
+def prefetch_stage(preloader: Preloader, seed: int):
+    # the next fight's stage is known from its seed, so it can be decoded while in the menu
+    stage, _ = pick_stage(seed)
+    preloader.add_image(os.path.join(IMG_PATH, stage), lambda: load_stage(stage))
+
+
+# ---------------- Simulation ----------------
+# Render-free fight logic: plain state objects advanced by step(), which returns events
+# for audio / render instead of touching pygame. Geometry mirrors the pygame.Rect math
+# the sprites used (midbottom anchored fighters, centered projectiles).
+
+ACTIONS = ("left", "right", "jump", "punch", "kick", "special", "block")
+IN_LEFT, IN_RIGHT, IN_JUMP, IN_PUNCH, IN_KICK, IN_SPECIAL, IN_BLOCK = (1 << i for i in range(len(ACTIONS)))
+GROUND_Y = SCREEN_HEIGHT - 50
+
+
+def read_input(keys, controls: dict) -> int:
+    # pygame key state -> bitmask of ACTIONS
+    mask = 0
+    for bit, action in enumerate(ACTIONS):
+        if keys[controls[action]]:
+            mask |= 1 << bit
+    return mask
+
+
+class FighterState:
+    __slots__ = (
+        "cx", "bottom", "w", "h", "vel_y", "facing_right", "on_ground", "health", "blocking",
+        "attack_cooldown", "attack_frames_left", "pending_projectile_frames", "max_jumps",
+        "jumps_used", "jump_was_down", "state", "is_bot", "box", "data",
+    )
+
+    def __init__(self, x, y, data: FighterData, facing_right=True, is_bot=False):
+        self.data = data
         self.state = "idle"
-        self.image = self.sprites["idle"][0]
-        self.rect = self.image.get_rect(midbottom=(x, y))
+        self.attack_frames_left = 0
+        self.cx, self.bottom = x, y
+        self.fit_frame()
         self.facing_right = facing_right
         self.vel_y = 0
         self.on_ground = True
-        self.health = 100
+        self.health = data.health
         self.blocking = False
         self.attack_cooldown = 0
-        self.attack_frames_left = 0
-        self.projectiles = pygame.sprite.Group()
-        self.is_p1 = is_p1
+        self.pending_projectile_frames = 0
+        self.is_bot = is_bot
         # double jump
-        self.max_jumps = 2
+        self.max_jumps = data.max_jumps
         self.jumps_used = 0
         self.jump_was_down = False
-        # delayed projectile spawn for specials
-        self.pending_projectile_frames = 0
 
-    def get_hurtbox(self) -> pygame.Rect:
-        hb = self.rect.copy()
-        new_w = hb.width // 2
-        hb.x += (hb.width - new_w) // 2
-        hb.width = new_w
-        return hb
-
-    def update(self, keys, opponent):
-        # projectiles
-        self.projectiles.update()
-
-        # movement disabled during attack execution window
-        moving = False
-        if self.attack_frames_left <= 0:
-            if keys[self.controls["left"]]:
-                self.rect.x -= MOVE_SPEED
-                self.facing_right = False
-                self.state = "walk"
-                moving = True
-            if keys[self.controls["right"]]:
-                self.rect.x += MOVE_SPEED
-                self.facing_right = True
-                self.state = "walk"
-                moving = True
-
-        # jump
-        jump_now = keys[self.controls["jump"]]
-        if jump_now and not self.jump_was_down:
-            # allow double jump (max 2 jumps before touching ground again)
-            if self.jumps_used < self.max_jumps and self.attack_frames_left <= 0:
-                self.vel_y = -15
-                self.on_ground = False
-                self.state = "jump"
-                self.jumps_used += 1
-        # update jump edge flag
-        self.jump_was_down = jump_now
-
-        # attacks
-        if self.attack_cooldown > 0:
-            self.attack_cooldown -= 1
-        if self.attack_frames_left > 0:
-            self.attack_frames_left -= 1
-        # handle delayed projectile spawn irrespective of special state
-        if self.pending_projectile_frames > 0:
-            self.pending_projectile_frames -= 1
-            if self.pending_projectile_frames == 0:
-                self.spawn_projectile_now()
-
-        if self.attack_frames_left <= 0 and self.attack_cooldown == 0:
-            if keys[self.controls["punch"]]:
-                self.state = "punch"
-                self.attack_frames_left = ATTACK_DURATION_FRAMES
-                self.attack_cooldown = 10
-                if audio_manager: audio_manager.play_sfx("punch")
-                self.melee_attack(opponent, 10)
-            elif keys[self.controls["kick"]]:
-                self.state = "kick"
-                self.attack_frames_left = ATTACK_DURATION_FRAMES
-                self.attack_cooldown = 10
-                if audio_manager: audio_manager.play_sfx("kick")
-                self.melee_attack(opponent, 15)
-            elif keys[self.controls["special"]]:
-                self.state = "special"
-                self.attack_frames_left = ATTACK_DURATION_FRAMES
-                self.attack_cooldown = 30
-                # delay projectile launch by 0.5s
-                self.pending_projectile_frames = int(0.5 * FPS)
-                if audio_manager: audio_manager.play_sfx("special")
-
-        # when an attack animation ends, return to idle sprite
-        if self.attack_frames_left == 0 and self.state in ("punch", "kick", "special") and not self.blocking:
-            # If special still waiting to spawn, keep special pose until spawn, then reset in spawn_projectile_now
-            if not (self.state == "special" and self.pending_projectile_frames > 0):
-                # reset to idle if not moving/jumping
-                if self.on_ground and not (keys[self.controls["left"]] or keys[self.controls["right"]]):
-                    self.state = "idle"
-
-        # blocking
-        self.blocking = keys[self.controls["block"]]
-        if self.blocking:
-            self.state = "block"
-
-        # gravity
-        self.vel_y += GRAVITY
-        self.rect.y += self.vel_y
-        if self.rect.bottom >= SCREEN_HEIGHT - 50:
-            self.rect.bottom = SCREEN_HEIGHT - 50
-            self.vel_y = 0
-            self.on_ground = True
-            self.jumps_used = 0  # reset double jump when touching ground
-
-        # screen bounds
-        if self.rect.left < 0:
-            self.rect.left = 0
-        if self.rect.right > SCREEN_WIDTH:
-            self.rect.right = SCREEN_WIDTH
-
-        # animation (cycle special frames over its duration)
-        self.animate()
-
-    def melee_attack(self, opponent, damage):
-        hitbox = self.get_hurtbox()  # narrower width
-        if hitbox.colliderect(opponent.get_hurtbox()):
-            if not opponent.blocking:
-                opponent.health = max(0, opponent.health - damage)
+    @property
+    def left(self) -> int:
+        return self.cx - self.w // 2
+
+    def fit_frame(self):
+        # size and hurtbox of the sprite frame for the current state / tick
+        self.w, self.h, self.box = self.data.fit[self.state][self.attack_frames_left]
+
+    def copy_from(self, other: "FighterState"):
+        # plain field copy for search rollouts; keep in step with __slots__
+        self.cx, self.bottom, self.w, self.h = other.cx, other.bottom, other.w, other.h
+        self.vel_y, self.facing_right, self.on_ground = other.vel_y, other.facing_right, other.on_ground
+        self.health, self.blocking = other.health, other.blocking
+        self.attack_cooldown, self.attack_frames_left = other.attack_cooldown, other.attack_frames_left
+        self.pending_projectile_frames = other.pending_projectile_frames
+        self.max_jumps, self.jumps_used, self.jump_was_down = other.max_jumps, other.jumps_used, other.jump_was_down
+        self.state, self.is_bot = other.state, other.is_bot
+        self.box, self.data = other.box, other.data
+
+    def hurtbox(self) -> tuple:
+        dx, dy, w, h = self.box
+        return (self.cx + dx, self.bottom + dy, w, h)
+
+
+class ProjectileState:
+    __slots__ = ("x", "y", "w", "h", "vx", "kind", "owner", "alive", "hx", "hy", "hw", "hh")
+
+    def __init__(self, cx, cy, spec: ProjectileData, vx: int, owner: int):
+        self.reset(cx, cy, spec, vx, owner)
+
+    def reset(self, cx, cy, spec: ProjectileData, vx: int, owner: int) -> "ProjectileState":
+        self.w, self.h = spec.size
+        self.x, self.y = cx - self.w // 2, cy - self.h // 2
+        self.vx = vx
+        self.kind = spec.kind
+        self.owner = owner
+        self.alive = True
+        # reduced hitbox, centered on projectile; moved along with x
+        self.hw, self.hh = spec.hit
+        self.hx = self.x + (self.w - self.hw) // 2
+        self.hy = self.y + (self.h - self.hh) // 2
+        return self
+
+    def copy_from(self, other: "ProjectileState") -> "ProjectileState":
+        # keep in step with __slots__
+        self.x, self.y, self.w, self.h, self.vx = other.x, other.y, other.w, other.h, other.vx
+        self.kind, self.owner, self.alive = other.kind, other.owner, other.alive
+        self.hx, self.hy, self.hw, self.hh = other.hx, other.hy, other.hw, other.hh
+        return self
+
+    def hitbox(self) -> tuple:
+        return (self.hx, self.hy, self.hw, self.hh)
+
+
+class ProjectilePool:
+    # recycles ProjectileState instances: once warm, specials and rollbacks allocate nothing
+    __slots__ = ("free", "allocated")
+
+    def __init__(self, prealloc: int = 0):
+        self.free = [ProjectileState.__new__(ProjectileState) for _ in range(prealloc)]
+        self.allocated = prealloc
+
+    def _take(self) -> ProjectileState:
+        if self.free:
+            return self.free.pop()
+        self.allocated += 1
+        return ProjectileState.__new__(ProjectileState)
+
+    def acquire(self, cx, cy, spec: ProjectileData, vx: int, owner: int) -> ProjectileState:
+        return self._take().reset(cx, cy, spec, vx, owner)
+
+    def acquire_fields(self, values: tuple) -> ProjectileState:
+        proj = self._take()
+        for name, value in zip(ProjectileState.__slots__, values):
+            setattr(proj, name, value)
+        return proj
+
+    def acquire_copy(self, other: ProjectileState) -> ProjectileState:
+        return self._take().copy_from(other)
+
+    def release(self, proj: ProjectileState):
+        self.free.append(proj)
+
+
+class FighterIndex:
+    # Party matches: standing fighters sorted by x at the start of the tick, so bot targeting
+    # and melee look at a window of neighbours instead of at every fighter
+    __slots__ = ("order", "xs", "margin")
+
+    def __init__(self, margin: int):
+        self.order = []
+        self.xs = []
+        # covers how far a fighter can move and how wide its hurtbox can get within one tick
+        self.margin = margin
+
+    def rebuild(self, fighters: list):
+        ranked = sorted((f.cx, i) for i, f in enumerate(fighters) if f.health > 0)
+        self.xs = [x for x, _ in ranked]
+        self.order = [i for _, i in ranked]
+
+    def near(self, x0: int, x1: int) -> list:
+        # fighters that may overlap [x0, x1) by now
+        lo = bisect.bisect_left(self.xs, x0 - self.margin)
+        hi = bisect.bisect_right(self.xs, x1 + self.margin, lo)
+        return self.order[lo:hi]
+
+    def nearest(self, fighters: list, i: int) -> int:
+        # closest standing fighter other than i, -1 when none is left
+        x = fighters[i].cx
+        xs, order = self.xs, self.order
+        hi = bisect.bisect_left(xs, x)
+        lo = hi - 1
+        while lo >= 0 or hi < len(xs):
+            if hi < len(xs) and (lo < 0 or xs[hi] - x <= x - xs[lo]):
+                j = order[hi]
+                hi += 1
             else:
-                opponent.health = max(0, opponent.health - damage // 4)
-                if audio_manager: audio_manager.play_sfx("block")
-
-    def shoot_projectile(self):
-        kind = "fireball" if self.is_p1 else "lightning"
-        direction = 1 if self.facing_right else -1
-        start_x = self.rect.centerx + (self.rect.width // 2 * direction)
-        start_y = self.rect.centery - 20
-        self.projectiles.add(Projectile(start_x, start_y, direction, kind))
-
-    def spawn_projectile_now(self):
-        # spawn using current facing/origin
-        self.shoot_projectile()
-        # reset sprite to starting sprite once projectile launched
-        self.attack_frames_left = 0
-        self.state = "idle"
+                j = order[lo]
+                lo -= 1
+            if j != i and fighters[j].health > 0:
+                return j
+        return -1
+
+
+class MatchState:
+    __slots__ = (
+        "fighters", "projectiles", "projectile_kinds", "rng", "tick", "winner",
+        "pool", "hitbox_reach", "projectile_clash", "index", "profiler",
+    )
+
+    def __init__(self, fighters: list, rng, projectile_clash: bool = False):
+        self.fighters = fighters
+        self.projectiles = []
+        self.projectile_kinds = {f.data.projectile.kind: f.data.projectile for f in fighters}
+        self.rng = rng
+        self.tick = 0
+        self.winner = None
+        self.pool = ProjectilePool()
+        # widest projectile hitbox: how far left of a box the broad phase must look
+        self.hitbox_reach = max((p.hit[0] for p in self.projectile_kinds.values()), default=1)
+        # opposing projectiles cancel each other out (bullet-hell variant)
+        self.projectile_clash = projectile_clash
+        # party matches only: 1v1 always targets the other fighter
+        self.index = None
+        if len(fighters) > 2:
+            datas = [f.data for f in fighters]
+            self.index = FighterIndex(max(d.widest for d in datas) + max(d.walk_speed for d in datas)
+                                      + max(d.bot_speed for d in datas))
+        # FrameProfiler timing step()'s phases; only the live match of a profiled game_loop
+        self.profiler = None
+
+    @property
+    def over(self) -> bool:
+        return self.winner is not None
+
+
+def overlaps(a: tuple, b: tuple) -> bool:
+    # pygame.Rect.colliderect for (x, y, w, h) tuples
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+FIGHTER_FIELDS = tuple(name for name in FighterState.__slots__ if name != "data")
+_fighter_fields = operator.attrgetter(*FIGHTER_FIELDS)
+_projectile_fields = operator.attrgetter(*ProjectileState.__slots__)
+
+
+def snapshot(m: MatchState) -> tuple:
+    # immutable copy of everything step() reads; fighter and projectile data are shared, never copied
+    return (
+        m.tick,
+        m.winner,
+        m.rng.getstate(),
+        tuple(_fighter_fields(f) for f in m.fighters),
+        tuple(_projectile_fields(p) for p in m.projectiles),
+    )
+
+
+def restore(m: MatchState, snap: tuple):
+    m.tick, m.winner, rng_state, fighters, projectiles = snap
+    m.rng.setstate(rng_state)
+    for f, values in zip(m.fighters, fighters):
+        for name, value in zip(FIGHTER_FIELDS, values):
+            setattr(f, name, value)
+    for proj in m.projectiles:
+        m.pool.release(proj)
+    m.projectiles = [m.pool.acquire_fields(values) for values in projectiles]
+
+
+def copy_match(dst: MatchState, src: MatchState, rng: bool = True):
+    # in-place copy between two matches of the same roster, with no snapshot tuples. The rng
+    # (the slowest part) only matters to bots and may be skipped when there are none
+    dst.tick, dst.winner = src.tick, src.winner
+    if rng:
+        dst.rng.setstate(src.rng.getstate())
+    for d, f in zip(dst.fighters, src.fighters):
+        d.copy_from(f)
+    for proj in dst.projectiles:
+        dst.pool.release(proj)
+    dst.projectiles = [dst.pool.acquire_copy(p) for p in src.projectiles]
+
+
+def clone_match(m: MatchState) -> MatchState:
+    # private copy to simulate ahead on; shares fighter and projectile data, never pygame objects
+    fighters = []
+    for f in m.fighters:
+        twin = FighterState.__new__(FighterState)
+        twin.copy_from(f)
+        fighters.append(twin)
+    twin = MatchState(fighters, random.Random(), m.projectile_clash)
+    copy_match(twin, m)
+    return twin
+
+
+def new_match(mode: str, sprites: dict, seed=None, rng=None, projectile_clash: bool = False,
+              fighters: int = 2, names: tuple = ("player1", "player2")) -> MatchState:
+    # fighters spread evenly from x=200 to the far side, cycling through the roster `names`
+    # and facing the middle; "single" has one human, "two" and "party" two, everyone else is
+    # a bot. In "hard" both play through inputs: player 2's come from a SearchBot
+    humans = 1 if mode == "single" else 2
+    roster = []
+    for k in range(fighters):
+        x = 200 + (SCREEN_WIDTH - 400) * k // max(1, fighters - 1)
+        name = names[k % len(names)]
+        roster.append(FighterState(x, GROUND_Y, fighter_data(name, sprites[name]), x < SCREEN_WIDTH // 2,
+                                   is_bot=(k >= humans)))
+    return MatchState(roster, rng if rng is not None else random.Random(seed), projectile_clash)
+
+
+def nearest_opponent(m: MatchState, i: int):
+    if m.index is None:
+        return m.fighters[1 - i]
+    j = m.index.nearest(m.fighters, i)
+    return m.fighters[j] if j >= 0 else None
+
+
+def melee_targets(m: MatchState, i: int, box: tuple):
+    if m.index is None:
+        return (1 - i,)
+    return sorted(j for j in m.index.near(box[0], box[0] + box[2]) if j != i and m.fighters[j].health > 0)
+
+
+def melee_attack(m: MatchState, f: FighterState, damage: int, i: int, move: str, events: list):
+    # hits every opponent in reach; events name attacker and target
+    box = f.hurtbox()
+    for j in melee_targets(m, i, box):
+        opp = m.fighters[j]
+        if overlaps(box, opp.hurtbox()):  # narrower width
+            dealt = damage // BLOCK_DIVISOR if opp.blocking else damage
+            opp.health = max(0, opp.health - dealt)
+            events.append(("hit", i, move, dealt, opp.blocking, j))
+
+
+def start_attack(m: MatchState, f: FighterState, move: str, i: int, events: list):
+    data = f.data.moves[move]
+    f.state = move
+    f.attack_frames_left = data.duration
+    f.attack_cooldown = data.cooldown
+    events.append(("attack", i, move))
+    if data.launch:
+        # the projectile leaves later, see spawn_projectile_now
+        f.pending_projectile_frames = data.launch
+    else:
+        melee_attack(m, f, data.damage, i, move, events)
+
+
+def spawn_projectile_now(m: MatchState, f: FighterState, i: int, events: list):
+    # spawn using current facing/origin
+    spec = f.data.projectile
+    direction = 1 if f.facing_right else -1
+    start_x = f.cx + (f.w // 2 * direction)
+    start_y = f.bottom - f.h + f.h // 2 + f.data.projectile_dy
+    proj = m.pool.acquire(start_x, start_y, spec, spec.speed * direction, i)
+    m.projectiles.append(proj)
+    events.append(("spawn", i, proj))
+    # reset sprite to starting sprite once projectile launched
+    f.attack_frames_left = 0
+    f.state = "idle"
+
+
+def bot_think(m: MatchState, f: FighterState, i: int, events: list):
+    # simple AI follow and random attack
+    opp = nearest_opponent(m, i)
+    if opp is None:
+        return
+    if opp.left < f.left:
+        f.cx -= f.data.bot_speed
+        f.facing_right = False
+    elif opp.left > f.left:
+        f.cx += f.data.bot_speed
+        f.facing_right = True
+
+    if m.rng.randint(0, 60) == 0 and f.attack_cooldown == 0 and f.attack_frames_left <= 0:
+        start_attack(m, f, m.rng.choice(f.data.bot_moves), i, events)
+
+
+def update_fighter(m: MatchState, i: int, inp: int, events: list):
+    f = m.fighters[i]
+    if f.is_bot:
+        bot_think(m, f, i, events)
+
+    # movement disabled during attack execution window
+    if f.attack_frames_left <= 0:
+        if inp & IN_LEFT:
+            f.cx -= f.data.walk_speed
+            f.facing_right = False
+            f.state = "walk"
+        if inp & IN_RIGHT:
+            f.cx += f.data.walk_speed
+            f.facing_right = True
+            f.state = "walk"
+
+    # jump
+    jump_now = inp & IN_JUMP != 0
+    if jump_now and not f.jump_was_down:
+        # allow double jump (max 2 jumps before touching ground again)
+        if f.jumps_used < f.max_jumps and f.attack_frames_left <= 0:
+            f.vel_y = f.data.jump_velocity
+            f.on_ground = False
+            f.state = "jump"
+            f.jumps_used += 1
+            events.append(("jump", i))
+    # update jump edge flag
+    f.jump_was_down = jump_now
+
+    # attacks
+    if f.attack_cooldown > 0:
+        f.attack_cooldown -= 1
+    if f.attack_frames_left > 0:
+        f.attack_frames_left -= 1
+    # handle delayed projectile spawn irrespective of special state
+    if f.pending_projectile_frames > 0:
+        f.pending_projectile_frames -= 1
+        if f.pending_projectile_frames == 0:
+            spawn_projectile_now(m, f, i, events)
+
+    if f.attack_frames_left <= 0 and f.attack_cooldown == 0:
+        if inp & IN_PUNCH:
+            start_attack(m, f, "punch", i, events)
+        elif inp & IN_KICK:
+            start_attack(m, f, "kick", i, events)
+        elif inp & IN_SPECIAL:
+            start_attack(m, f, "special", i, events)
+
+    # when an attack animation ends, return to idle sprite
+    if f.attack_frames_left == 0 and f.state in f.data.moves and not f.blocking:
+        # a move still waiting to launch keeps its pose until spawn, then resets in spawn_projectile_now
+        if not (f.data.moves[f.state].launch and f.pending_projectile_frames > 0):
+            # reset to idle if not moving/jumping
+            if f.on_ground and not inp & (IN_LEFT | IN_RIGHT):
+                f.state = "idle"
+
+    # blocking
+    f.blocking = inp & IN_BLOCK != 0
+    if f.blocking:
+        f.state = "block"
+
+    # gravity
+    f.vel_y += GRAVITY
+    f.bottom += f.vel_y
+    if f.bottom >= GROUND_Y:
+        f.bottom = GROUND_Y
+        f.vel_y = 0
+        if not f.on_ground:
+            events.append(("land", i))
+        f.on_ground = True
+        f.jumps_used = 0  # reset double jump when touching ground
+
+    # screen bounds
+    half = f.w // 2
+    if f.cx - half < 0:
+        f.cx = half
+    if f.cx - half + f.w > SCREEN_WIDTH:
+        f.cx = SCREEN_WIDTH - f.w + half
+
+    # frame for the new state (cycles special frames over its duration)
+    f.fit_frame()
+
+
+_by_hitbox_x = operator.attrgetter("hx")
+
+
+def sweep_clashes(ours: list, theirs: list, reach: int, events: list):
+    # both lists sorted by hitbox x: a window over theirs only holds those whose x-ranges can
+    # still overlap the current projectile
+    start = 0
+    n = len(theirs)
+    for a in ours:
+        if not a.alive:
+            continue
+        left, right = a.hx - reach, a.hx + a.hw
+        while start < n and theirs[start].hx <= left:
+            start += 1
+        for j in range(start, n):
+            b = theirs[j]
+            if b.hx >= right:
+                break
+            if b.alive and b.hx + b.hw > a.hx and a.hy < b.hy + b.hh and b.hy < a.hy + a.hh:
+                a.alive = b.alive = False
+                events.append(("clash", a, b))
+                break
+
+
+def clash_projectiles(projs: list, reach: int, events: list):
+    # each owner's projectiles are swept against every other owner's
+    groups = {}
+    for proj in projs:
+        groups.setdefault(proj.owner, []).append(proj)
+    owners = sorted(groups)
+    for k, owner in enumerate(owners):
+        for other in owners[k + 1:]:
+            sweep_clashes(groups[owner], groups[other], reach, events)
+
+
+def collide_projectiles(m: MatchState, events: list):
+    # broad phase: sort-and-sweep on hitbox x. Projectiles fly at the same speed, so the list
+    # stays almost sorted from tick to tick and the sort is close to linear
+    projs = m.projectiles
+    projs.sort(key=_by_hitbox_x)
+    if m.projectile_clash:
+        clash_projectiles(projs, m.hitbox_reach, events)
+    fighters = m.fighters
+    for i in range(len(fighters)) if m.index is None else m.index.order:
+        target = fighters[i]
+        x, y, w, h = target.hurtbox()
+        # only projectiles whose hitbox starts inside [x - reach, x + w) can touch the hurtbox
+        lo = bisect.bisect_right(projs, x - m.hitbox_reach, key=_by_hitbox_x)
+        hi = bisect.bisect_left(projs, x + w, key=_by_hitbox_x, lo=lo)
+        for k in range(lo, hi):
+            proj = projs[k]
+            if proj.alive and proj.owner != i and proj.hx + proj.hw > x and proj.hy < y + h and y < proj.hy + proj.hh:
+                damage = m.projectile_kinds[proj.kind].damage
+                target.health = max(0, target.health - damage)
+                proj.alive = False
+                events.append(("projectile_hit", proj.owner, proj, damage, i))
+
+
+def step(m: MatchState, *inputs: int) -> list:
+    # advance the match by one 1/FPS tick; inputs[i] drives fighter i, fighters past the
+    # given inputs get none. Returns the events it produced; projectiles in events are
+    # pooled: read them before the next step()
+    events = []
+    prof = m.profiler
+    for proj in m.projectiles:
+        proj.x += proj.vx
+        proj.hx += proj.vx
+        if proj.x + proj.w < 0 or proj.x > SCREEN_WIDTH:
+            proj.alive = False
+
+    n = len(inputs)
+    if m.index is None:
+        update_fighter(m, 0, inputs[0] if n > 0 else 0, events)
+        update_fighter(m, 1, inputs[1] if n > 1 else 0, events)
+    else:
+        # party: fighters that are down sit the rest of the match out
+        m.index.rebuild(m.fighters)
+        for i in sorted(m.index.order):
+            if m.fighters[i].health > 0:
+                update_fighter(m, i, inputs[i] if i < n else 0, events)
+    if prof:
+        prof.mark("sim.fighters")
+
+    if m.projectiles:
+        collide_projectiles(m, events)
+        live = []
+        for proj in m.projectiles:
+            if proj.alive:
+                live.append(proj)
+            else:
+                m.pool.release(proj)
+        m.projectiles = live
+
+    m.tick += 1
+    if m.winner is None:
+        if m.index is None:
+            p1, p2 = m.fighters
+            if p1.health <= 0 or p2.health <= 0:
+                m.winner = 0 if p2.health <= 0 else 1
+                events.append(("ko", m.winner))
+        else:
+            standing = []
+            for i in sorted(m.index.order):
+                if m.fighters[i].health > 0:
+                    standing.append(i)
+                else:
+                    events.append(("down", i))
+            if len(standing) <= 1:
+                # last one standing; when the rest went down together the lowest index wins, as in 1v1
+                m.winner = standing[0] if standing else min(m.index.order)
+                events.append(("ko", m.winner))
+    if prof:
+        prof.mark("sim.projectiles")
+    return events
+
+
+# ---------------- Input Buffer ----------------
+# Keyboard players go through an InputBuffer between pygame and step(): it still produces
+# one ACTIONS bitmask per tick, so replays and netplay see nothing new, but taps shorter
+# than a frame, presses a little early and motion commands all make it into that mask.
+INPUT_BUFFER_MS = 100  # an attack pressed this long before it can start still comes out
+MOTION_WINDOW_MS = 300  # a motion command has to be finished within this
+# Motion tokens: directions in numpad notation relative to facing (2 down, 6 forward,
+# 3 down-forward, ...; down is the block key), buttons by initial. Neutral is not a token.
+MOTION_COMMANDS = {
+    # command: (token sequences, input the final button becomes)
+    # the full quarter circle only: a shortcut 2-6-P would turn block, let go, forward +
+    # punch into a special, 2 being the block key
+    "fireball": ((("2", "3", "6", "P"),), IN_SPECIAL),
+}
+BUTTON_TOKENS = ((IN_PUNCH, "P"), (IN_KICK, "K"), (IN_SPECIAL, "S"))
+BUFFERED_BUTTONS = (IN_PUNCH, IN_KICK, IN_SPECIAL)
+
+
+def numpad_direction(mask: int, facing_right: bool) -> int:
+    forward, back = (IN_RIGHT, IN_LEFT) if facing_right else (IN_LEFT, IN_RIGHT)
+    h = (mask & forward != 0) - (mask & back != 0)
+    v = (mask & IN_JUMP != 0) - (mask & IN_BLOCK != 0)
+    return 5 + h + 3 * v
+
+
+class MotionAutomaton:
+    # Aho-Corasick over motion tokens, compiled into a full transition table: matching costs
+    # one dict lookup per token however many commands exist. out[state] is the
+    # (sequence length, command input) of a sequence ending in that state, if any.
+    def __init__(self, commands: dict):
+        alphabet = {t for seqs, _ in commands.values() for seq in seqs for t in seq}
+        goto = [{}]
+        out = [None]
+        for seqs, result in commands.values():
+            for seq in seqs:
+                state = 0
+                for token in seq:
+                    if token not in goto[state]:
+                        goto.append({})
+                        out.append(None)
+                        goto[state][token] = len(goto) - 1
+                    state = goto[state][token]
+                out[state] = (len(seq), result)
+        # breadth-first: fill every missing transition from the failure state's
+        self.table = [dict() for _ in goto]
+        fail = [0] * len(goto)
+        order = deque()
+        for token in alphabet:
+            nxt = goto[0].get(token, 0)
+            self.table[0][token] = nxt
+            if nxt:
+                order.append(nxt)
+        while order:
+            state = order.popleft()
+            if out[state] is None:
+                out[state] = out[fail[state]]  # a shorter sequence that ends here too
+            for token in alphabet:
+                nxt = goto[state].get(token)
+                if nxt is None:
+                    self.table[state][token] = self.table[fail[state]][token]
+                else:
+                    fail[nxt] = self.table[fail[state]][token]
+                    self.table[state][token] = nxt
+                    order.append(nxt)
+        self.out = out
+        self.longest = max(len(seq) for seqs, _ in commands.values() for seq in seqs)
+
+
+MOTION_AUTOMATON = MotionAutomaton(MOTION_COMMANDS)
+
+
+class InputBuffer:
+    # One keyboard player's input. feed() records which of their keys went down since the last
+    # tick, even if already released; tick() turns held keys plus those presses into that
+    # tick's bitmask, keeps attack presses alive for INPUT_BUFFER_MS and runs the motion
+    # automaton, all on tick counters. Constant work per tick.
+    def __init__(self, controls: dict, buffer_ms: float = INPUT_BUFFER_MS, window_ms: float = MOTION_WINDOW_MS,
+                 automaton: MotionAutomaton = MOTION_AUTOMATON):
+        self.controls = controls
+        self.keymap = {controls[action]: 1 << bit for bit, action in enumerate(ACTIONS)}
+        self.presses = 0  # pressed since the last tick, even if already released
+        self.prev_held = 0
+        self.buffer_ticks = round(buffer_ms * FPS / 1000)
+        self.window_ticks = round(window_ms * FPS / 1000)
+        self.buffered = {bit: 0 for bit in BUFFERED_BUTTONS}  # ticks left in each press's window
+        self.automaton = automaton
+        self.state = 0
+        self.token_ticks = deque(maxlen=automaton.longest)  # tick of each recent token
+        self.direction = 5
+        self.tick_count = 0
+        self.commands = 0
+
+    def feed(self, event) -> bool:
+        # True when the event was one of this player's keys
+        bit = self.keymap.get(getattr(event, "key", None))
+        if bit is None or event.type not in (pygame.KEYDOWN, pygame.KEYUP):
+            return False
+        if event.type == pygame.KEYDOWN:
+            self.presses |= bit
+        return True
+
+    def _token(self, token: str):
+        # advance the automaton; the command input when a sequence completes inside the window
+        self.state = self.automaton.table[self.state].get(token, 0)
+        self.token_ticks.append(self.tick_count)
+        hit = self.automaton.out[self.state]
+        if hit is not None and self.tick_count - self.token_ticks[-hit[0]] <= self.window_ticks:
+            return hit[1]
+        return 0
+
+    def tick(self, keys, facing_right: bool) -> int:
+        held = read_input(keys, self.controls)
+        pressed = (held & ~self.prev_held) | self.presses
+        self.prev_held = held
+        self.presses = 0
+        mask = held | pressed
+        self.tick_count += 1
+
+        command = 0
+        direction = numpad_direction(mask, facing_right)
+        if direction != self.direction:
+            self.direction = direction
+            if direction != 5:
+                self._token(str(direction))
+        for bit, token in BUTTON_TOKENS:
+            if pressed & bit:
+                result = self._token(token)
+                if result:
+                    # the button completing a motion becomes the command instead
+                    command = result
+                    mask &= ~bit
+                    pressed = pressed & ~bit | result
+        if command:
+            self.commands += 1
+            mask |= command
+            self.state = 0
+
+        for bit in BUFFERED_BUTTONS:
+            if pressed & bit:
+                self.buffered[bit] = self.buffer_ticks
+            elif self.buffered[bit] > 0:
+                self.buffered[bit] -= 1
+                mask |= bit
+        return mask
+
+
+# ---------------- Search AI ----------------
+AI_LEVEL = "normal"  # single player opponent: "normal" (random bot) or "hard" (SearchBot)
+SEARCH_BUDGET_MS = 2.0
+# idle, move, jump, the three attacks and block, each held for a whole rollout
+SEARCH_ACTIONS = (0, IN_LEFT, IN_RIGHT, IN_JUMP, IN_PUNCH, IN_KICK, IN_SPECIAL, IN_BLOCK)
+WIN_SCORE = 100_000
+
+
+class SearchBot:
+    # Every `period` ticks, a depth-limited minimax on a private copy of the match: each of our
+    # actions against each opponent reply, both held for the horizon, with alpha-beta cuts.
+    # The horizon deepens while the time budget lasts; the deepest complete answer is played.
+    # It drives its fighter through inputs like a keyboard player, so replays and netplay
+    # record it as-is
+    def __init__(self, match: MatchState, i: int, budget_ms: float = SEARCH_BUDGET_MS, period: int = 6,
+                 horizons: tuple = (3, 6, 12, 24, 36)):
+        self.i = i
+        self.scratch = clone_match(match)
+        self.budget = budget_ms / 1000
+        self.period = period
+        self.horizons = horizons
+        self.action = 0
+        self.killer = 0  # the opponent reply that refuted our last candidate, tried first
+        # stats
+        self.searches = 0
+        self.nodes = 0  # simulated ticks
+        self.search_time = 0.0
+        self.max_time = 0.0
+        self.depth_sum = 0
+
+    def input(self, match: MatchState) -> int:
+        if match.tick % self.period == 0:
+            self.action = self.search(match)
+        return self.action
+
+    def search(self, m: MatchState) -> int:
+        t0 = time.perf_counter()
+        deadline = t0 + self.budget
+        # bots roll dice: every rollout restarts from the same rng state, taken once
+        rng_state = m.rng.getstate() if any(f.is_bot for f in m.fighters) else None
+        best, depth = self.action, 0
+        last = 0.0  # time the previous horizon took
+        for horizon in self.horizons:
+            started = time.perf_counter()
+            # a horizon costs about its length times the previous one's per tick: skip it
+            # when that cannot fit in what is left
+            if depth and last * horizon / depth > deadline - started:
+                break
+            action = self.minimax(m, horizon, deadline, rng_state, best)
+            if action is None:
+                break  # out of time: keep the last complete answer
+            best, depth = action, horizon
+            last = time.perf_counter() - started
+        elapsed = time.perf_counter() - t0
+        self.searches += 1
+        self.search_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.depth_sum += depth
+        return best
+
+    def minimax(self, m: MatchState, horizon: int, deadline: float, rng_state, first: int):
+        # trying the previous answer (and the last refutation) first makes the cuts bite early
+        order = (first,) + tuple(a for a in SEARCH_ACTIONS if a != first)
+        alpha, best = -WIN_SCORE - 1, None
+        for action in order:
+            worst = WIN_SCORE + 1
+            replies = (self.killer,) + tuple(r for r in SEARCH_ACTIONS if r != self.killer)
+            for reply in replies:
+                if time.perf_counter() > deadline:
+                    return None
+                value = self.rollout(m, action, reply, horizon, rng_state, deadline)
+                if value is None:
+                    return None
+                if value < worst:
+                    worst = value
+                    if worst <= alpha:
+                        self.killer = reply
+                        break  # the opponent already has an answer at least this bad for us
+            if worst > alpha:
+                alpha, best = worst, action
+        return best
+
+    def rollout(self, m: MatchState, action: int, reply: int, horizon: int, rng_state,
+                deadline: float) -> float | None:
+        # None when the deadline passes mid-rollout; the clock is read every 8 ticks
+        s = self.scratch
+        copy_match(s, m, rng=False)
+        if rng_state is not None:
+            s.rng.setstate(rng_state)
+        inputs = (action, reply) if self.i == 0 else (reply, action)
+        for t in range(horizon):
+            if t & 7 == 7 and time.perf_counter() > deadline:
+                return None
+            step(s, *inputs)
+            self.nodes += 1
+            if s.over:
+                break
+        return self.evaluate(s)
+
+    def evaluate(self, s: MatchState) -> float:
+        me, opp = s.fighters[self.i], s.fighters[1 - self.i]
+        if s.over:
+            # sooner wins (and later losses) score better
+            return (WIN_SCORE if s.winner == self.i else -WIN_SCORE) - s.tick
+        score = 10.0 * (me.health - opp.health)
+        # projectiles in flight and specials about to fire count for part of their damage
+        for proj in s.projectiles:
+            target = opp if proj.owner == self.i else me
+            heading = (target.cx - proj.hx) * proj.vx > 0
+            if heading and proj.hy < target.bottom and target.bottom - target.h < proj.hy + proj.hh:
+                damage = s.projectile_kinds[proj.kind].damage
+                score += 5.0 * damage if target is opp else -5.0 * damage
+        if me.pending_projectile_frames > 0:
+            score += 2.0 * me.data.projectile.damage
+        if opp.pending_projectile_frames > 0:
+            score -= 2.0 * opp.data.projectile.damage
+        # slight pull towards the fight, so idle positions are not all equal
+        return score - 0.01 * abs(me.cx - opp.cx)
+
+    def stats(self) -> dict:
+        n = max(1, self.searches)
+        return {
+            "searches": self.searches,
+            "nodes_per_s": self.nodes / max(self.search_time, 1e-9),
+            "avg_ms": self.search_time / n * 1e3,
+            "max_ms": self.max_time * 1e3,
+            "avg_horizon": self.depth_sum / n,
+        }
+
+
+# ---------------- Replays ----------------
+# A replay is the match seed plus both input bitmasks (one byte each) for every sim step;
+# re-running them through step() reproduces the fight exactly.
+REPLAY_MAGIC = b"SFR1"
+REPLAY_HEADER = struct.Struct("<4sBIIH")  # magic, mode, seed, frames, fps
+REPLAY_MODES = ("single", "two", "party", "hard")  # low nibble of the mode byte, fighter count in the high one
+
+
+def pick_stage(seed: int) -> tuple:
+    # one RNG drives the stage pick and the bots, so the seed alone reproduces both
+    rng = random.Random(seed)
+    return rng.choice(BACKGROUND_IMAGES), rng
+
+
+def start_match(mode: str, sprites: dict, seed: int, fighters: int = 2):
+    stage, rng = pick_stage(seed)
+    return stage, new_match(mode, sprites, rng=rng, fighters=fighters)
+
+
+class Replay:
+    # only the two keyboard players are recorded: bots replay from the seed
+    def __init__(self, mode: str, seed: int, inputs: bytes = b"", fighters: int = 2):
+        self.mode = mode
+        self.seed = seed
+        self.inputs = bytearray(inputs)
+        self.fighters = fighters
+
+    @property
+    def frames(self) -> int:
+        return len(self.inputs) // 2
+
+    def record(self, p1_input: int, p2_input: int):
+        self.inputs += bytes((p1_input, p2_input))
+
+    def frame_inputs(self, tick: int) -> tuple:
+        return self.inputs[2 * tick], self.inputs[2 * tick + 1]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as fh:
+            mode = REPLAY_MODES.index(self.mode) | (self.fighters << 4 if self.fighters != 2 else 0)
+            fh.write(REPLAY_HEADER.pack(REPLAY_MAGIC, mode, self.seed, self.frames, FPS))
+            fh.write(zlib.compress(bytes(self.inputs), 9))
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, "rb") as fh:
+            data = fh.read()
+        magic, mode, seed, frames, fps = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ValueError(f"{path} is not a School Fighter replay")
+        if fps != FPS:
+            raise ValueError(f"{path} was recorded at {fps} Hz, the game runs at {FPS} Hz")
+        inputs = zlib.decompress(data[REPLAY_HEADER.size:])
+        if len(inputs) != 2 * frames:
+            raise ValueError(f"{path} is truncated")
+        return cls(REPLAY_MODES[mode & 0x0F], seed, inputs, mode >> 4 or 2)
+
+
+def save_replay(replay: Replay, directory: str = REPLAY_PATH, keep: int = MAX_REPLAYS) -> str:
+    # named by time, mode and seed, with a counter if that is taken (two fights can end in the
+    # same second); then only the newest `keep` replays are left
+    stem = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{replay.mode}-{replay.seed:08x}")
+    path, n = stem + ".sfr", 1
+    while os.path.exists(path):
+        n += 1
+        path = f"{stem}-{n}.sfr"
+    replay.save(path)
+    try:
+        old = sorted((e.stat().st_mtime_ns, e.path) for e in os.scandir(directory) if e.name.endswith(".sfr"))
+        for _, doomed in old[:max(0, len(old) - keep)]:
+            os.remove(doomed)
+    except OSError:
+        pass  # pruning is housekeeping: never lose the fight over it
+    return path
+
+
+class ReplayPlayer:
+    # Steps a match from a replay and keeps a snapshot every snapshot_every ticks for seeking
+    def __init__(self, replay: Replay, sprites: dict, snapshot_every: int = 5 * FPS):
+        self.replay = replay
+        self.stage, self.match = start_match(replay.mode, sprites, replay.seed, replay.fighters)
+        self.snapshot_every = snapshot_every
+        self.snapshots = {0: snapshot(self.match)}
+
+    @property
+    def done(self) -> bool:
+        return self.match.tick >= self.replay.frames
+
+    def step(self) -> list:
+        events = step(self.match, *self.replay.frame_inputs(self.match.tick))
+        if self.match.tick % self.snapshot_every == 0:
+            self.snapshots.setdefault(self.match.tick, snapshot(self.match))
+        return events
+
+    def seek(self, tick: int):
+        tick = max(0, min(tick, self.replay.frames))
+        base = max(k for k in self.snapshots if k <= tick)
+        # resume from the closest known state: the current one if it is nearer than any snapshot
+        if not base <= self.match.tick <= tick:
+            restore(self.match, self.snapshots[base])
+        while self.match.tick < tick:
+            self.step()
+
+
+def run_replay_headless(replay: Replay, sprites: dict) -> MatchState:
+    player = ReplayPlayer(replay, sprites)
+    while not player.done:
+        player.step()
+    return player.match
+
+
+# ---------------- Telemetry ----------------
+# One gzipped JSONL file per fight: a "match" header, the sim events as typed records
+# {"t": tick, "kind", "f": fighter, "to": target, "move", "v": value}, then a "result".
+TELEMETRY_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+
+def telemetry_records(tick: int, events: list) -> list:
+    # step() events -> (tick, kind, fighter, target, move, value)
+    out = []
+    for ev in events:
+        kind = ev[0]
+        if kind == "hit":
+            out.append((tick, "block" if ev[4] else "hit", ev[1], ev[5], ev[2], ev[3]))
+        elif kind == "attack":
+            out.append((tick, "attack", ev[1], None, ev[2], None))
+        elif kind == "spawn":
+            out.append((tick, "special", ev[1], None, ev[2].kind, None))
+        elif kind == "projectile_hit":
+            out.append((tick, "projectile_hit", ev[1], ev[4], ev[2].kind, ev[3]))
+        elif kind == "clash":
+            out.append((tick, "clash", ev[1].owner, ev[2].owner, None, None))
+        elif kind in ("jump", "down"):
+            out.append((tick, kind, ev[1], None, None, None))
+    return out
+
+
+class TelemetryBus:
+    # Fight events go into a bounded in-memory ring; a writer thread drains it in batches
+    # into one compressed file per match. The fight loop only appends: when the writer falls
+    # behind and the ring is full, "drop_newest" discards the new record, "drop_oldest" the
+    # oldest unwritten one, and "block" waits up to block_ms for room before dropping.
+    def __init__(self, directory: str = TELEMETRY_PATH, capacity: int = 8192, policy: str = "drop_newest",
+                 batch: int = 256, flush_ms: float = 250.0, block_ms: float = 2.0):
+        if policy not in TELEMETRY_POLICIES:
+            raise ValueError(f"unknown telemetry policy {policy!r}, expected one of {', '.join(TELEMETRY_POLICIES)}")
+        self.directory = directory
+        self.capacity = capacity
+        self.policy = policy
+        self.batch = min(batch, max(1, capacity // 2))
+        self.flush_s = flush_ms / 1000
+        self.block_s = block_ms / 1000
+        self.ring = deque()
+        self.wake = threading.Event()
+        self.stopping = False
+        self.files = {}  # match id -> open gzip file, writer thread only
+        self.next_id = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.thread = threading.Thread(target=self._work, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def _put(self, item: tuple):
+        if len(self.ring) >= self.capacity:
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                return
+            if self.policy == "drop_oldest":
+                try:
+                    oldest = self.ring.popleft()
+                except IndexError:
+                    oldest = None
+                self.dropped += 1
+                if oldest is not None and oldest[1] != "event":
+                    # a file open / close marker is never dropped: the new record goes instead
+                    self.ring.appendleft(oldest)
+                    return
+            else:
+                self.wake.set()
+                deadline = time.perf_counter() + self.block_s
+                while len(self.ring) >= self.capacity and time.perf_counter() < deadline:
+                    time.sleep(0)
+                if len(self.ring) >= self.capacity:
+                    self.dropped += 1
+                    return
+        self.ring.append(item)
+        self.emitted += 1
+        if len(self.ring) >= self.batch:
+            self.wake.set()
+
+    def begin_match(self, mode: str, seed: int, fighters: int) -> int:
+        mid = self.next_id
+        self.next_id += 1
+        name = time.strftime("%Y%m%d-%H%M%S") + f"-{mode}-{os.getpid()}-{mid}.jsonl.gz"
+        # headers and results bypass the drop policy: a file is always opened and closed
+        self.ring.append((mid, "open", name, {"kind": "match", "mode": mode, "seed": seed, "fighters": fighters,
+                                              "fps": FPS, "started": time.time()}))
+        return mid
+
+    def record(self, mid: int, tick: int, events: list):
+        for rec in telemetry_records(tick, events):
+            self._put((mid, "event", rec))
+
+    def end_match(self, mid: int, match):
+        self.ring.append((mid, "close", {"kind": "result", "winner": match.winner, "ticks": match.tick,
+                                         "health": [f.health for f in match.fighters]}))
+        self.wake.set()
+
+    def _work(self):
+        while True:
+            self.wake.wait(self.flush_s)
+            self.wake.clear()
+            self._drain()
+            if self.stopping:
+                self._drain()
+                return
+
+    def _drain(self):
+        ring = self.ring
+        while ring:
+            lines = {}  # match id -> encoded lines of this batch, in order
+            closing = []
+            for _ in range(min(len(ring), self.batch)):
+                item = ring.popleft()
+                mid, op = item[0], item[1]
+                if op == "event":
+                    t, kind, f, to, move, v = item[2]
+                    rec = {"t": t, "kind": kind, "f": f}
+                    if to is not None:
+                        rec["to"] = to
+                    if move is not None:
+                        rec["move"] = move
+                    if v is not None:
+                        rec["v"] = v
+                    lines.setdefault(mid, []).append(json.dumps(rec))
+                elif op == "open":
+                    os.makedirs(self.directory, exist_ok=True)
+                    self.files[mid] = gzip.open(os.path.join(self.directory, item[2]), "wt", compresslevel=6)
+                    lines.setdefault(mid, []).append(json.dumps(item[3]))
+                else:
+                    lines.setdefault(mid, []).append(json.dumps(item[2]))
+                    closing.append(mid)
+            for mid, batch in lines.items():
+                fh = self.files.get(mid)
+                if fh is not None:
+                    fh.write("\n".join(batch) + "\n")
+                    self.written += len(batch)
+            for mid in closing:
+                fh = self.files.pop(mid, None)
+                if fh is not None:
+                    fh.close()
+            self.batches += 1
+            time.sleep(0)  # hand the GIL back to the fight loop between batches
+
+    def close(self, timeout: float = 2.0):
+        # flush what is queued and finish every file, e.g. at exit
+        self.stopping = True
+        self.wake.set()
+        self.thread.join(timeout)
+        for fh in self.files.values():
+            fh.close()
+        self.files.clear()
+
+    def stats(self) -> dict:
+        return {
+            "emitted": self.emitted,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "queued": len(self.ring),
+        }
+
+
+telemetry: TelemetryBus | None = None
+
+
+# ---------------- Particles ----------------
+# Hit sparks, block flashes, landing dust and projectile trails. Render side only: bursts
+# are spawned from step()'s events and never feed back into the match. Particles live in
+# NumPy arrays (live ones packed at the front), move in one vectorized update per frame
+# and are stamped straight into the screen's pixels.
+PARTICLES = True  # needs numpy; without it fights have no particles
+PARTICLE_CAPACITY = 8192  # bursts past this are cut short
+PARTICLE_LEVELS = 8  # colour ramp steps from birth to death
+PARTICLE_TILE = 32  # dirty rects cover the occupied tiles of this size
+PARTICLE_STAMP = ((0, 0), (1, 0), (0, 1), (1, 1))  # pixels each particle covers, from its position
+# name: (count, speed px/tick, direction, spread, life ticks, gravity px/tick², birth colour, death colour)
+# angles in radians with y pointing down; a spread of 2π sprays all around
+PARTICLE_EFFECTS = {
+    "spark": (28, 6.0, 0.0, 6.283, 16, 0.35, (255, 250, 190), (210, 50, 0)),
+    "block": (20, 3.5, 0.0, 6.283, 10, 0.0, (220, 240, 255), (40, 90, 220)),
+    "dust": (16, 2.2, -1.571, 2.4, 22, 0.12, (215, 205, 185), (105, 95, 85)),
+    "trail_fireball": (3, 0.9, 0.0, 6.283, 14, -0.05, (255, 220, 90), (150, 30, 0)),
+    "trail_lightning": (3, 0.9, 0.0, 6.283, 10, 0.0, (255, 255, 230), (90, 120, 255)),
+}
 
-    def animate(self):
-        prev = self.rect.midbottom
-        frames = self.sprites.get(self.state, self.sprites["idle"]) or self.sprites["idle"]
-        # For special, step through frames proportional to elapsed time
-        if self.state == "special" and len(frames) > 1 and ATTACK_DURATION_FRAMES > 0:
-            elapsed = ATTACK_DURATION_FRAMES - max(0, self.attack_frames_left)
-            frame_index = min(len(frames) - 1, int(elapsed / ATTACK_DURATION_FRAMES * len(frames)))
-            img = frames[frame_index]
+
+class ParticleSystem:
+    def __init__(self, capacity: int = PARTICLE_CAPACITY, seed=None):
+        self.capacity = capacity
+        self.n = 0  # live particles, packed into [0, n)
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.life = np.zeros(capacity, np.float32)  # ticks left
+        self.span = np.ones(capacity, np.float32)  # ticks at birth
+        self.gravity = np.zeros(capacity, np.float32)
+        self.effect = np.zeros(capacity, np.intp)
+        self.names = list(PARTICLE_EFFECTS)
+        # colour per effect and age step; mapped to pixel values once per surface format
+        self.ramps = [
+            [tuple(round(b + (d - b) * k / (PARTICLE_LEVELS - 1)) for b, d in zip(birth, death))
+             for k in range(PARTICLE_LEVELS)]
+            for *_, birth, death in PARTICLE_EFFECTS.values()
+        ]
+        self.mapped = {}
+        self.rng = np.random.default_rng(seed)  # own stream: the match rng stays untouched
+        self.dropped = 0
+
+    def clear(self):
+        self.n = 0
+
+    def emit(self, name: str, x: float, y: float, count: int | None = None):
+        burst, speed, direction, spread, life, gravity, _, _ = PARTICLE_EFFECTS[name]
+        if count is None:
+            count = burst
+        k = min(count, self.capacity - self.n)
+        self.dropped += count - k
+        if k <= 0:
+            return
+        s = slice(self.n, self.n + k)
+        rng = self.rng
+        angle = direction + (rng.random(k, np.float32) - 0.5) * spread
+        v = speed * (0.3 + 0.7 * rng.random(k, np.float32))
+        self.pos[s] = (x, y)
+        self.vel[s, 0] = np.cos(angle) * v
+        self.vel[s, 1] = np.sin(angle) * v
+        self.life[s] = self.span[s] = life * (0.6 + 0.4 * rng.random(k, np.float32))
+        self.gravity[s] = gravity
+        self.effect[s] = self.names.index(name)
+        self.n += k
+
+    def play(self, events: list, match):
+        # bursts for one step()'s events; pooled projectiles are read right away
+        fighters = match.fighters
+        for ev in events:
+            kind = ev[0]
+            if kind == "hit":
+                attacker, target = fighters[ev[1]], fighters[ev[5]]
+                # on the target's side facing the attacker, at chest height
+                side = -1 if attacker.cx < target.cx else 1
+                self.emit("block" if ev[4] else "spark", target.cx + side * target.w // 4,
+                          target.bottom - target.h * 2 // 3)
+            elif kind == "projectile_hit":
+                proj = ev[2]
+                self.emit("spark", proj.x + proj.w / 2, proj.y + proj.h / 2)
+            elif kind == "clash":
+                a, b = ev[1], ev[2]
+                self.emit("block", (a.x + a.w / 2 + b.x + b.w / 2) / 2, (a.y + a.h / 2 + b.y + b.h / 2) / 2)
+            elif kind == "land":
+                f = fighters[ev[1]]
+                self.emit("dust", f.cx, f.bottom)
+
+    def update(self, ticks: int, match=None):
+        # advances by the sim ticks this frame ran, so effects keep their speed whatever the render rate
+        if ticks <= 0:
+            return
+        if match is not None:
+            for proj in match.projectiles:
+                trail = "trail_" + proj.kind
+                # from the back half, so the projectile's own image stays clear
+                back = proj.w // 4 if proj.vx > 0 else -(proj.w // 4)
+                self.emit(trail, proj.x + proj.w / 2 - back, proj.y + proj.h / 2, PARTICLE_EFFECTS[trail][0] * ticks)
+        n = self.n
+        if not n:
+            return
+        pos, vel, life = self.pos[:n], self.vel[:n], self.life[:n]
+        vel[:, 1] += self.gravity[:n] * ticks
+        pos += vel * ticks
+        life -= ticks
+        keep = (life > 0) & (pos[:, 0] >= 0) & (pos[:, 0] < SCREEN_WIDTH) & (pos[:, 1] >= 0) & (pos[:, 1] < SCREEN_HEIGHT)
+        k = int(np.count_nonzero(keep))
+        if k < n:
+            # fill the dead slots below k with the survivors above it; moves only as many
+            # particles as died instead of repacking them all
+            holes = np.flatnonzero(~keep[:k])
+            movers = np.flatnonzero(keep[k:]) + k
+            for arr in (self.pos, self.vel, self.life, self.span, self.gravity, self.effect):
+                arr[holes] = arr[movers]
+            self.n = k
+
+    def colours(self, surface: pygame.Surface):
+        key = (surface.get_bitsize(), surface.get_masks())
+        table = self.mapped.get(key)
+        if table is None:
+            table = self.mapped[key] = np.array([[surface.map_rgb(c) for c in ramp] for ramp in self.ramps], np.uint32)
+        n = self.n
+        level = ((1.0 - self.life[:n] / self.span[:n]) * (PARTICLE_LEVELS - 1)).astype(np.intp)
+        return table[self.effect[:n], np.clip(level, 0, PARTICLE_LEVELS - 1)]
+
+    def draw(self, surface: pygame.Surface, scale: float = 1.0) -> list:
+        # returns the rects it touched: runs of occupied tiles, row by row
+        n = self.n
+        if not n:
+            return []
+        w, h = surface.get_size()
+        sw = max(dx for dx, _ in PARTICLE_STAMP) + 1
+        sh = max(dy for _, dy in PARTICLE_STAMP) + 1
+        xy = (self.pos[:n] * scale if scale != 1 else self.pos[:n]).astype(np.intp)
+        np.clip(xy, 0, (w - sw, h - sh), out=xy)
+        x, y = xy[:, 0], xy[:, 1]
+        colour = self.colours(surface)
+        if surface.get_bytesize() == 4:
+            # one scatter per stamp pixel into the surface's own memory
+            row = surface.get_pitch() // 4
+            at = y * row + x
+            buffer = surface.get_buffer()
+            pixels = np.frombuffer(buffer, np.uint32)
+            for dx, dy in PARTICLE_STAMP:
+                pixels[at + (dy * row + dx)] = colour
+            del pixels, buffer  # unlocks the surface
         else:
-            img = frames[0]
-        if not self.facing_right:
-            img = pygame.transform.flip(img, True, False)
-        self.image = img
-        self.rect = self.image.get_rect(midbottom=prev)
+            # other pixel formats: one fill per particle, correct but slow
+            for px, py, c in zip(x.tolist(), y.tolist(), colour.tolist()):
+                surface.fill(c, (px, py, sw, sh))
+        # runs of occupied tiles; a spare column past the right edge keeps runs from wrapping rows
+        cols = w // PARTICLE_TILE + 2
+        tiles = np.zeros((-(-h // PARTICLE_TILE), cols), bool)
+        tiles[y // PARTICLE_TILE, x // PARTICLE_TILE] = True
+        edges = np.flatnonzero(np.diff(tiles.ravel(), prepend=False))
+        starts, ends = edges[::2], edges[1::2]
+        bounds = pygame.Rect(0, 0, w, h)
+        return [pygame.Rect(x0 * PARTICLE_TILE, r * PARTICLE_TILE, length * PARTICLE_TILE + sw, PARTICLE_TILE + sh).clip(bounds)
+                for r, x0, length in zip((starts // cols).tolist(), (starts % cols).tolist(), (ends - starts).tolist())]
+
+
+def new_particles() -> ParticleSystem | None:
+    return ParticleSystem() if PARTICLES and np is not None else None
+
+
+# ---------------- Player ----------------
+class Player(pygame.sprite.Sprite):
+    # Render-side view of a FighterState
+    def __init__(self, fighter: FighterState, sprites, scale: float = 1.0):
+        super().__init__()
+        self.fighter = fighter
+        self.sprites = sprites  # loaded at `scale`
+        self.scale = scale
+        self.image = self.sprites["idle"].right[0]
+        self.rect = self.image.get_rect(midbottom=(fighter.cx, fighter.bottom))
+        self.prev = (fighter.cx, fighter.bottom)
+
+    def remember(self):
+        # position before the next sim step, for render interpolation
+        self.prev = (self.fighter.cx, self.fighter.bottom)
+
+    def animate(self, alpha: float = 1.0):
+        # table lookup only: frames are pre-flipped and pre-indexed in load_sprites
+        f = self.fighter
+        anim = self.sprites.get(f.state) or self.sprites["idle"]
+        i = f.data.frames[f.state][f.attack_frames_left]
+        self.image = anim.right[i] if f.facing_right else anim.left[i]
+        dx, dy = anim.offsets[i]
+        w, h = anim.sizes[i]
+        px, py = self.prev
+        cx = round((px + (f.cx - px) * alpha) * self.scale)
+        bottom = round((py + (f.bottom - py) * alpha) * self.scale)
+        self.rect.update(cx + dx, bottom + dy, w, h)
 
     def draw(self, surface: pygame.Surface):
         surface.blit(self.image, self.rect)
-        # draw projectiles
-        self.projectiles.draw(surface)
-
-
-class Bot(Player):
-    def update(self, keys, opponent):
-        # simple AI follow and random attack
-        if opponent.rect.x < self.rect.x:
-            self.rect.x -= BOT_SPEED
-            self.facing_right = False
-        elif opponent.rect.x > self.rect.x:
-            self.rect.x += BOT_SPEED
-            self.facing_right = True
-
-        if random.randint(0, 60) == 0 and self.attack_cooldown == 0 and self.attack_frames_left <= 0:
-            choice = random.choice(["punch", "kick", "special"])
-            if choice == "punch":
-                self.state = "punch"; self.attack_frames_left = ATTACK_DURATION_FRAMES; self.attack_cooldown = 10
-                self.melee_attack(opponent, 10)
-                if audio_manager: audio_manager.play_sfx("punch")
-            elif choice == "kick":
-                self.state = "kick"; self.attack_frames_left = ATTACK_DURATION_FRAMES; self.attack_cooldown = 10
-                self.melee_attack(opponent, 15)
-                if audio_manager: audio_manager.play_sfx("kick")
-            else:
-                self.state = "special"; self.attack_frames_left = ATTACK_DURATION_FRAMES; self.attack_cooldown = 30
-                # delay projectile like players
-                self.pending_projectile_frames = int(0.5 * FPS)
-                if audio_manager: audio_manager.play_sfx("special")
 
-        # gravity and bounds via parent
-        super().update(keys, opponent)
+
+def fighter_views(match, sprites: dict, scale: float = 1.0) -> tuple:
+    # sprites loaded at `scale`, see load_sprites()
+    return tuple(Player(f, sprites[f.data.name], scale) for f in match.fighters)
+
+
+def draw_projectiles(surface: pygame.Surface, projectiles: list, owner: int, alpha: float = 1.0,
+                     scale: float = 1.0) -> list:
+    # projectiles move linearly, so the interpolated position is one partial step back
+    back = 1.0 - alpha
+    rects = []
+    for proj in projectiles:
+        if proj.owner == owner:
+            pos = (round((proj.x - proj.vx * back) * scale), round(proj.y * scale))
+            rects.append(surface.blit(projectile_image(proj.kind, scale), pos))
+    return rects
+
+
+HUD_RECTS = (pygame.Rect(50, 30, 200, 20), pygame.Rect(SCREEN_WIDTH - 250, 30, 200, 20))
+
+
+def hud_rects(fighters: int, scale: float = 1.0) -> tuple:
+    if fighters == 2:
+        rects = HUD_RECTS
+    else:
+        # party: one narrower bar per fighter along the top
+        width = (SCREEN_WIDTH - 100) // fighters - 10
+        rects = tuple(pygame.Rect(50 + k * (width + 10), 30, width, 20) for k in range(fighters))
+    if scale == 1:
+        return rects
+    return tuple(pygame.Rect(round(r.x * scale), round(r.y * scale), round(r.w * scale), max(1, round(r.h * scale)))
+                 for r in rects)
+
+
+def merge_rects(rects: list) -> list:
+    # union overlapping rects so shared pixels are pushed once
+    out = []
+    for r in rects:
+        r = r.copy()
+        i = r.collidelist(out)
+        while i != -1:
+            r.union_ip(out.pop(i))
+            i = r.collidelist(out)
+        out.append(r)
+    return out
+
+
+class FightRenderer:
+    # Draws and presents one fight frame. With dirty=True only the background under the
+    # previous fighter / projectile rects is restored, the HUD is redrawn when it changes,
+    # and only those regions are pushed with display.update(rects).
+    def __init__(self, screen: pygame.Surface, background: pygame.Surface, views: tuple, dirty: bool = DIRTY_RECTS):
+        self.screen = screen
+        self.background = background
+        self.views = views
+        self.dirty = dirty
+        self.prev_rects = []
+        self.scale = views[0].scale  # canvas scale the views were loaded for
+        self.hud = hud_rects(len(views), self.scale)
+        self.hud_health = [None] * len(self.hud)
+        self.full_redraw = True
+        self.pixels_pushed = 0  # last frame
+        self.profiler = None  # FrameProfiler timing each render phase, drawing its overlay
+        self.particles = None  # ParticleSystem drawn over the sprites
+
+    def draw_sprites(self, match, alpha: float) -> list:
+        rects = []
+        party = len(self.views) > 2
+        for owner, view in enumerate(self.views):
+            # fighters knocked out of a party match leave the stage
+            if not (party and view.fighter.health <= 0):
+                view.animate(alpha)
+                rects.append(self.screen.blit(view.image, view.rect))
+            rects.extend(draw_projectiles(self.screen, match.projectiles, owner, alpha, self.scale))
+        return rects
+
+    def draw(self, match, alpha: float = 1.0):
+        screen = self.screen
+        prof = self.profiler
+        if not self.dirty or self.full_redraw:
+            screen.blit(self.background, (0, 0))
+            if prof:
+                prof.mark("background")
+            self.prev_rects = self.draw_sprites(match, alpha)
+            if prof:
+                prof.mark("sprites")
+            if self.particles:
+                self.prev_rects += self.particles.draw(screen, self.scale)
+                if prof:
+                    prof.mark("particles")
+            for i, rect in enumerate(self.hud):
+                self.hud_health[i] = match.fighters[i].health
+                draw_health_bar(screen, rect.x, rect.y, self.hud_health[i], rect.width, rect.height,
+                                match.fighters[i].data.health)
+            if prof:
+                prof.mark("hud")
+                if prof.overlay:
+                    self.prev_rects.append(prof.draw_overlay(screen))
+                    prof.mark("overlay")
+            pygame.display.flip()
+            if prof:
+                prof.mark("present")
+            self.pixels_pushed = screen.get_width() * screen.get_height()
+            self.full_redraw = False
+            return
+
+        erased = self.prev_rects
+        for r in erased:
+            screen.blit(self.background, r, r)
+        if prof:
+            prof.mark("background")
+        rects = self.draw_sprites(match, alpha)
+        if prof:
+            prof.mark("sprites")
+        if self.particles:
+            rects += self.particles.draw(screen, self.scale)
+            if prof:
+                prof.mark("particles")
+        dirty = erased + rects
+        for i, rect in enumerate(self.hud):
+            health = match.fighters[i].health
+            if health != self.hud_health[i] or rect.collidelist(erased) != -1:
+                self.hud_health[i] = health
+                draw_health_bar(screen, rect.x, rect.y, health, rect.width, rect.height,
+                                match.fighters[i].data.health)
+                dirty.append(rect)
+        if prof:
+            prof.mark("hud")
+            if prof.overlay:
+                rects.append(prof.draw_overlay(screen))
+                dirty.append(rects[-1])
+                prof.mark("overlay")
+        dirty = merge_rects(dirty)
+        pygame.display.update(dirty)
+        if prof:
+            prof.mark("present")
+        self.pixels_pushed = sum(r.width * r.height for r in dirty)
+        self.prev_rects = rects
+
+
+def play_events(events: list):
+    if not audio_manager:
+        return
+    for ev in events:
+        if ev[0] == "attack":
+            audio_manager.play_sfx(ev[2])
+        elif (ev[0] == "hit" and ev[4]) or ev[0] == "clash":
+            audio_manager.play_sfx("block")
 
 
 # ---------------- UI Screens ----------------
+# Menus are scenes on a stack run by run_ui(). It sleeps in pygame.event.wait() and only
+# wakes up for input, window events or a scene's own timeout (the loading bar), so a menu
+# left alone costs no CPU. Each scene composes its still parts once into a cached surface;
+# a frame is that surface plus the highlighted option, drawn only when something changed.
 
-def main_menu(screen):
-    menu_options = ["Single Player", "Two Players", "Instructions", "Settings", "Exit"]
-    selected = 0
-    clock = pygame.time.Clock()
-    while True:
-        screen.fill((30, 30, 60))
-        draw_text(screen, "School Fighter", 60, 320, 80, (255, 255, 0))
-        for i, option in enumerate(menu_options):
-            color = (255, 255, 255) if i != selected else (0, 255, 0)
-            draw_text(screen, option, 40, 360, 200 + i * 60, color)
+MENU_OPTIONS = ["Single Player", "Two Players", "Party", "Instructions", "Settings", "Exit"]
+UI_LOADING_WAIT_MS = 50  # wake-up period while assets load behind the main menu
+UI_BACK = "back"  # handle(): close this scene
+UI_REDRAW = "redraw"  # handle(): something on screen changed
+
+
+class Scene:
+    background = (30, 30, 60)
+
+    def __init__(self):
+        self.base = None  # composed still parts; dropped when they or the canvas change
+
+    def wait_ms(self) -> int:
+        return 0  # event.wait timeout, 0 sleeps until an event arrives
+
+    def update(self) -> bool:
+        # on every wake-up; True when the screen needs a redraw
+        return False
+
+    def compose(self, surface: pygame.Surface):
+        surface.fill(self.background)
+
+    def decorate(self, screen: pygame.Surface):
+        # drawn over the cached base every frame
+        pass
+
+    def draw(self, screen: pygame.Surface):
+        if self.base is None or self.base.get_size() != screen.get_size():
+            self.base = pygame.Surface(screen.get_size()).convert()
+            self.compose(self.base)
+        screen.blit(self.base, (0, 0))
+        self.decorate(screen)
         pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit(); sys.exit()
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    selected = (selected - 1) % len(menu_options)
-                elif event.key == pygame.K_DOWN:
-                    selected = (selected + 1) % len(menu_options)
-                elif event.key == pygame.K_RETURN:
-                    if selected == 0:
-                        return "single"
-                    elif selected == 1:
-                        return "two"
-                    elif selected == 2:
-                        instructions_screen(screen)
-                    elif selected == 3:
-                        settings_screen(screen)
-                    elif selected == 4:
-                        pygame.quit(); sys.exit()
-        clock.tick(30)
-
-
-def instructions_screen(screen):
-    screen.fill((20, 20, 40))
-    draw_text(screen, "Instructions", 50, 350, 50)
-    draw_text(screen, "Player 1:", 30, 100, 120)
-    draw_text(screen, "Q/D: Gauche/Droite | Z: Saut | F: Poing | G: Pied | H: Spécial | S: Blocage", 25, 100, 160)
-    draw_text(screen, "Player 2:", 30, 100, 220)
-    draw_text(screen, "←/→: Gauche/Droite | ↑: Saut | K: Poing | L: Pied | M: Spécial | ↓: Blocage", 25, 100, 260)
-    draw_text(screen, "M: Mute musique | +/-: Volume musique | Entrée: Retour", 22, 250, 320, (200, 200, 200))
-    draw_text(screen, "Appuyez sur une touche pour revenir au menu.", 25, 250, 400)
-    pygame.display.flip()
-    waiting = True
-    while waiting:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit(); sys.exit()
-            elif event.type == pygame.KEYDOWN:
-                waiting = False
 
+    def handle(self, event):
+        # None, UI_REDRAW, UI_BACK, a Scene to open on top, or a result that ends run_ui()
+        return None
 
-def settings_screen(screen):
-    options = ["Mute Music", "Adjust Music Volume", "Back"]
-    selected = 0
-    clock = pygame.time.Clock()
-    while True:
-        screen.fill((10, 10, 30))
-        draw_text(screen, "Settings", 50, 380, 60, (255, 255, 0))
-        mute_on = (audio_manager._muted if audio_manager else False)
 
+class MenuScene(Scene):
+    # a title over a column of options, one of them highlighted
+    title = ("", 50, 0, 0)  # text, size, x, y
+    options = (40, 360, 180, 55)  # size, x, first y, spacing
+    footer = ()  # (text, size, x, y, color)
+
+    def __init__(self):
+        super().__init__()
+        self.selected = 0
+
+    def labels(self) -> list:
+        return []
+
+    def compose(self, surface: pygame.Surface):
+        surface.fill(self.background)
+        text, size, x, y = self.title
+        draw_text(surface, text, size, x, y, (255, 255, 0))
+        size, x, y, dy = self.options
+        for i, label in enumerate(self.labels()):
+            draw_text(surface, label, size, x, y + i * dy)
+        for text, size, x, y, color in self.footer:
+            draw_text(surface, text, size, x, y, color)
+
+    def decorate(self, screen: pygame.Surface):
+        # the selected option, in green over its white copy in the base
+        size, x, y, dy = self.options
+        label = self.labels()[self.selected]
+        at = (ui(x), ui(y + self.selected * dy))
+        screen.fill(self.background, text_cache.render(label, ui(size), (255, 255, 255)).get_rect(topleft=at))
+        draw_text(screen, label, size, x, y + self.selected * dy, (0, 255, 0))
+
+    def handle(self, event):
+        if event.type != pygame.KEYDOWN:
+            return None
+        if event.key in (pygame.K_UP, pygame.K_DOWN):
+            self.selected = (self.selected + (1 if event.key == pygame.K_DOWN else -1)) % len(self.labels())
+            return UI_REDRAW
+        if event.key == pygame.K_RETURN:
+            return self.choose(self.selected)
+        if event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+            return self.adjust(self.selected, 1 if event.key == pygame.K_RIGHT else -1)
+        return None
+
+    def choose(self, i: int):
+        return None
+
+    def adjust(self, i: int, step: int):
+        return None
+
+
+class MainMenu(MenuScene):
+    title = ("School Fighter", 60, 320, 80)
+
+    def __init__(self, preloader: Preloader | None = None):
+        super().__init__()
+        self.preloader = preloader
+
+    @property
+    def loading(self) -> bool:
+        return self.preloader is not None and not self.preloader.done
+
+    def wait_ms(self) -> int:
+        return UI_LOADING_WAIT_MS if self.loading else 0
+
+    def update(self) -> bool:
+        return self.loading and self.preloader.pump()
+
+    def labels(self) -> list:
+        return MENU_OPTIONS
+
+    def decorate(self, screen: pygame.Surface):
+        super().decorate(screen)
+        if self.loading:
+            # assets still loading in the background
+            progress = self.preloader.progress
+            draw_text(screen, "Chargement...", 18, 360, SCREEN_HEIGHT - 38, (200, 200, 200))
+            pygame.draw.rect(screen, (80, 80, 110), (ui(470), ui(SCREEN_HEIGHT - 34), ui(200), ui(10)))
+            pygame.draw.rect(screen, (0, 255, 0), (ui(470), ui(SCREEN_HEIGHT - 34), ui(200 * progress), ui(10)))
+
+    def choose(self, i: int):
+        if i <= 2:
+            return ("single", "two", "party")[i]
+        if i == 3:
+            return InstructionsScreen()
+        if i == 4:
+            return SettingsMenu()
+        pygame.quit(); sys.exit()
+
+
+class InstructionsScreen(Scene):
+    background = (20, 20, 40)
+    lines = (
+        ("Instructions", 50, 350, 50, (255, 255, 255)),
+        ("Player 1:", 30, 100, 120, (255, 255, 255)),
+        ("Q/D: Gauche/Droite | Z: Saut | F: Poing | G: Pied | H: Spécial | S: Blocage", 25, 100, 160, (255, 255, 255)),
+        ("Player 2:", 30, 100, 220, (255, 255, 255)),
+        ("←/→: Gauche/Droite | ↑: Saut | K: Poing | L: Pied | M: Spécial | ↓: Blocage", 25, 100, 260, (255, 255, 255)),
+        ("M: Mute musique | +/-: Volume musique | F3: Perf | F11: Plein écran", 22, 250, 320, (200, 200, 200)),
+        ("Spécial en quart de cercle : Bas, Bas+Avant, Avant + Poing", 22, 250, 350, (200, 200, 200)),
+        ("Appuyez sur une touche pour revenir au menu.", 25, 250, 400, (255, 255, 255)),
+    )
+
+    def compose(self, surface: pygame.Surface):
+        surface.fill(self.background)
+        for text, size, x, y, color in self.lines:
+            draw_text(surface, text, size, x, y, color)
+
+    def handle(self, event):
+        return UI_BACK if event.type == pygame.KEYDOWN else None
+
+
+class SettingsMenu(MenuScene):
+    background = (10, 10, 30)
+    title = ("Settings", 50, 380, 60)
+    options = (32, 360, 130, 42)
+    footer = (("←/→ pour changer un réglage, Entrée pour valider", 22, 160, 480, (200, 200, 200)),)
+
+    def labels(self) -> list:
+        mute_on = audio_manager._muted if audio_manager else False
         vol_percent = int((audio_manager._music_volume if audio_manager else 0.6) * 100)
-        labels = [
+        return [
             f"Mute Music: {'On' if mute_on else 'Off'}",
             f"Music Volume: {vol_percent}%",
+            f"Party Fighters: {PARTY_FIGHTERS}",
+            f"AI Level: {AI_LEVEL.capitalize()}",
+            f"Display: {'Fullscreen' if DISPLAY_FULLSCREEN else 'Window'}",
+            f"Scaling: {DISPLAY_SCALING.capitalize()}",
+            f"Render Scale: {round(RENDER_SCALE * 100)}%",
             "Back",
         ]
-        for i, label in enumerate(labels):
-            color = (255, 255, 255) if i != selected else (0, 255, 0)
-            draw_text(screen, label, 36, 360, 180 + i * 60, color)
-        draw_text(screen, "←/→ pour régler le volume, Entrée pour valider", 22, 250, 380, (200, 200, 200))
-        pygame.display.flip()
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit(); sys.exit()
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    selected = (selected - 1) % len(options)
-                elif event.key == pygame.K_DOWN:
-                    selected = (selected + 1) % len(options)
-                elif event.key == pygame.K_LEFT and selected == 1 and audio_manager:
-                    audio_manager.adjust_music_volume(-0.05)
-                elif event.key == pygame.K_RIGHT and selected == 1 and audio_manager:
-                    audio_manager.adjust_music_volume(0.05)
-                elif event.key == pygame.K_RETURN:
-                    if selected == 0 and audio_manager:
-                        audio_manager.toggle_mute()
-                    elif selected == 2:
-                        return
-        clock.tick(30)
+    def choose(self, i: int):
+        if i == 0 and audio_manager:
+            audio_manager.toggle_mute()
+            self.base = None  # a label changed
+            return UI_REDRAW
+        if i == 7:
+            return UI_BACK
+        return None
+
+    def adjust(self, i: int, step: int):
+        global PARTY_FIGHTERS, AI_LEVEL, DISPLAY_FULLSCREEN, DISPLAY_SCALING, RENDER_SCALE
+        if i == 1 and audio_manager:
+            audio_manager.adjust_music_volume(0.05 * step)
+        elif i == 2:
+            PARTY_FIGHTERS = max(4, min(8, PARTY_FIGHTERS + step))
+        elif i == 3:
+            AI_LEVEL = "hard" if AI_LEVEL == "normal" else "normal"
+        elif i in (4, 5, 6):
+            if i == 4:
+                DISPLAY_FULLSCREEN = not DISPLAY_FULLSCREEN
+            elif i == 5:
+                DISPLAY_SCALING = DISPLAY_SCALINGS[(DISPLAY_SCALINGS.index(DISPLAY_SCALING) + step) % len(DISPLAY_SCALINGS)]
+            else:
+                k = RENDER_SCALES.index(RENDER_SCALE) if RENDER_SCALE in RENDER_SCALES else 0
+                RENDER_SCALE = RENDER_SCALES[max(0, min(len(RENDER_SCALES) - 1, k - step))]
+            open_display()  # run_ui() picks up the new surface
+        else:
+            return None
+        self.base = None
+        return UI_REDRAW
+
+
+def run_ui(screen, scene: Scene):
+    # runs scenes until one returns a result; None once the last one is closed. Draws on the
+    # current display surface: `screen` may predate a window reopened by F11 or the settings
+    screen = pygame.display.get_surface() or screen
+    stack = [scene]
+    redraw = True
+    while stack:
+        top = stack[-1]
+        if top.update():
+            redraw = True
+        # one frame once the queue is drained, not one per queued key
+        if redraw and not pygame.event.peek():
+            top.draw(screen)
+            redraw = False
+        event = pygame.event.wait(top.wait_ms())
+        if event.type == pygame.NOEVENT:
+            continue
+        if event.type == pygame.QUIT:
+            pygame.quit(); sys.exit()
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWSIZECHANGED):
+            redraw = True
+        elif event.type == pygame.KEYDOWN and event.key == FULLSCREEN_KEY:
+            toggle_fullscreen()
+        else:
+            out = top.handle(event)
+            if isinstance(out, Scene):
+                stack.append(out)
+                redraw = True
+            elif out == UI_BACK:
+                stack.pop()
+                redraw = True
+            elif out == UI_REDRAW:
+                redraw = True
+            elif out is not None:
+                return out
+        if pygame.display.get_surface() is not screen:
+            # the window was reopened: every cached base has the old size or format
+            screen = pygame.display.get_surface()
+            for s in stack:
+                s.base = None
+            redraw = True
+    return None
+
+
+def main_menu(screen, preloader: Preloader | None = None) -> str:
+    return run_ui(screen, MainMenu(preloader))
+
+
+# ---------------- Frame Pacing ----------------
+class FrameStats:
+    # Rolling render frame times plus sim step accounting for the fixed-timestep loop
+    def __init__(self, window: int = 600):
+        self.frame_times = deque(maxlen=window)
+        self.frames = 0
+        self.sim_steps = 0
+        self.dropped_steps = 0    # sim time thrown away after a frame slower than MAX_STEPS_PER_FRAME
+        self.catchup_steps = 0    # extra sim steps run in one frame to catch up
+        self.repeated_frames = 0  # frames rendered without a new sim step (interpolated only)
+
+    def record(self, frame_time: float, steps: int, dropped: int):
+        self.frame_times.append(frame_time)
+        self.frames += 1
+        self.sim_steps += steps
+        self.dropped_steps += dropped
+        if steps > 1:
+            self.catchup_steps += steps - 1
+        elif steps == 0:
+            self.repeated_frames += 1
+
+    def percentiles(self) -> dict:
+        # frame time in ms
+        times = sorted(self.frame_times)
+        if not times:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+        pick = lambda q: times[min(len(times) - 1, int(q * len(times)))] * 1000.0
+        return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+    def summary(self) -> dict:
+        out = self.percentiles()
+        out.update(frames=self.frames, sim_steps=self.sim_steps, dropped_steps=self.dropped_steps,
+                   catchup_steps=self.catchup_steps, repeated_frames=self.repeated_frames)
+        return out
+
+
+frame_stats = FrameStats()
+
+
+# ---------------- Frame Profiler ----------------
+# fight frame phases in loop order; step() and FightRenderer.draw() mark their own
+PROFILE_PHASES = ("input", "ai", "sim.fighters", "sim.projectiles", "audio", "background",
+                  "sprites", "particles", "hud", "overlay", "present", "events", "idle")
+PROFILE_BINS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33)  # histogram bin upper edges, last bin open
+PROFILE_REFRESH = 15  # overlay text is re-rendered every this many frames
+PROFILE_KEY = pygame.K_F3
+
+
+class PhaseStats:
+    # rolling window of one phase's time per frame (ms), with its histogram kept in step
+    __slots__ = ("samples", "bins")
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.bins = [0] * (len(PROFILE_BINS_MS) + 1)
+
+    def add(self, ms: float):
+        if len(self.samples) == self.samples.maxlen:
+            self.bins[bisect.bisect_left(PROFILE_BINS_MS, self.samples[0])] -= 1
+        self.samples.append(ms)
+        self.bins[bisect.bisect_left(PROFILE_BINS_MS, ms)] += 1
+
+    def mean(self) -> float:
+        return sum(self.samples) / len(self.samples) if self.samples else 0.0
+
+    def peak(self) -> float:
+        return max(self.samples, default=0.0)
+
+
+class FrameProfiler:
+    # Per-phase fight frame times as rolling histograms, images and labels created per frame
+    # (asset / text cache misses: the game's own Surface allocation sites), an overlay toggled
+    # with F3 and an optional JSONL trace (one line per frame). While off, active() is None
+    # and the loop, step() and the renderer only test for that.
+    def __init__(self, window: int = 300):
+        self.window = window
+        self.overlay = False
+        self.trace = None
+        self.phases = {name: PhaseStats(window) for name in PROFILE_PHASES}
+        self.frame_ms = PhaseStats(window)
+        self.images = PhaseStats(window)
+        self.texts = PhaseStats(window)
+        self.frames = 0
+        self.current = dict.fromkeys(PROFILE_PHASES, 0.0)
+        self.start = self.last = 0.0
+        self.image_start = self.text_start = 0
+        self.panel = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.overlay or self.trace is not None
+
+    def active(self):
+        return self if self.enabled else None
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        self.panel = None
+
+    def open_trace(self, path: str):
+        # buffered: flush_trace() at the end of each fight, close_trace() at exit
+        self.trace = open(path, "a")
+
+    def flush_trace(self):
+        if self.trace is not None:
+            self.trace.flush()
+
+    def close_trace(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+    def begin_frame(self):
+        for name in self.current:
+            self.current[name] = 0.0
+        self.start = self.last = time.perf_counter()
+        self.image_start = assets.misses
+        self.text_start = text_cache.misses
+
+    def mark(self, phase: str):
+        # the time since the previous mark belongs to phase
+        now = time.perf_counter()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self, steps: int):
+        self.mark("idle")
+        total = (self.last - self.start) * 1000.0
+        images = assets.misses - self.image_start
+        texts = text_cache.misses - self.text_start
+        self.frames += 1
+        self.frame_ms.add(total)
+        self.images.add(images)
+        self.texts.add(texts)
+        for name, sec in self.current.items():
+            self.phases[name].add(sec * 1000.0)
+        if self.trace is not None:
+            self.trace.write(json.dumps({
+                "frame": self.frames, "t": round(self.start, 6), "ms": round(total, 4), "steps": steps,
+                "images": images, "texts": texts,
+                "phases": {name: round(sec * 1000.0, 4) for name, sec in self.current.items() if sec},
+            }) + "\n")
+
+    def summary(self) -> dict:
+        # per phase mean / max ms and histogram counts over the window
+        out = {name: {"mean": st.mean(), "max": st.peak(), "hist": list(st.bins)}
+               for name, st in self.phases.items()}
+        out["frame"] = {"mean": self.frame_ms.mean(), "max": self.frame_ms.peak(), "hist": list(self.frame_ms.bins)}
+        return out
+
+    def draw_overlay(self, screen: pygame.Surface) -> pygame.Rect:
+        # the panel is re-rendered a few times per second and blitted as is in between
+        if self.panel is None or self.frames % PROFILE_REFRESH == 0:
+            self.render_panel()
+        return screen.blit(self.panel, (10, 60))
+
+    def render_panel(self):
+        font = text_cache.font(16)
+        line = font.get_linesize()
+        if self.panel is None:
+            self.panel = pygame.Surface((250, line * (len(PROFILE_PHASES) + 4) + 8), pygame.SRCALPHA)
+        panel = self.panel
+        panel.fill((0, 0, 0, 170))
+        mean = self.frame_ms.mean()
+        fps = 1000.0 / mean if mean else 0.0
+        rows = [(f"FPS {fps:.1f}", f"{mean:.2f}", f"{self.frame_ms.peak():.2f}"), ("phase (ms)", "avg", "max")]
+        rows += [(name, f"{st.mean():.2f}", f"{st.peak():.2f}") for name, st in self.phases.items()]
+        rows.append((f"images/frame {self.images.mean():.2f}", f"text {self.texts.mean():.2f}", ""))
+        if audio_manager and audio_manager.voices:
+            v = audio_manager.voices.stats()
+            rows.append((f"voices {v['busy']}/{SFX_CHANNELS}  stolen {v['stolen']}", f"drop {v['dropped'] + v['throttled']}", ""))
+        for k, row in enumerate(rows):
+            for x, text in zip((8, 150, 200), row):
+                panel.blit(font.render(text, True, (255, 255, 0) if k < 2 else (255, 255, 255)), (x, 4 + k * line))
+
+
+profiler = FrameProfiler()
 
 
 # ---------------- Game Loop ----------------
 
-def game_loop(screen, mode):
-    bg_path = os.path.join(IMG_PATH, random.choice(BACKGROUND_IMAGES))
-    bg_img = pygame.image.load(bg_path).convert()
-    background = pygame.transform.smoothscale(bg_img, (SCREEN_WIDTH, SCREEN_HEIGHT))
+def load_stage(stage: str) -> pygame.Surface:
+    bg_path = os.path.join(IMG_PATH, stage)
+    # keep only the current stage resident
+    assets.evict(IMG_PATH, keep=bg_path)
+    return assets.get(bg_path, size=canvas_size(), alpha=False)
 
-    sprites = load_sprites()
-    p1 = Player(200, SCREEN_HEIGHT - 50, CONTROLS["player1"], sprites["player1"], True, is_p1=True)
-    if mode == "single":
-        p2 = Bot(SCREEN_WIDTH - 200, SCREEN_HEIGHT - 50, CONTROLS["player2"], sprites["player2"], False, is_p1=False)
-    else:
-        p2 = Player(SCREEN_WIDTH - 200, SCREEN_HEIGHT - 50, CONTROLS["player2"], sprites["player2"], False, is_p1=False)
 
+def fighter_label(match, i: int, mode: str) -> str:
+    # "Joueur N" for the people at the keyboard, "Bot N" for the others, SearchBot included
+    human = not match.fighters[i].is_bot and not (mode == "hard" and i == 1)
+    return f"{'Joueur' if human else 'Bot'} {i + 1}"
+
+
+def show_winner(screen, match, mode: str = "two"):
+    draw_text(screen, f"{fighter_label(match, match.winner, mode)} a gagné !", 50, 350, 250, (255, 0, 0))
+    pygame.display.flip()
+    pygame.time.wait(2000)
+
+
+def game_loop(screen, mode, seed: int | None = None):
+    sprites = load_sprites()
+    if seed is None:
+        seed = random.getrandbits(32)
+    if mode == "single" and AI_LEVEL == "hard":
+        mode = "hard"
+    fighters = PARTY_FIGHTERS if mode == "party" else 2
+    stage, match = start_match(mode, sprites, seed, fighters)
+    background = load_stage(stage)
+    replay = Replay(mode, seed, fighters=fighters)
+    match_id = telemetry.begin_match(mode, seed, fighters) if telemetry else None
+    views = fighter_views(match, load_sprites(RENDER_SCALE), RENDER_SCALE)
+    search_bot = SearchBot(match, 1) if mode == "hard" else None
+    buffers = (InputBuffer(CONTROLS["player1"]), InputBuffer(CONTROLS["player2"]))
+
+    renderer = FightRenderer(screen, background, views)
+    particles = renderer.particles = new_particles()
+
+    global frame_stats
+    frame_stats = FrameStats()
     clock = pygame.time.Clock()
+    dt = 1.0 / FPS
+    accumulator = 0.0
+    last = time.perf_counter()
     running = True
-    # stop menu music when fight starts
+    # pause menu music when fight starts
     if audio_manager:
-        pygame.mixer.music.stop()
+        audio_manager.pause_music()
     while running:
-        screen.blit(background, (0, 0))
-        keys = pygame.key.get_pressed()
-
-        p1.update(keys, p2)
-        p2.update(keys, p1)
-
-        # draw
-        p1.draw(screen)
-        p2.draw(screen)
-
-        # projectiles collisions
-        for proj in list(p1.projectiles):
-            if proj.get_hitbox().colliderect(p2.get_hurtbox()):
-                p2.health = max(0, p2.health - 20)
-                proj.kill()
-        for proj in list(p2.projectiles):
-            if proj.get_hitbox().colliderect(p1.get_hurtbox()):
-                p1.health = max(0, p1.health - 20)
-                proj.kill()
-
-        draw_health_bar(screen, 50, 30, p1.health)
-        draw_health_bar(screen, SCREEN_WIDTH - 250, 30, p2.health)
-
-        if p1.health <= 0 or p2.health <= 0:
-            winner = "Joueur 1" if p2.health <= 0 else "Joueur 2"
-            draw_text(screen, f"{winner} a gagné !", 50, 350, 250, (255, 0, 0))
-            pygame.display.flip()
-            pygame.time.wait(2000)
+        # attached per frame, so F3 takes effect on the next one
+        prof = renderer.profiler = match.profiler = profiler.active()
+        if prof:
+            prof.begin_frame()
+        now = time.perf_counter()
+        frame_time = now - last
+        last = now
+        # fixed timestep: the sim always advances in 1/FPS steps, whatever the render rate
+        dropped = 0
+        if frame_time > MAX_STEPS_PER_FRAME * dt:
+            dropped = int((frame_time - MAX_STEPS_PER_FRAME * dt) / dt)
+            accumulator += MAX_STEPS_PER_FRAME * dt
+        else:
+            accumulator += frame_time
+        steps = 0
+        while accumulator >= dt and not match.over:
+            for view in views:
+                view.remember()
+            keys = pygame.key.get_pressed()
+            p1_input = buffers[0].tick(keys, match.fighters[0].facing_right)
+            if prof:
+                prof.mark("input")
+            p2_input = search_bot.input(match) if search_bot else buffers[1].tick(keys, match.fighters[1].facing_right)
+            if prof:
+                prof.mark("ai" if search_bot else "input")
+            replay.record(p1_input, p2_input)
+            events = step(match, p1_input, p2_input)
+            if telemetry:
+                telemetry.record(match_id, match.tick, events)
+            play_events(events)
+            if particles:
+                particles.play(events, match)
+            if prof:
+                prof.mark("audio")
+            accumulator -= dt
+            steps += 1
+        frame_stats.record(frame_time, steps, dropped)
+        alpha = min(1.0, accumulator / dt)
+        if particles:
+            particles.update(steps, match)
+
+        # draw, interpolated between the last two sim states
+        renderer.draw(match, alpha)
+
+        if match.over:
+            if RECORD_REPLAYS:
+                save_replay(replay, REPLAY_PATH)
+            if telemetry:
+                telemetry.end_match(match_id, match)
+            show_winner(screen, match, mode)
             running = False
 
-        pygame.display.flip()
-
         for event in pygame.event.get():
+            for buffer in buffers:
+                buffer.feed(event)  # fight keys reach the next sim tick even if already released
             if event.type == pygame.QUIT:
                 pygame.quit(); sys.exit()
+            elif event.type == pygame.VIDEOEXPOSE:
+                renderer.full_redraw = True
+            elif event.type == pygame.KEYDOWN and event.key == PROFILE_KEY:
+                profiler.toggle_overlay()
+            elif event.type == pygame.KEYDOWN and event.key == FULLSCREEN_KEY:
+                screen = renderer.screen = toggle_fullscreen()
+                renderer.full_redraw = True
             elif event.type == pygame.KEYDOWN and audio_manager:
                 if event.key == pygame.K_m:
                     audio_manager.toggle_mute()
@@ -572,36 +2902,161 @@ def game_loop(screen, mode):
                     audio_manager.adjust_music_volume(0.05)
                 elif event.key in (pygame.K_MINUS, pygame.K_UNDERSCORE):
                     audio_manager.adjust_music_volume(-0.05)
+        if prof:
+            prof.mark("events")
+
+        clock.tick(MAX_RENDER_FPS)
+        if prof:
+            prof.end_frame(steps)
+    profiler.flush_trace()  # the fight's frames are on disk once it is over
+
+
+REPLAY_SPEEDS = (1, 2, 4, 8, 16)
 
+
+def replay_loop(screen, replay: Replay, speed: int = 1):
+    # watch a replay: ←/→ seek 5s, ↑/↓ change speed, Space pause, Échap quit
+    sprites = load_sprites()
+    player = ReplayPlayer(replay, sprites)
+    background = load_stage(player.stage)
+    views = fighter_views(player.match, load_sprites(RENDER_SCALE), RENDER_SCALE)
+    renderer = FightRenderer(screen, background, views)
+    particles = renderer.particles = new_particles()
+    clock = pygame.time.Clock()
+    paused = False
+    while True:
+        if not paused:
+            steps = 0
+            for _ in range(speed):
+                if player.done:
+                    break
+                events = player.step()
+                steps += 1
+                if speed == 1:
+                    play_events(events)
+                if particles:
+                    particles.play(events, player.match)
+            if particles:
+                particles.update(steps, player.match)
+        renderer.draw(player.match)
+        if player.done:
+            if player.match.over:
+                show_winner(screen, player.match, replay.mode)
+            return player.match
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit(); sys.exit()
+            elif event.type == pygame.VIDEOEXPOSE:
+                renderer.full_redraw = True
+            elif event.type == pygame.KEYDOWN and event.key == FULLSCREEN_KEY:
+                screen = renderer.screen = toggle_fullscreen()
+                renderer.full_redraw = True
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    return player.match
+                elif event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    delta = 5 * FPS if event.key == pygame.K_RIGHT else -5 * FPS
+                    player.seek(player.match.tick + delta)
+                    if particles:
+                        particles.clear()
+                    for view in views:
+                        view.remember()
+                elif event.key in (pygame.K_UP, pygame.K_DOWN):
+                    i = REPLAY_SPEEDS.index(speed) if speed in REPLAY_SPEEDS else 0
+                    i += 1 if event.key == pygame.K_UP else -1
+                    speed = REPLAY_SPEEDS[max(0, min(len(REPLAY_SPEEDS) - 1, i))]
         clock.tick(FPS)
 
 
 # ---------------- Main ----------------
 
 def main():
+    global DISPLAY_FULLSCREEN, DISPLAY_SCALING, RENDER_SCALE
+    parser = argparse.ArgumentParser(description="School Fighter")
+    parser.add_argument("--replay", metavar="FILE", help="watch a recorded fight")
+    parser.add_argument("--speed", type=int, default=1, help="replay speed multiplier")
+    parser.add_argument("--headless", action="store_true", help="run the replay without display, as fast as possible")
+    parser.add_argument("--bake", action="store_true", help="rebuild the baked asset bundle and exit")
+    parser.add_argument("--profile-trace", metavar="FILE", help="append per-frame phase timings of every fight as JSONL")
+    parser.add_argument("--fullscreen", action="store_true", help="start fullscreen (F11 toggles)")
+    parser.add_argument("--scaling", choices=DISPLAY_SCALINGS, default=DISPLAY_SCALING,
+                        help="window scaling: whole multiples of the canvas, or fill it keeping the aspect ratio")
+    parser.add_argument("--render-scale", type=float, default=RENDER_SCALE,
+                        help="canvas size relative to 960x540, e.g. 0.5 on weak machines")
+    args = parser.parse_args()
+    DISPLAY_FULLSCREEN = DISPLAY_FULLSCREEN or args.fullscreen
+    DISPLAY_SCALING = args.scaling
+    RENDER_SCALE = max(0.25, min(1.0, args.render_scale))
+
+    if args.replay and args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.mixer.pre_init(MIXER_FREQUENCY, -16, 2, MIXER_BUFFER)
     pygame.init()
     try:
         pygame.mixer.init()
     except Exception:
         pass
 
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption("School Fighter")
-
-    global audio_manager
-    audio_manager = AudioManager(SOUND_PATH, os.path.join(SOUND_PATH, "background_music.mp3"))
+    screen = open_display()
+    if args.bake:
+        bundle = bake_bundle()
+        print(f"{len(bundle.frames)} frames, {len(bundle.blobs)} stages -> {bundle.directory}")
+        pygame.quit()
+        return
+    assets.bundle = AssetBundle.open()
+    if assets.bundle is None:
+        bake_in_background()
+    if args.profile_trace:
+        profiler.open_trace(args.profile_trace)
+        atexit.register(profiler.close_trace)  # every exit path, sys.exit() from a loop included
+
+    if args.replay:
+        replay = Replay.load(args.replay)
+        if args.headless:
+            sprites = load_sprites()
+            t0 = time.perf_counter()
+            match = run_replay_headless(replay, sprites)
+            elapsed = time.perf_counter() - t0
+            winner = "none" if match.winner is None else fighter_label(match, match.winner, replay.mode)
+            print(f"{replay.frames} frames in {elapsed:.3f}s ({replay.frames / max(elapsed, 1e-9):.0f} frames/s), "
+                  f"winner: {winner}, health: {[f.health for f in match.fighters]}")
+        else:
+            replay_loop(screen, replay, args.speed)
+        pygame.quit()
+        return
+
+    global audio_manager, telemetry
+    if TELEMETRY:
+        telemetry = TelemetryBus()
+        atexit.register(telemetry.close)  # quitting mid-fight still leaves readable files
+    # the menu comes up right away; sprites, effects and the first stage decode behind it
+    audio_manager = AudioManager(SOUND_PATH, os.path.join(SOUND_PATH, "background_music.mp3"), load_effects=False)
+    preloader = Preloader()
+    queue_fight_assets(preloader, audio_manager)
+    seed = random.getrandbits(32)
+    prefetch_stage(preloader, seed)
+    preloader.start()
     # Play background music only in menus
     audio_manager.play_music(-1)
 
     while True:
-        mode = main_menu(screen)
-        # stop music before entering the fight loop (safety)
+        mode = main_menu(screen, preloader)
+        screen = pygame.display.get_surface()  # settings may have reopened the window
+        preloader.finish()  # whatever the menu did not get to yet
+        # pause music before entering the fight loop (safety)
         if audio_manager:
-            pygame.mixer.music.stop()
-        game_loop(screen, mode)
-        # when returning to menu, resume music
+            audio_manager.pause_music()
+        game_loop(screen, mode, seed)
+        screen = pygame.display.get_surface()  # F11 in the fight reopens the window
+        seed = random.getrandbits(32)
+        prefetch_stage(preloader, seed)
+        # when returning to menu, resume music where it was paused
         if audio_manager:
-            audio_manager.play_music(-1)
+            audio_manager.resume_music(-1)
 
 
 if __name__ == "__main__":
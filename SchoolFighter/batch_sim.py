@@ -0,0 +1,372 @@
+import argparse
+import os
+import sys
+
+# headless: the batch engine only needs sprite sizes, never a window or audio device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pygame
+import School_fighter1 as sf
+
+# ---------------- Batch Simulation ----------------
+# N matches stepped at once with the rules of School_fighter1.step(). Every field is an
+# array shaped (2, N) (fighter, match); projectiles use fixed slots shaped (2, K, N).
+# Fighters are still updated p1 then p2, as in the scalar path, but each update is a
+# handful of array operations over all matches.
+
+STATES = ("idle", "walk", "jump", "punch", "kick", "special", "block")
+IDLE, WALK, JUMP, PUNCH, KICK, SPECIAL, BLOCK = range(len(STATES))
+MOVE_NAMES = ("punch", "kick", "special")
+FIGHTERS = ("player1", "player2")
+
+
+def projectile_slots(d) -> int:
+    # the most projectiles one fighter can have in flight: one launch per cooldown of its
+    # ranged moves, each alive until it has crossed the arena
+    ranged = [m for m in d.moves.values() if m.launch > 0]
+    if not ranged:
+        return 1
+    speed = abs(d.projectile.speed)
+    if speed == 0:
+        raise ValueError(f"{d.name}: a projectile with speed 0 never leaves the arena")
+    gap = max(1, min(m.cooldown for m in ranged) - (max(m.launch for m in ranged) - min(m.launch for m in ranged)))
+    life = (sf.SCREEN_WIDTH + d.projectile.size[0] + d.widest) // speed + 2
+    return -(-life // gap)
+
+
+def load_headless_sprites() -> dict:
+    pygame.init()
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((1, 1))
+    return sf.load_sprites()
+
+
+class BatchMatch:
+    def __init__(self, n: int, sprites: dict, bots=(False, False), seed=None):
+        self.n = n
+        self.data = [sf.fighter_data(name, sprites[name]) for name in FIGHTERS]
+        # frame size and hurtbox for (fighter, state, attack_frames_left), from the compiled tables
+        ticks = max(len(d.fit[name]) for d in self.data for name in STATES)
+        fit = np.zeros((6, 2, len(STATES), ticks), dtype=np.int32)
+        # move rules by (fighter, state); zero for states that are not moves
+        moves = np.zeros((4, 2, len(STATES)), dtype=np.int32)
+        for i, d in enumerate(self.data):
+            for s, name in enumerate(STATES):
+                table = d.fit[name]
+                for t in range(ticks):
+                    w, h, box = table[min(t, len(table) - 1)]
+                    fit[:, i, s, t] = (w, h) + box
+                move = d.moves.get(name)
+                if move is not None:
+                    moves[:, i, s] = move.duration, move.cooldown, move.damage, move.launch
+        self.frame_w, self.frame_h, self.box_dx, self.box_dy, self.box_w, self.box_h = fit
+        self.move_duration, self.move_cooldown, self.move_damage, self.move_launch = moves
+        self.is_move = self.move_duration > 0
+        self.bot_moves = [np.array([STATES.index(m) for m in d.bot_moves], dtype=np.int32) for d in self.data]
+        self.proj = [d.projectile for d in self.data]
+
+        def col(a, b, dtype=np.int32):
+            return np.array([np.full(n, a), np.full(n, b)], dtype=dtype)
+
+        self.cx = col(200, sf.SCREEN_WIDTH - 200)
+        self.bottom = col(sf.GROUND_Y, sf.GROUND_Y)
+        self.state = col(IDLE, IDLE)
+        self.attack_frames_left = col(0, 0)
+        self.w = self.frame_w[[0, 1], IDLE, 0][:, None].repeat(n, axis=1)
+        self.h = self.frame_h[[0, 1], IDLE, 0][:, None].repeat(n, axis=1)
+        self.bx = self.box_dx[[0, 1], IDLE, 0][:, None].repeat(n, axis=1)
+        self.by = self.box_dy[[0, 1], IDLE, 0][:, None].repeat(n, axis=1)
+        self.bw = self.box_w[[0, 1], IDLE, 0][:, None].repeat(n, axis=1)
+        self.bh = self.box_h[[0, 1], IDLE, 0][:, None].repeat(n, axis=1)
+        self.facing_right = col(True, False, bool)
+        self.vel_y = col(0, 0)
+        self.on_ground = col(True, True, bool)
+        self.health = col(self.data[0].health, self.data[1].health)
+        self.blocking = col(False, False, bool)
+        self.attack_cooldown = col(0, 0)
+        self.pending_projectile_frames = col(0, 0)
+        self.jumps_used = col(0, 0)
+        self.jump_was_down = col(False, False, bool)
+        self.is_bot = col(bots[0], bots[1], bool)
+
+        shape = (2, max(projectile_slots(d) for d in self.data), n)
+        self.p_x = np.zeros(shape, dtype=np.int32)
+        self.p_y = np.zeros(shape, dtype=np.int32)
+        self.p_vx = np.zeros(shape, dtype=np.int32)
+        self.p_alive = np.zeros(shape, dtype=bool)
+
+        self.rng = np.random.default_rng(seed)
+        self.tick = 0
+        self.winner = np.full(n, -1, dtype=np.int32)
+        self.ko_tick = np.full(n, -1, dtype=np.int32)
+        # damage dealt by (fighter, move, match) up to the KO
+        self.damage = np.zeros((2, len(MOVE_NAMES), n), dtype=np.int32)
+
+    # ---- geometry ----
+    def hurtbox(self, i: int) -> tuple:
+        return self.cx[i] + self.bx[i], self.bottom[i] + self.by[i], self.bw[i], self.bh[i]
+
+    @staticmethod
+    def overlaps(a: tuple, b: tuple) -> np.ndarray:
+        return (a[0] < b[0] + b[2]) & (b[0] < a[0] + a[2]) & (a[1] < b[1] + b[3]) & (b[1] < a[1] + a[3])
+
+    # ---- rules ----
+    def start_attack(self, i: int, mask: np.ndarray, move):
+        if not mask.any():
+            return
+        j = 1 - i
+        launch = self.move_launch[i][move]
+        self.state[i] = np.where(mask, move, self.state[i])
+        self.attack_frames_left[i] = np.where(mask, self.move_duration[i][move], self.attack_frames_left[i])
+        self.attack_cooldown[i] = np.where(mask, self.move_cooldown[i][move], self.attack_cooldown[i])
+        ranged = mask & (launch > 0)
+        melee = mask & ~ranged
+        self.pending_projectile_frames[i] = np.where(ranged, launch, self.pending_projectile_frames[i])
+        if melee.any():
+            hit = melee & self.overlaps(self.hurtbox(i), self.hurtbox(j))
+            dmg = self.move_damage[i][move]
+            dmg = np.where(self.blocking[j], dmg // sf.BLOCK_DIVISOR, dmg)
+            dmg = np.where(hit, np.minimum(dmg, self.health[j]), 0)
+            self.health[j] -= dmg
+            live = self.winner < 0
+            self.damage[i, 0] += np.where(live & (move == PUNCH), dmg, 0)
+            self.damage[i, 1] += np.where(live & (move == KICK), dmg, 0)
+
+    def spawn_projectiles(self, i: int, mask: np.ndarray):
+        direction = np.where(self.facing_right[i], 1, -1)
+        w, h = self.w[i], self.h[i]
+        start_x = self.cx[i] + (w // 2) * direction
+        start_y = self.bottom[i] - h + h // 2 + self.data[i].projectile_dy
+        pw, ph = self.proj[i].size
+        idx = np.nonzero(mask)[0]
+        slot = np.argmin(self.p_alive[i][:, idx], axis=0)  # first free slot
+        if self.p_alive[i, slot, idx].any():
+            raise RuntimeError(f"{self.data[i].name}: no free projectile slot, projectile_slots() is too low")
+        self.p_x[i, slot, idx] = start_x[idx] - pw // 2
+        self.p_y[i, slot, idx] = start_y[idx] - ph // 2
+        self.p_vx[i, slot, idx] = self.proj[i].speed * direction[idx]
+        self.p_alive[i, slot, idx] = True
+        # reset sprite to starting sprite once projectile launched
+        self.attack_frames_left[i][mask] = 0
+        self.state[i][mask] = IDLE
+
+    def update_fighter(self, i: int, inp: np.ndarray, roll: np.ndarray, choice: np.ndarray):
+        j = 1 - i
+        d = self.data[i]
+        cx, state = self.cx[i], self.state[i]
+        afl, cooldown = self.attack_frames_left[i], self.attack_cooldown[i]
+
+        # bot: follow and random attack
+        bot = self.is_bot[i]
+        if bot.any():
+            left = cx - self.w[i] // 2
+            opp_left = self.cx[j] - self.w[j] // 2
+            go_left = bot & (opp_left < left)
+            go_right = bot & ~go_left & (opp_left > left)
+            cx -= d.bot_speed * go_left
+            cx += d.bot_speed * go_right
+            self.facing_right[i][go_left] = False
+            self.facing_right[i][go_right] = True
+            fire = bot & (roll == 0) & (cooldown == 0) & (afl <= 0)
+            self.start_attack(i, fire, self.bot_moves[i][choice])
+
+        # movement disabled during attack execution window
+        free = afl <= 0
+        go_left = free & (inp & sf.IN_LEFT != 0)
+        go_right = free & (inp & sf.IN_RIGHT != 0)
+        cx -= d.walk_speed * go_left
+        cx += d.walk_speed * go_right
+        self.facing_right[i][go_left] = False
+        self.facing_right[i][go_right] = True
+        state[go_left | go_right] = WALK
+
+        # jump (edge triggered, double jump)
+        jump_now = inp & sf.IN_JUMP != 0
+        jump = jump_now & ~self.jump_was_down[i] & (self.jumps_used[i] < d.max_jumps) & (afl <= 0)
+        self.vel_y[i][jump] = d.jump_velocity
+        self.on_ground[i][jump] = False
+        state[jump] = JUMP
+        self.jumps_used[i] += jump
+        self.jump_was_down[i] = jump_now
+
+        # timers and delayed projectile spawn
+        cooldown -= cooldown > 0
+        afl -= afl > 0
+        pending = self.pending_projectile_frames[i]
+        waiting = pending > 0
+        pending -= waiting
+        launch = waiting & (pending == 0)
+        if launch.any():
+            self.spawn_projectiles(i, launch)
+
+        # attacks from input, punch > kick > special
+        ready = (afl <= 0) & (cooldown == 0)
+        move = np.where(inp & sf.IN_PUNCH != 0, PUNCH,
+                        np.where(inp & sf.IN_KICK != 0, KICK, SPECIAL)).astype(np.int32)
+        self.start_attack(i, ready & (inp & (sf.IN_PUNCH | sf.IN_KICK | sf.IN_SPECIAL) != 0), move)
+
+        # back to idle once an attack has played out
+        attacking = self.is_move[i][state]
+        rest = ((afl == 0) & attacking & ~self.blocking[i] & ~((self.move_launch[i][state] > 0) & (pending > 0))
+                & self.on_ground[i] & (inp & (sf.IN_LEFT | sf.IN_RIGHT) == 0))
+        state[rest] = IDLE
+
+        # blocking
+        self.blocking[i] = inp & sf.IN_BLOCK != 0
+        state[self.blocking[i]] = BLOCK
+
+        # gravity
+        self.vel_y[i] += sf.GRAVITY
+        self.bottom[i] += self.vel_y[i]
+        grounded = self.bottom[i] >= sf.GROUND_Y
+        self.bottom[i][grounded] = sf.GROUND_Y
+        self.vel_y[i][grounded] = 0
+        self.on_ground[i] |= grounded
+        self.jumps_used[i][grounded] = 0
+
+        # screen bounds
+        w = self.w[i]
+        half = w // 2
+        np.copyto(cx, half, where=cx - half < 0)
+        np.copyto(cx, sf.SCREEN_WIDTH - w + half, where=cx - half + w > sf.SCREEN_WIDTH)
+
+        # frame size and hurtbox for the new state
+        self.w[i] = self.frame_w[i][state, afl]
+        self.h[i] = self.frame_h[i][state, afl]
+        self.bx[i] = self.box_dx[i][state, afl]
+        self.by[i] = self.box_dy[i][state, afl]
+        self.bw[i] = self.box_w[i][state, afl]
+        self.bh[i] = self.box_h[i][state, afl]
+
+    def step(self, inputs: np.ndarray, rolls=None, choices=None):
+        # inputs: (2, N) ACTIONS bitmasks; rolls / choices feed the bots (drawn here when omitted)
+        n = self.n
+        if rolls is None:
+            rolls = self.rng.integers(0, 61, size=(2, n))
+            choices = np.stack([self.rng.integers(0, len(self.bot_moves[i]), size=n) for i in (0, 1)])
+
+        # projectiles fly
+        self.p_x += np.where(self.p_alive, self.p_vx, 0)
+        for i in (0, 1):
+            pw = self.proj[i].size[0]
+            self.p_alive[i] &= (self.p_x[i] + pw >= 0) & (self.p_x[i] <= sf.SCREEN_WIDTH)
+
+        self.update_fighter(0, inputs[0], rolls[0], choices[0])
+        self.update_fighter(1, inputs[1], rolls[1], choices[1])
+
+        # projectile collisions
+        live = self.winner < 0
+        for i in (0, 1):
+            j = 1 - i
+            pw, ph = self.proj[i].size
+            new_w, new_h = self.proj[i].hit
+            box = (self.p_x[i] + (pw - new_w) // 2, self.p_y[i] + (ph - new_h) // 2, new_w, new_h)
+            hit = self.p_alive[i] & self.overlaps(box, self.hurtbox(j))
+            count = hit.sum(axis=0)
+            dmg = np.minimum(self.proj[i].damage * count, self.health[j])
+            self.health[j] -= dmg
+            self.damage[i, 2] += np.where(live, dmg, 0)
+            self.p_alive[i] &= ~hit
+
+        self.tick += 1
+        ko = live & ((self.health[0] <= 0) | (self.health[1] <= 0))
+        self.winner[ko] = np.where(self.health[1] <= 0, 0, 1)[ko]
+        self.ko_tick[ko] = self.tick
+
+    def run(self, max_ticks: int = 60 * 60, inputs=None):
+        # step until every match has a winner (bots only, unless inputs are given)
+        idle = np.zeros((2, self.n), dtype=np.int32) if inputs is None else inputs
+        while self.tick < max_ticks and (self.winner < 0).any():
+            self.step(idle)
+        return self.winner, self.ko_tick
+
+
+# ---------------- Scalar equivalence ----------------
+
+class ReplayRng:
+    # Stands in for random.Random in a scalar match: hands each bot the roll/choice the batch drew
+    def __init__(self):
+        self.queue = []
+        self._choice = 0
+
+    def randint(self, a, b):
+        roll, self._choice = self.queue.pop(0)
+        return int(roll)
+
+    def choice(self, seq):
+        return seq[self._choice]
+
+
+def check_equivalence(n: int = 64, ticks: int = 900, seed: int = 0) -> int:
+    # runs N scalar matches next to one BatchMatch with the same inputs / bot rolls and
+    # compares every fighter and projectile field each tick; returns the compared ticks
+    sprites = load_headless_sprites()
+    rng = np.random.default_rng(seed)
+    # a mix of human-vs-human, human-vs-bot and bot-vs-bot matches
+    bots = [(k % 3 == 2, k % 3 >= 1) for k in range(n)]
+    batch = BatchMatch(n, sprites)
+    batch.is_bot[:] = np.array(bots, dtype=bool).T
+    scalar = []
+    for b in bots:
+        m = sf.new_match("two", sprites, rng=ReplayRng())
+        m.fighters[0].is_bot, m.fighters[1].is_bot = b
+        scalar.append(m)
+
+    state_names = {name: k for k, name in enumerate(STATES)}
+    for t in range(ticks):
+        inputs = np.zeros((2, n), dtype=np.int32)
+        for bit in range(len(sf.ACTIONS)):
+            inputs |= (rng.random((2, n)) < 0.15).astype(np.int32) << bit
+        rolls = rng.integers(0, 4, size=(2, n))  # frequent attacks exercise more rules
+        choices = rng.integers(0, 3, size=(2, n))
+        batch.step(inputs, rolls, choices)
+        for k, m in enumerate(scalar):
+            m.rng.queue = [(rolls[i, k], choices[i, k]) for i in (0, 1) if bots[k][i]]
+            sf.step(m, int(inputs[0, k]), int(inputs[1, k]))
+            for i, f in enumerate(m.fighters):
+                got = tuple(int(v[i, k]) for v in (
+                    batch.cx, batch.bottom, batch.w, batch.h, batch.health, batch.state,
+                    batch.attack_frames_left, batch.attack_cooldown, batch.pending_projectile_frames,
+                    batch.vel_y, batch.jumps_used, batch.facing_right, batch.blocking))
+                want = tuple(int(v) for v in (
+                    f.cx, f.bottom, f.w, f.h, f.health, state_names[f.state],
+                    f.attack_frames_left, f.attack_cooldown, f.pending_projectile_frames,
+                    f.vel_y, f.jumps_used, f.facing_right, f.blocking))
+                if got != want:
+                    raise AssertionError(f"tick {t} match {k} fighter {i}: batch {got} != scalar {want}")
+                alive = batch.p_alive[i, :, k]
+                got_p = sorted(zip(batch.p_x[i, alive, k].tolist(), batch.p_y[i, alive, k].tolist()))
+                want_p = sorted((p.x, p.y) for p in m.projectiles if p.owner == i)
+                if got_p != want_p:
+                    raise AssertionError(f"tick {t} match {k} projectiles {i}: batch {got_p} != scalar {want_p}")
+            want_winner = -1 if m.winner is None else m.winner
+            if batch.winner[k] != want_winner:
+                raise AssertionError(f"tick {t} match {k}: winner {batch.winner[k]} != {want_winner}")
+    return ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized School Fighter bot matches")
+    parser.add_argument("--matches", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="compare against the scalar step() instead")
+    args = parser.parse_args()
+    if args.check:
+        ticks = check_equivalence(seed=args.seed)
+        print(f"batch == scalar for {ticks} ticks")
+        return 0
+    batch = BatchMatch(args.matches, load_headless_sprites(), bots=(True, True), seed=args.seed)
+    winner, ko_tick = batch.run()
+    done = winner >= 0
+    print(f"{done.sum()}/{args.matches} matches finished in {batch.tick} ticks")
+    print(f"p1 wins {np.mean(winner[done] == 0):.3f}, mean duration {ko_tick[done].mean() / sf.FPS:.1f}s")
+    for m, name in enumerate(MOVE_NAMES):
+        print(f"{name:>8} damage/match: p1 {batch.damage[0, m].mean():.1f}  p2 {batch.damage[1, m].mean():.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
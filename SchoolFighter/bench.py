@@ -0,0 +1,1146 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+# headless: benchmarks never open a real window or audio device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+LAUNCH_DIR = os.getcwd()  # --out / --baseline are relative to where the command was run
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import pygame
+import School_fighter1 as sf
+
+
+def init_display():
+    pygame.init()
+    pygame.display.set_mode((sf.SCREEN_WIDTH, sf.SCREEN_HEIGHT))
+
+
+# ---------------- Player.animate ----------------
+
+def legacy_animate(player):
+    # animate() as it was before frame tables: dict lookup, float math and a flip per frame
+    f = player.fighter
+    prev = player.rect.midbottom
+    frames = player.sprites[f.state].right
+    duration = f.data.moves["special"].duration
+    if f.state == "special" and len(frames) > 1 and duration > 0:
+        elapsed = max(0, duration - max(0, f.attack_frames_left))
+        img = frames[min(len(frames) - 1, int(elapsed / duration * len(frames)))]
+    else:
+        img = frames[0]
+    if not f.facing_right:
+        img = pygame.transform.flip(img, True, False)
+    player.image = img
+    player.rect = player.image.get_rect(midbottom=prev)
+
+
+def bench_animate(frames: int = 6000) -> dict:
+    init_display()
+    sprites = sf.load_sprites()
+    fighter = sf.FighterState(200, sf.GROUND_Y, sf.fighter_data("player1", sprites["player1"]), False)
+    p = sf.Player(fighter, sprites["player1"])
+    known = {id(img) for anim in p.sprites.values() for img in anim.right + anim.left}
+    # cycle every action and attack tick, always facing left (the flipping case)
+    schedule = [(state, t) for state in p.sprites for t in range(len(fighter.data.frames[state]))]
+
+    def run(fn):
+        surfaces = pixels = 0
+        elapsed = 0.0
+        for n in range(frames):
+            fighter.state, fighter.attack_frames_left = schedule[n % len(schedule)]
+            t0 = time.perf_counter()
+            fn(p)
+            elapsed += time.perf_counter() - t0
+            # any image that is not one of the preloaded frames was allocated this frame
+            if id(p.image) not in known:
+                surfaces += 1
+                pixels += p.image.get_pitch() * p.image.get_height()
+        return {
+            "surfaces_per_frame": surfaces / frames,
+            "bytes_per_frame": pixels // frames,
+            "us_per_frame": elapsed / frames * 1e6,
+        }
+
+    return {"legacy": run(legacy_animate), "table": run(sf.Player.animate)}
+
+
+# ---------------- draw_text ----------------
+
+def legacy_draw_text(surface, text, size, x, y, color=(255, 255, 255)):
+    # draw_text as it was before TextCache: a SysFont lookup and a rasterization per call
+    font = pygame.font.SysFont("arial", size)
+    surface.blit(font.render(text, True, color), (x, y))
+
+
+def bench_draw_text(frames: int = 60) -> dict:
+    init_display()
+    screen = pygame.display.get_surface()
+    # one main_menu frame worth of labels
+    labels = [("School Fighter", 60, (255, 255, 0))]
+    labels += [(o, 40, (255, 255, 255)) for o in ["Single Player", "Two Players", "Party", "Instructions", "Settings", "Exit"]]
+
+    def run(fn):
+        t0 = time.perf_counter()
+        for _ in range(frames):
+            for i, (text, size, color) in enumerate(labels):
+                fn(screen, text, size, 360, 80 + i * 60, color)
+        return {"ms_per_frame": (time.perf_counter() - t0) / frames * 1e3}
+
+    legacy = run(legacy_draw_text)
+    cached = run(sf.draw_text)
+    cached.update(sf.text_cache.stats())
+    return {"legacy": legacy, "cached": cached}
+
+
+# ---------------- Simulation ----------------
+
+def bench_sim(ticks: int = 200_000, seed: int = 1) -> dict:
+    # bot vs bot matches through step(), no rendering
+    init_display()
+    sprites = sf.load_sprites()
+
+    def fresh(n):
+        m = sf.new_match("single", sprites, seed=seed + n)
+        m.fighters[0].is_bot = True
+        return m
+
+    m = fresh(0)
+    matches = 1
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        sf.step(m, 0, 0)
+        if m.over:
+            m = fresh(matches)
+            matches += 1
+    elapsed = time.perf_counter() - t0
+    return {"headless": {"ticks_per_s": ticks / elapsed, "matches": matches}}
+
+
+def bench_batch(matches: int = 4096, seed: int = 1) -> dict:
+    # the same bot-vs-bot matches, stepped together as arrays
+    import batch_sim
+    sprites = sf.load_sprites() if pygame.display.get_surface() else batch_sim.load_headless_sprites()
+    batch = batch_sim.BatchMatch(matches, sprites, bots=(True, True), seed=seed)
+    t0 = time.perf_counter()
+    winner, _ = batch.run()
+    elapsed = time.perf_counter() - t0
+    done = int((winner >= 0).sum())
+    return {"numpy": {"matches_per_s": done / elapsed, "ticks_per_s": batch.tick * matches / elapsed}}
+
+
+# ---------------- Input buffer ----------------
+
+def bench_input(counts=(1, 10, 100, 1000), ticks: int = 50_000, seed: int = 1) -> dict:
+    # InputBuffer.tick on mashed keys with more and more motion commands compiled in:
+    # the automaton keeps the per-tick cost flat
+    rng = random.Random(seed)
+    directions = "12346789"
+    controls = sf.CONTROLS["player1"]
+    frames = [HeldKeys({controls[a] for a in sf.ACTIONS if rng.random() < 0.3}) for _ in range(997)]
+    stats = {}
+    for count in counts:
+        commands = dict(sf.MOTION_COMMANDS)
+        for n in range(count - 1):
+            seq = tuple(rng.choice(directions) for _ in range(rng.randint(2, 5))) + (rng.choice("PKS"),)
+            commands[f"cmd{n}"] = ((seq,), sf.IN_SPECIAL)
+        automaton = sf.MotionAutomaton(commands)
+        buffer = sf.InputBuffer(controls, automaton=automaton)
+        t0 = time.perf_counter()
+        for n in range(ticks):
+            buffer.tick(frames[n % len(frames)], n & 64 == 0)
+        stats[f"{count} cmds"] = {"us_per_tick": (time.perf_counter() - t0) / ticks * 1e6,
+                                  "states": len(automaton.table), "matched": buffer.commands}
+    return stats
+
+
+# each case: the actions held on successive ticks (player1 facing right) and the input the
+# last tick must give
+MOTION_CASES = (
+    ("quarter circle + punch", (("block",), ("block", "right"), ("right",), ("right", "punch")), sf.IN_SPECIAL),
+    ("block, forward, punch", (("block",), (), ("right",), ("right", "punch")), sf.IN_PUNCH),
+    ("block to forward, punch", (("block",), ("right",), ("right", "punch")), sf.IN_PUNCH),
+    ("forward punch", (("right",), ("right", "punch")), sf.IN_PUNCH),
+)
+
+
+def check_motions() -> int:
+    # runs MOTION_CASES through a fresh InputBuffer each; the number of cases that fail
+    controls = sf.CONTROLS["player1"]
+    failed = 0
+    for name, ticks, expected in MOTION_CASES:
+        buffer = sf.InputBuffer(controls)
+        for held in ticks:
+            mask = buffer.tick(HeldKeys({controls[a] for a in held}), True)
+        attack = mask & (sf.IN_PUNCH | sf.IN_KICK | sf.IN_SPECIAL)
+        ok = attack == expected
+        failed += not ok
+        print(f"{name:<26} {'ok' if ok else f'FAIL: got {attack}, expected {expected}'}")
+    return failed
+
+
+# ---------------- Fight rendering ----------------
+
+def bench_render(frames: int = 600, seed: int = 1) -> dict:
+    # the same bot-vs-bot fight drawn through the full-screen path and the dirty-rect path
+    init_display()
+    screen = pygame.display.get_surface()
+    background = sf.assets.get(os.path.join(sf.IMG_PATH, sf.BACKGROUND_IMAGES[0]),
+                               size=(sf.SCREEN_WIDTH, sf.SCREEN_HEIGHT), alpha=False)
+    sprites = sf.load_sprites()
+
+    def run(dirty: bool) -> dict:
+        m = sf.new_match("single", sprites, seed=seed)
+        m.fighters[0].is_bot = True
+        views = sf.fighter_views(m, sprites)
+        renderer = sf.FightRenderer(screen, background, views, dirty=dirty)
+        pixels = 0
+        elapsed = 0.0
+        for _ in range(frames):
+            sf.step(m, 0, 0)
+            t0 = time.perf_counter()
+            renderer.draw(m)
+            elapsed += time.perf_counter() - t0
+            pixels += renderer.pixels_pushed
+        return {"pixels_per_frame": pixels // frames, "ms_per_frame": elapsed / frames * 1e3}
+
+    return {"full": run(False), "dirty": run(True)}
+
+
+# ---------------- Display scaling ----------------
+
+DISPLAY_SIZES = ((960, 540), (1920, 1080), (2560, 1440), (3840, 2160))
+
+
+def bench_display(sizes=DISPLAY_SIZES, frames: int = 200, seed: int = 1) -> dict:
+    # a bot fight drawn on the canvas and presented at each window size: SDL scaling the
+    # canvas (full and half render scale) against upscaling it on the CPU every frame
+    from pygame._sdl2.video import Window
+    init_display()
+    saved = sf.RENDER_SCALE, sf.DISPLAY_SCALING
+    sprites = sf.load_sprites()
+
+    def fight(screen, scale: float):
+        m = sf.new_match("single", sprites, seed=seed)
+        m.fighters[0].is_bot = True
+        renderer = sf.FightRenderer(screen, sf.load_stage(sf.BACKGROUND_IMAGES[0]),
+                                    sf.fighter_views(m, sf.load_sprites(scale), scale))
+        renderer.particles = sf.new_particles()
+        return m, renderer
+
+    def sdl(size, scale: float) -> dict:
+        sf.RENDER_SCALE = scale
+        screen = sf.open_display()
+        Window.from_display_module().size = size
+        pygame.event.pump()
+        m, renderer = fight(screen, scale)
+        t0 = time.perf_counter()
+        for _ in range(frames):
+            events = sf.step(m, 0, 0)
+            if renderer.particles:
+                renderer.particles.play(events, m)
+                renderer.particles.update(1, m)
+            renderer.draw(m)
+        elapsed = time.perf_counter() - t0
+        # present alone: the canvas pushed and scaled once more, nothing drawn
+        t0 = time.perf_counter()
+        for _ in range(frames // 4):
+            pygame.display.flip()
+        return {"ms_per_frame": elapsed / frames * 1e3,
+                "present_ms": (time.perf_counter() - t0) / (frames // 4) * 1e3}
+
+    def cpu(size, smooth: bool) -> dict:
+        # present cost alone: the canvas is drawn once, then scaled into the window every frame
+        sf.RENDER_SCALE = 1.0
+        pygame.display.quit()
+        pygame.display.init()
+        window = pygame.display.set_mode(size)
+        canvas = pygame.Surface((sf.SCREEN_WIDTH, sf.SCREEN_HEIGHT)).convert()
+        m, renderer = fight(canvas, 1.0)
+        renderer.draw(m)
+        scale = pygame.transform.smoothscale if smooth else pygame.transform.scale
+        t0 = time.perf_counter()
+        for _ in range(frames // 4):
+            scale(canvas, size, window)
+            pygame.display.flip()
+        return {"present_ms": (time.perf_counter() - t0) / (frames // 4) * 1e3}
+
+    stats = {}
+    try:
+        for size in sizes:
+            name = f"{size[0]}x{size[1]}"
+            stats[f"{name} sdl"] = sdl(size, 1.0)
+            stats[f"{name} sdl x0.5"] = sdl(size, 0.5)
+            stats[f"{name} cpu scale"] = cpu(size, False)
+            stats[f"{name} cpu smooth"] = cpu(size, True)
+    finally:
+        sf.RENDER_SCALE, sf.DISPLAY_SCALING = saved
+        pygame.display.quit()
+        pygame.display.init()
+        init_display()
+    return stats
+
+
+# ---------------- Frame profiler ----------------
+
+def bench_profiler(frames: int = 3000, seed: int = 1) -> dict:
+    # one simulated + rendered fight frame with the profiler off, collecting, and with its overlay
+    init_display()
+    screen = pygame.display.get_surface()
+    background = sf.load_stage(sf.BACKGROUND_IMAGES[0])
+    sprites = sf.load_sprites()
+
+    def run(prof, overlay: bool = False) -> dict:
+        m = sf.new_match("single", sprites, seed=seed)
+        m.fighters[0].is_bot = True
+        renderer = sf.FightRenderer(screen, background, sf.fighter_views(m, sprites))
+        renderer.profiler = m.profiler = prof
+        if prof:
+            prof.overlay = overlay
+        t0 = time.perf_counter()
+        for _ in range(frames):
+            if prof:
+                prof.begin_frame()
+            sf.step(m, 0, 0)
+            renderer.draw(m)
+            if prof:
+                prof.end_frame(1)
+            if m.over:
+                m = sf.new_match("single", sprites, seed=seed)
+                m.fighters[0].is_bot = True
+                renderer.views = sf.fighter_views(m, sprites)
+                renderer.profiler = m.profiler = prof
+        return {"us_per_frame": (time.perf_counter() - t0) / frames * 1e6}
+
+    prof = sf.FrameProfiler()
+    stats = {"off": run(None), "on": run(prof), "overlay": run(prof, overlay=True)}
+    for name in ("on", "overlay"):
+        stats[name]["overhead_pct"] = (stats[name]["us_per_frame"] / stats["off"]["us_per_frame"] - 1) * 100
+    return stats
+
+
+# ---------------- Projectiles ----------------
+
+def legacy_projectile_step(m, events):
+    # projectile phase as it was before pooling: fresh hitbox/hurtbox tuples per test,
+    # every opposing pair tested for a clash, dead projectiles dropped for the GC
+    for proj in m.projectiles:
+        proj.x += proj.vx
+        proj.hx += proj.vx
+        if proj.x + proj.w < 0 or proj.x > sf.SCREEN_WIDTH:
+            proj.alive = False
+    sf.update_fighter(m, 0, 0, events)
+    sf.update_fighter(m, 1, 0, events)
+    projs = m.projectiles
+    for k, a in enumerate(projs):
+        for b in projs[k + 1:]:
+            if a.alive and b.alive and a.owner != b.owner and sf.overlaps(a.hitbox(), b.hitbox()):
+                a.alive = b.alive = False
+                events.append(("clash", a, b))
+    for proj in projs:
+        if proj.alive and sf.overlaps(proj.hitbox(), m.fighters[1 - proj.owner].hurtbox()):
+            proj.alive = False
+            events.append(("projectile_hit", proj.owner, proj, m.projectile_kinds[proj.kind].damage))
+    m.projectiles = [p for p in projs if p.alive]
+
+
+def bench_projectiles(counts=(10, 100, 250, 500, 1000), ticks: int = 60, seed: int = 1) -> dict:
+    # bullet-hell stress: the field is topped up to `count` live projectiles every tick
+    init_display()
+    sprites = sf.load_sprites()
+
+    def run(pooled: bool) -> dict:
+        stats = {}
+        for count in counts:
+            rng = random.Random(seed)
+            m = sf.new_match("two", sprites, seed=seed, projectile_clash=True)
+            for f in m.fighters:
+                f.health = 10 ** 9
+            allocated = 0
+            elapsed = 0.0
+            for _ in range(ticks):
+                while len(m.projectiles) < count:
+                    owner = rng.randrange(2)
+                    spec = m.fighters[owner].data.projectile
+                    vx = -spec.speed if owner else spec.speed
+                    args = (rng.randrange(sf.SCREEN_WIDTH), rng.randrange(sf.SCREEN_HEIGHT), spec, vx, owner)
+                    if pooled:
+                        m.projectiles.append(m.pool.acquire(*args))
+                    else:
+                        m.projectiles.append(sf.ProjectileState(*args))
+                        allocated += 1
+                t0 = time.perf_counter()
+                if pooled:
+                    sf.step(m, 0, 0)
+                else:
+                    legacy_projectile_step(m, [])
+                elapsed += time.perf_counter() - t0
+            stats[f"ms@{count}"] = elapsed / ticks * 1e3
+            stats[f"new@{count}"] = (m.pool.allocated if pooled else allocated) / ticks
+        return stats
+
+    return {"legacy": run(False), "pooled": run(True)}
+
+
+# ---------------- Party ----------------
+
+def bench_party(counts=(2, 4, 8, 16, 32), ticks: int = 3000, frames: int = 600, seed: int = 1) -> dict:
+    # all-bot free-for-all through step(); a flat cost per fighter means no pairwise work
+    init_display()
+    screen = pygame.display.get_surface()
+    background = sf.assets.get(os.path.join(sf.IMG_PATH, sf.BACKGROUND_IMAGES[0]),
+                               size=(sf.SCREEN_WIDTH, sf.SCREEN_HEIGHT), alpha=False)
+    sprites = sf.load_sprites()
+
+    def fresh(n, k):
+        m = sf.new_match("party", sprites, seed=seed + k, fighters=n)
+        for f in m.fighters:
+            f.is_bot = True
+        return m
+
+    step, per_fighter = {}, {}
+    for n in counts:
+        m = fresh(n, 0)
+        matches = 1
+        standing = 0  # fighter-ticks actually simulated: knocked out fighters cost nothing
+        elapsed = 0.0
+        for _ in range(ticks):
+            standing += sum(f.health > 0 for f in m.fighters)
+            t0 = time.perf_counter()
+            sf.step(m)
+            elapsed += time.perf_counter() - t0
+            if m.over:
+                m = fresh(n, matches)
+                matches += 1
+        step[f"us@{n}"] = elapsed / ticks * 1e6
+        per_fighter[f"us@{n}"] = elapsed / standing * 1e6
+
+    # a full 8-fighter frame: simulation plus the dirty-rect draw
+    m = fresh(8, 0)
+    renderer = sf.FightRenderer(screen, background, sf.fighter_views(m, sprites))
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        sf.step(m)
+        renderer.draw(m)
+        if m.over:
+            m = fresh(8, 1)
+            renderer = sf.FightRenderer(screen, background, sf.fighter_views(m, sprites))
+    frame = {"ms_per_frame@8": (time.perf_counter() - t0) / frames * 1e3, "budget_ms": 1e3 / sf.FPS}
+    return {"step": step, "fighter": per_fighter, "frame": frame}
+
+
+# ---------------- Roster ----------------
+
+def bench_roster(sizes=(2, 8, 32), fighters: int = 8, ticks: int = 3000, seed: int = 1) -> dict:
+    # party matches cycling through `size` roster entries (named copies of the shipped fighters):
+    # every fighter is compiled to its own tables, so the tick cost should not grow with the roster
+    init_display()
+    shipped = sf.ROSTER_DATA
+    sf.load_sprites()  # images decoded outside the timings
+    stats = {}
+    try:
+        for size in sizes:
+            data = copy.deepcopy(shipped)
+            names = tuple(f"fighter{k}" for k in range(size))
+            for k, name in enumerate(names):
+                data["fighters"][name] = {"base": ("player1", "player2")[k % 2]}
+            t0 = time.perf_counter()
+            sf.set_roster(data)
+            sprites = sf.load_sprites()
+
+            def fresh(k):
+                m = sf.new_match("party", sprites, seed=seed + k, fighters=fighters, names=names)
+                for f in m.fighters:
+                    f.is_bot = True
+                return m
+
+            m = fresh(0)
+            load = time.perf_counter() - t0
+            matches = 1
+            elapsed = 0.0
+            for _ in range(ticks):
+                t0 = time.perf_counter()
+                sf.step(m)
+                elapsed += time.perf_counter() - t0
+                if m.over:
+                    m = fresh(matches)
+                    matches += 1
+            stats[f"roster@{size}"] = {"load_ms": load * 1e3, "us_per_tick": elapsed / ticks * 1e6}
+    finally:
+        sf.set_roster(shipped)
+    return stats
+
+
+# ---------------- Search AI ----------------
+
+SEARCH_SLACK_MS = 0.25  # past the budget: the last 8-tick stretch of a rollout
+
+
+def bench_search(matches: int = 10, budget_ms: float = sf.SEARCH_BUDGET_MS, seed: int = 1) -> dict:
+    # SearchBot (player 2) against the random bot: decision cost against the budget, and wins
+    init_display()
+    sprites = sf.load_sprites()
+    searches = nodes = 0
+    search_time = max_time = max_cpu = depth = 0.0
+    wins = 0
+
+    def cpu_timed(search):
+        # CPU time of each search: unlike wall time it leaves out the vCPU being descheduled,
+        # which on shared machines stalls any loop for milliseconds
+        def timed(m):
+            nonlocal max_cpu
+            t0 = time.thread_time()
+            action = search(m)
+            max_cpu = max(max_cpu, time.thread_time() - t0)
+            return action
+        return timed
+
+    for k in range(matches):
+        m = sf.new_match("hard", sprites, seed=seed + k)
+        m.fighters[0].is_bot = True
+        bot = sf.SearchBot(m, 1, budget_ms=budget_ms)
+        bot.search = cpu_timed(bot.search)
+        while not m.over and m.tick < sf.FPS * 120:
+            sf.step(m, 0, bot.input(m))
+        wins += m.winner == 1
+        searches += bot.searches
+        nodes += bot.nodes
+        search_time += bot.search_time
+        max_time = max(max_time, bot.max_time)
+        depth += bot.depth_sum
+    assert max_cpu * 1e3 <= budget_ms + SEARCH_SLACK_MS, \
+        f"SearchBot took {max_cpu * 1e3:.3f} ms of CPU, budget {budget_ms} ms + {SEARCH_SLACK_MS} ms"
+    return {"hard": {
+        "budget_ms": budget_ms,
+        "avg_ms": search_time / searches * 1e3,
+        "max_ms": max_time * 1e3,
+        "max_cpu_ms": max_cpu * 1e3,
+        "nodes_per_s": nodes / search_time,
+        "avg_horizon": depth / searches,
+        "win_rate": wins / matches,
+    }}
+
+
+# ---------------- Audio ----------------
+
+class LegacyVoices:
+    # play_sfx as it was: Sound.play() on any free channel, nothing when all are busy
+    def __init__(self):
+        self.played = self.dropped = 0
+
+    def play(self, name, snd):
+        if snd.play() is None:
+            self.dropped += 1
+        else:
+            self.played += 1
+
+    def stats(self) -> dict:
+        return {"played": self.played, "dropped": self.dropped}
+
+
+def bench_audio(seconds: float = 2.0, fighters: int = 8, seed: int = 1) -> dict:
+    # a party mashing attack buttons every tick, effects paced in real time so voices overlap as in play
+    init_display()
+    try:
+        pygame.mixer.init(sf.MIXER_FREQUENCY, -16, 2, sf.MIXER_BUFFER)
+    except pygame.error:
+        return {}
+    sprites = sf.load_sprites()
+    audio = sf.AudioManager(sf.SOUND_PATH, os.path.join(sf.SOUND_PATH, "background_music.mp3"))
+
+    def run(voices) -> dict:
+        pygame.mixer.stop()
+        audio.voices = voices
+        sf.audio_manager = audio
+        m = sf.new_match("party", sprites, seed=seed, fighters=fighters)
+        for f in m.fighters:
+            f.is_bot = False
+            f.health = 10 ** 9
+        mash = (sf.IN_PUNCH, sf.IN_KICK, sf.IN_SPECIAL, sf.IN_BLOCK | sf.IN_PUNCH)
+        peak = 0
+        elapsed = 0.0
+        ticks = int(seconds * sf.FPS)
+        for t in range(ticks):
+            events = sf.step(m, *(mash[(t + k) % len(mash)] for k in range(fighters)))
+            t0 = time.perf_counter()
+            sf.play_events(events)
+            elapsed += time.perf_counter() - t0
+            peak = max(peak, sum(1 for k in range(pygame.mixer.get_num_channels()) if pygame.mixer.Channel(k).get_busy()))
+            time.sleep(1 / sf.FPS)
+        sf.audio_manager = None
+        stats = voices.stats()
+        stats.update(peak_channels=peak, us_per_tick=elapsed / ticks * 1e6)
+        return stats
+
+    pygame.mixer.set_num_channels(8)  # pygame's default
+    legacy = run(LegacyVoices())
+    return {"legacy": legacy, "voices": run(sf.VoiceManager())}
+
+
+# ---------------- Particles ----------------
+
+class SpriteParticle(pygame.sprite.Sprite):
+    # the naive alternative: one sprite object per particle, moved and blitted one by one
+    def __init__(self, image, x, y, vx, vy, life):
+        super().__init__()
+        self.image = image
+        self.rect = image.get_rect(topleft=(x, y))
+        self.x, self.y, self.vx, self.vy, self.life = x, y, vx, vy, life
+
+    def update(self):
+        self.vy += 0.2
+        self.x += self.vx
+        self.y += self.vy
+        self.life -= 1
+        self.rect.topleft = (self.x, self.y)
+        if self.life <= 0:
+            self.kill()
+
+
+def bench_particles(counts=(500, 1000, 5000), frames: int = 300, seed: int = 1) -> dict:
+    # the field is topped up to `count` live particles every frame with spark bursts;
+    # update + draw per frame, ParticleSystem against per-particle sprites
+    init_display()
+    screen = pygame.display.get_surface()
+    stamp = pygame.Surface((2, 2))
+    stamp.fill((255, 200, 80))
+    stats = {}
+    for count in counts:
+        rng = random.Random(seed)
+        system = sf.ParticleSystem(seed=seed)
+        elapsed = 0.0
+        for _ in range(frames):
+            while system.n < count:
+                system.emit("spark", rng.uniform(100, sf.SCREEN_WIDTH - 100), rng.uniform(100, sf.SCREEN_HEIGHT - 100),
+                            min(200, count - system.n))
+            t0 = time.perf_counter()
+            system.update(1)
+            rects = system.draw(screen)
+            elapsed += time.perf_counter() - t0
+        stats[f"{count} arrays"] = {"ms_per_frame": elapsed / frames * 1e3, "rects": len(rects)}
+
+        group = pygame.sprite.Group()
+        elapsed = 0.0
+        for _ in range(frames // 10):
+            while len(group) < count:
+                group.add(SpriteParticle(stamp, rng.uniform(100, 900), rng.uniform(100, 500),
+                                         rng.uniform(-6, 6), rng.uniform(-6, 6), rng.randint(10, 16)))
+            t0 = time.perf_counter()
+            group.update()
+            group.draw(screen)
+            elapsed += time.perf_counter() - t0
+        stats[f"{count} sprites"] = {"ms_per_frame": elapsed / (frames // 10) * 1e3}
+    return stats
+
+
+# ---------------- Telemetry ----------------
+
+def bench_telemetry(matches: int = 200, seed: int = 1) -> dict:
+    # bot-vs-bot fights streamed through TelemetryBus at full sim speed (far faster than the
+    # 60 Hz game, so a small ring shows each drop policy), then the reader over the files
+    import shutil
+    import tempfile
+    import telemetry_report
+    init_display()
+    sprites = sf.load_sprites()
+
+    def run(policy: str, capacity: int) -> dict:
+        directory = tempfile.mkdtemp(prefix="sf-telemetry-")
+        bus = sf.TelemetryBus(directory, capacity=capacity, policy=policy)
+        ticks = 0
+        elapsed = worst = 0.0
+        for n in range(matches):
+            m = sf.new_match("single", sprites, seed=seed + n)
+            m.fighters[0].is_bot = True
+            mid = bus.begin_match("single", seed + n, 2)
+            while not m.over:
+                events = sf.step(m, 0, 0)
+                t0 = time.perf_counter()
+                bus.record(mid, m.tick, events)
+                dt = time.perf_counter() - t0
+                elapsed += dt
+                worst = max(worst, dt)
+                ticks += 1
+            bus.end_match(mid, m)
+        t0 = time.perf_counter()
+        bus.close(timeout=60)
+        stats = bus.stats()
+        stats.update(us_per_tick=elapsed / ticks * 1e6, worst_us=worst * 1e6,
+                     close_ms=(time.perf_counter() - t0) * 1e3,
+                     kb=sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) // 1024)
+        t0 = time.perf_counter()
+        files = [os.path.join(directory, f) for f in os.listdir(directory)]
+        totals = sum((telemetry_report.summarize(f) for f in files), telemetry_report.Counter())
+        stats.update(read_files_per_s=len(files) / (time.perf_counter() - t0), finished=sum(
+            v for k, v in totals.items() if k.startswith("finished:")))
+        shutil.rmtree(directory)
+        return stats
+
+    return {
+        "default": run("drop_newest", 8192),
+        "newest": run("drop_newest", 16),
+        "oldest": run("drop_oldest", 16),
+        "block": run("block", 16),
+    }
+
+
+# ---------------- Startup ----------------
+
+def bench_startup(menu_s: float = 1.5, seed: int = 1) -> dict:
+    # cold asset cache: time to the first menu frame, then from leaving the menu (after menu_s
+    # seconds, as a player would) to the first fight frame
+    init_display()
+    try:
+        pygame.mixer.init()
+    except pygame.error:
+        pass
+    screen = pygame.display.get_surface()
+    music = os.path.join(sf.SOUND_PATH, "background_music.mp3")
+
+    def run(preload: bool, bundle: bool = False) -> dict:
+        sf.assets.purge()
+        sf.assets.bundle = None
+        sf.text_cache.clear()
+        t0 = time.perf_counter()
+        if bundle:
+            sf.assets.bundle = sf.AssetBundle.open()
+        if preload:
+            audio = sf.AudioManager(sf.SOUND_PATH, music, load_effects=False)
+            preloader = sf.Preloader()
+            sf.queue_fight_assets(preloader, audio)
+            sf.prefetch_stage(preloader, seed)
+            preloader.start()
+            sf.MainMenu(preloader).draw(screen)
+        else:
+            sf.AudioManager(sf.SOUND_PATH, music)
+            sf.MainMenu().draw(screen)
+        first = time.perf_counter() - t0
+        ready = None
+        while time.perf_counter() - t0 < menu_s:
+            if preload and preloader.pump() and preloader.done and ready is None:
+                ready = time.perf_counter() - t0
+            time.sleep(1 / 30)
+        t1 = time.perf_counter()
+        if preload:
+            preloader.finish()
+        sprites = sf.load_sprites()
+        stage, match = sf.start_match("two", sprites, seed)
+        renderer = sf.FightRenderer(screen, sf.load_stage(stage), sf.fighter_views(match, sprites))
+        renderer.draw(match)
+        stats = {"first_frame_ms": first * 1e3, "menu_to_fight_ms": (time.perf_counter() - t1) * 1e3}
+        if preload:
+            stats["assets_ready_ms"] = (ready or t1 - t0) * 1e3
+        return stats
+
+    sf.load_bundle()  # baked outside the timings, as on any launch after the first
+    stats = {"blocking": run(False), "preload": run(True), "bundle": run(True, bundle=True)}
+    sf.assets.bundle = None
+    return stats
+
+
+# ---------------- Menus ----------------
+
+def legacy_instructions_screen(screen):
+    # instructions_screen as it was: drawn once, then a busy event.get() loop
+    sf.InstructionsScreen().compose(screen)
+    pygame.display.flip()
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.KEYDOWN:
+                return
+
+
+def legacy_main_menu(screen):
+    # a 30 FPS menu that polls and re-renders every label each frame
+    clock = pygame.time.Clock()
+    while True:
+        screen.fill((30, 30, 60))
+        sf.draw_text(screen, "School Fighter", 60, 320, 80, (255, 255, 0))
+        for i, option in enumerate(sf.MENU_OPTIONS):
+            sf.draw_text(screen, option, 40, 360, 180 + i * 55, (0, 255, 0) if i == 0 else (255, 255, 255))
+        pygame.display.flip()
+        for event in pygame.event.get():
+            if event.type == pygame.KEYDOWN:
+                return
+        clock.tick(30)
+
+
+def bench_menus(seconds: float = 2.0) -> dict:
+    # a menu left alone for `seconds`: CPU time used as a share of wall time, and frames drawn.
+    # A timer posts Enter to leave it, as a player coming back would
+    init_display()
+    screen = pygame.display.get_surface()
+    flip = pygame.display.flip
+    frames = [0]
+
+    def counted_flip():
+        frames[0] += 1
+        flip()
+
+    def run(fn) -> dict:
+        pygame.event.clear()
+        frames[0] = 0
+        pygame.display.flip = counted_flip
+        pygame.time.set_timer(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN), int(seconds * 1e3), 1)
+        try:
+            c0, t0 = time.process_time(), time.perf_counter()
+            fn(screen)
+            cpu, wall = time.process_time() - c0, time.perf_counter() - t0
+        finally:
+            pygame.display.flip = flip
+        return {"cpu_pct": cpu / wall * 100, "frames": frames[0]}
+
+    return {
+        "legacy_instructions": run(legacy_instructions_screen),
+        "legacy_menu": run(legacy_main_menu),
+        "instructions": run(lambda screen: sf.run_ui(screen, sf.InstructionsScreen())),
+        "menu": run(sf.main_menu),
+    }
+
+
+def bench_rollback(window: int = 8) -> dict:
+    # restore + re-simulate a full rollback window; must fit well inside one 16 ms frame
+    import netplay
+    init_display()
+    return {"resim": netplay.resim_cost(window)}
+
+
+# ---------------- Regression suite ----------------
+# Small fixed workloads, one number each (lower is better), compared against a stored
+# baseline. Baselines are machine specific: save one on the machine that checks it.
+BASELINE_PATH = "bench_baseline.json"
+SUITE_THRESHOLD = 0.25  # a case fails when it is this much slower than its baseline
+# noisier cases (disk, process start) get more room
+SUITE_THRESHOLDS = {"load_sprites_ms": 0.5, "load_sprites_bundle_ms": 0.5, "startup_ms": 0.5}
+
+
+class HeldKeys:
+    # what pygame.key.get_pressed() returns, for a given set of held keys
+    __slots__ = ("held",)
+
+    def __init__(self, held: set):
+        self.held = held
+
+    def __getitem__(self, key) -> bool:
+        return key in self.held
+
+
+def scripted_keys(seed: int, hold: int = 6):
+    # stands in for pygame.key.get_pressed: a seeded random set of both players' keys, each
+    # held for `hold` calls as a player would, so a fight plays out the same way every run
+    rng = random.Random(seed)
+    keys = [k for side in ("player1", "player2") for k in sf.CONTROLS[side].values()]
+    state = {"calls": 0, "held": HeldKeys(set())}
+
+    def get_pressed():
+        if state["calls"] % hold == 0:
+            state["held"] = HeldKeys({k for k in keys if rng.random() < 0.2})
+        state["calls"] += 1
+        return state["held"]
+    return get_pressed
+
+
+class SteppedTime:
+    # stands in for game_loop's time module: every perf_counter() call is one sim tick
+    # later, so each rendered frame runs exactly one step whatever the machine speed
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self) -> float:
+        self.now += 1.0 / sf.FPS
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def case_load_sprites() -> float:
+    # cold cache, loose files
+    sf.assets.purge()
+    sf.assets.bundle = None
+    t0 = time.perf_counter()
+    sf.load_sprites()
+    return (time.perf_counter() - t0) * 1e3
+
+
+def case_load_sprites_bundle() -> float:
+    # cold cache, through the baked bundle (opening it included)
+    sf.assets.purge()
+    t0 = time.perf_counter()
+    sf.assets.bundle = sf.AssetBundle.open()
+    sf.load_sprites()
+    elapsed = time.perf_counter() - t0
+    sf.assets.bundle = None
+    return elapsed * 1e3
+
+
+def case_animate(calls: int = 20_000) -> float:
+    sprites = sf.load_sprites()
+    fighter = sf.FighterState(200, sf.GROUND_Y, sf.fighter_data("player1", sprites["player1"]), False)
+    p = sf.Player(fighter, sprites["player1"])
+    schedule = [(state, t) for state in p.sprites for t in range(len(fighter.data.frames[state]))]
+    t0 = time.perf_counter()
+    for n in range(calls):
+        fighter.state, fighter.attack_frames_left = schedule[n % len(schedule)]
+        p.animate()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def case_update_fighter(ticks: int = 20_000, seed: int = 1) -> float:
+    # both fighters' per-tick update on random inputs, health pinned so the fight never ends
+    m = sf.new_match("two", sf.load_sprites(), seed=seed)
+    rng = random.Random(seed)
+    inputs = [rng.getrandbits(7) for _ in range(1024)]
+    events = []
+    t0 = time.perf_counter()
+    for n in range(ticks):
+        sf.update_fighter(m, 0, inputs[n % 1024], events)
+        sf.update_fighter(m, 1, inputs[(n + 512) % 1024], events)
+        events.clear()
+        if n % 256 == 0:
+            for f in m.fighters:
+                f.health = 100
+            for proj in m.projectiles:
+                m.pool.release(proj)
+            m.projectiles = []
+    return (time.perf_counter() - t0) / (2 * ticks) * 1e6
+
+
+def case_spawn_projectile(spawns: int = 20_000, seed: int = 1) -> float:
+    m = sf.new_match("two", sf.load_sprites(), seed=seed)
+    events = []
+    elapsed = 0.0
+    for n in range(0, spawns, 100):
+        t0 = time.perf_counter()
+        for k in range(100):
+            sf.spawn_projectile_now(m, m.fighters[k & 1], k & 1, events)
+        elapsed += time.perf_counter() - t0
+        events.clear()
+        for proj in m.projectiles:
+            m.pool.release(proj)
+        m.projectiles = []
+    return elapsed / spawns * 1e6
+
+
+def case_collide(count: int = 200, calls: int = 2000, seed: int = 1) -> float:
+    # collide_projectiles over a crowded field, projectiles revived between calls
+    m = sf.new_match("two", sf.load_sprites(), seed=seed, projectile_clash=True)
+    rng = random.Random(seed)
+    for k in range(count):
+        spec = m.fighters[k & 1].data.projectile
+        vx = spec.speed * (1 if k & 1 == 0 else -1)
+        m.projectiles.append(m.pool.acquire(rng.randrange(sf.SCREEN_WIDTH), rng.randrange(250, 450),
+                                            spec, vx, k & 1))
+    events = []
+    elapsed = 0.0
+    for _ in range(calls):
+        for proj in m.projectiles:
+            proj.alive = True
+        t0 = time.perf_counter()
+        sf.collide_projectiles(m, events)
+        elapsed += time.perf_counter() - t0
+        events.clear()
+    return elapsed / calls * 1e6
+
+
+def case_draw_text(frames: int = 2000) -> float:
+    # one main menu frame worth of labels, cache warm
+    screen = pygame.display.get_surface()
+    labels = [("School Fighter", 60)] + [(o, 40) for o in sf.MENU_OPTIONS]
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        for i, (text, size) in enumerate(labels):
+            sf.draw_text(screen, text, size, 360, 80 + i * 60)
+    return (time.perf_counter() - t0) / frames * 1e6
+
+
+def case_particles(count: int = 5000, frames: int = 300, seed: int = 1) -> float:
+    # update + draw of a field kept at `count` live spark particles
+    screen = pygame.display.get_surface()
+    rng = random.Random(seed)
+    system = sf.ParticleSystem(seed=seed)
+    elapsed = 0.0
+    for _ in range(frames):
+        while system.n < count:
+            system.emit("spark", rng.uniform(100, sf.SCREEN_WIDTH - 100), rng.uniform(100, sf.SCREEN_HEIGHT - 100),
+                        min(200, count - system.n))
+        t0 = time.perf_counter()
+        system.update(1)
+        system.draw(screen)
+        elapsed += time.perf_counter() - t0
+    return elapsed / frames * 1e3
+
+
+def case_game_loop_frame(seed: int = 1) -> float:
+    # the real game_loop on scripted keys, one sim step per rendered frame, until the KO;
+    # show_winner's 2 s pause is not a frame, so it is left out
+    saved = (sf.time, pygame.key.get_pressed, sf.RECORD_REPLAYS, sf.MAX_RENDER_FPS, sf.show_winner)
+    sf.time, pygame.key.get_pressed = SteppedTime(), scripted_keys(seed)
+    sf.RECORD_REPLAYS, sf.MAX_RENDER_FPS, sf.show_winner = False, 0, lambda *args: None
+    try:
+        t0 = time.perf_counter()
+        sf.game_loop(pygame.display.get_surface(), "two", seed)
+        elapsed = time.perf_counter() - t0
+    finally:
+        sf.time, pygame.key.get_pressed, sf.RECORD_REPLAYS, sf.MAX_RENDER_FPS, sf.show_winner = saved
+    return elapsed / sf.frame_stats.frames * 1e3
+
+
+STARTUP_PROBE = """
+import os, sys, time
+t0 = float(sys.argv[1])
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+import School_fighter1 as sf
+draw = sf.MainMenu.draw
+def first_frame(*args, **kwargs):
+    draw(*args, **kwargs)
+    print(time.time() - t0, flush=True)
+    os._exit(0)
+sf.MainMenu.draw = first_frame
+sys.argv = sys.argv[:1]
+sf.main()
+"""
+
+
+def case_startup() -> float:
+    # a fresh interpreter running main() up to its first menu frame
+    t0 = time.time()
+    out = subprocess.run([sys.executable, "-c", STARTUP_PROBE, repr(t0)], capture_output=True, text=True,
+                         check=True).stdout
+    return float(out.split()[-1]) * 1e3
+
+
+SUITE = {
+    "load_sprites_ms": case_load_sprites,
+    "load_sprites_bundle_ms": case_load_sprites_bundle,
+    "animate_us": case_animate,
+    "update_fighter_us": case_update_fighter,
+    "spawn_projectile_us": case_spawn_projectile,
+    "collide_projectiles_us": case_collide,
+    "draw_text_us": case_draw_text,
+    "particles_5k_ms": case_particles,
+    "game_loop_frame_ms": case_game_loop_frame,
+    "startup_ms": case_startup,
+}
+
+
+def run_suite(names: list, repeats: int) -> dict:
+    init_display()
+    sf.load_bundle()  # baked outside the timings
+    sf.load_sprites()
+    results = {}
+    for name in names:
+        SUITE[name]()  # warm-up run, not kept
+        # best of the repeats: noise from other processes only ever adds time
+        results[name] = min(SUITE[name]() for _ in range(repeats))
+        print(f"  {name:<24} {results[name]:10.3f}", flush=True)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    # names of the cases slower than their baseline by more than their threshold
+    failed = []
+    print(f"{'case':<24} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<24} {'-':>10} {value:10.3f} {'new':>8}")
+            continue
+        change = value / base - 1 if base else 0.0
+        limit = SUITE_THRESHOLDS.get(name, threshold)
+        bad = change > limit
+        if bad:
+            failed.append(name)
+        print(f"{name:<24} {base:10.3f} {value:10.3f} {change:+8.1%}" + (f"  > {limit:.0%} REGRESSION" if bad else ""))
+    return failed
+
+
+def suite_main(args) -> int:
+    names = [n for n in args.names if n in SUITE] or list(SUITE)
+    print(f"suite: {len(names)} cases, best of {args.repeats}")
+    results = run_suite(names, args.repeats)
+    meta = {"python": platform.python_version(), "pygame": pygame.version.ver, "machine": platform.machine(),
+            "cpus": os.cpu_count(), "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if args.out:
+        with open(os.path.join(LAUNCH_DIR, args.out), "w") as fh:
+            json.dump({"meta": meta, "cases": results}, fh, indent=2)
+    if args.save_baseline:
+        # cases not run this time keep their stored values
+        cases = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as fh:
+                cases = json.load(fh)["cases"]
+        cases.update(results)
+        with open(args.baseline, "w") as fh:
+            json.dump({"meta": meta, "cases": cases}, fh, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save-baseline first")
+        return 0
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)["cases"]
+    failed = compare(results, baseline, args.threshold)
+    if failed:
+        print(f"{len(failed)} regression(s): {', '.join(failed)}")
+        return 1
+    return 0
+
+
+BENCHMARKS = {
+    "animate": bench_animate,
+    "draw_text": bench_draw_text,
+    "sim": bench_sim,
+    "input": bench_input,
+    "batch": bench_batch,
+    "render": bench_render,
+    "display": bench_display,
+    "projectiles": bench_projectiles,
+    "party": bench_party,
+    "roster": bench_roster,
+    "search": bench_search,
+    "startup": bench_startup,
+    "menus": bench_menus,
+    "audio": bench_audio,
+    "particles": bench_particles,
+    "telemetry": bench_telemetry,
+    "profiler": bench_profiler,
+    "rollback": bench_rollback,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="School Fighter micro benchmarks (headless)")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all), or suite cases with --suite")
+    parser.add_argument("--suite", action="store_true", help="run the regression suite against the baseline")
+    parser.add_argument("--repeats", type=int, default=5, help="suite: runs per case, the fastest is kept")
+    parser.add_argument("--baseline", help=f"suite: baseline results file (default: {BASELINE_PATH} next to bench.py)")
+    parser.add_argument("--threshold", type=float, default=SUITE_THRESHOLD,
+                        help="suite: allowed slowdown as a fraction (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="suite: store this run as the new baseline")
+    parser.add_argument("--out", help="suite: also write this run's results as JSON")
+    parser.add_argument("--check", action="store_true", help="check that motion commands match the right inputs")
+    args = parser.parse_args()
+    if args.check:
+        return 1 if check_motions() else 0
+    if args.suite:
+        args.baseline = os.path.join(LAUNCH_DIR, args.baseline) if args.baseline else os.path.abspath(BASELINE_PATH)
+        return suite_main(args)
+    for name in args.names or list(BENCHMARKS):
+        result = BENCHMARKS[name]()
+        print(f"{name}:")
+        for variant, stats in result.items():
+            print(f"  {variant:>8}: " + ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                                                for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+import argparse
+import heapq
+import os
+import random
+import socket
+import struct
+import sys
+import time
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import pygame
+import School_fighter1 as sf
+
+# ---------------- Rollback ----------------
+# Each peer simulates every frame immediately, predicting the remote input as "same as the
+# last one received". A snapshot is saved before every frame whose remote input is still a
+# guess; when the real input arrives and differs, the match is restored to that frame and
+# re-simulated up to the present. At most `window` frames may run ahead of the last
+# confirmed remote input, which bounds the re-simulation cost.
+
+
+class RollbackSession:
+    def __init__(self, match: sf.MatchState, local: int, window: int = 8, input_delay: int = 2):
+        self.match = match
+        self.local = local
+        self.remote = 1 - local
+        self.window = window
+        self.delay = input_delay
+        # frame -> input bitmask; the first input_delay frames are idle on both sides
+        self.inputs = ({f: 0 for f in range(input_delay)}, {f: 0 for f in range(input_delay)})
+        self.predicted = {}   # frame -> remote input the frame was simulated with
+        self.snapshots = {}   # frame -> state before simulating it (only while unconfirmed)
+        self.frame = 0        # next frame to simulate
+        self.confirmed = input_delay - 1  # last frame with every remote input up to it known
+        self.rollback_from = None
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.max_depth = 0
+        self.stalls = 0
+
+    @property
+    def latest_local_frame(self) -> int:
+        return self.frame - 1 + self.delay
+
+    def remote_input(self, frame: int) -> int:
+        known = self.inputs[self.remote].get(frame)
+        if known is not None:
+            return known
+        return self.inputs[self.remote].get(self.confirmed, 0)
+
+    def on_remote_input(self, frame: int, inp: int):
+        remote = self.inputs[self.remote]
+        if frame in remote or frame <= self.confirmed:
+            return
+        remote[frame] = inp
+        while self.confirmed + 1 in remote:
+            self.confirmed += 1
+        if frame < self.frame and self.predicted.get(frame) != inp:
+            if self.rollback_from is None or frame < self.rollback_from:
+                self.rollback_from = frame
+
+    def simulate(self, frame: int) -> list:
+        remote = self.remote_input(frame)
+        if frame > self.confirmed:
+            self.snapshots[frame] = sf.snapshot(self.match)
+            self.predicted[frame] = remote
+        inputs = [0, 0]
+        inputs[self.local] = self.inputs[self.local][frame]
+        inputs[self.remote] = remote
+        return sf.step(self.match, inputs[0], inputs[1])
+
+    def rollback(self):
+        start = self.rollback_from
+        if start is None:
+            return
+        self.rollback_from = None
+        sf.restore(self.match, self.snapshots[start])
+        for frame in range(start, self.frame):
+            self.simulate(frame)  # events of re-simulated frames were already presented
+        depth = self.frame - start
+        self.rollbacks += 1
+        self.resimulated += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def advance(self, local_input: int):
+        # returns the new frame's events, or None when too far ahead of the remote peer
+        self.rollback()
+        if self.frame - self.confirmed > self.window:
+            self.stalls += 1
+            return None
+        self.inputs[self.local][self.frame + self.delay] = local_input
+        events = self.simulate(self.frame)
+        self.frame += 1
+        # confirmed frames can never be rolled back to
+        for frame in [f for f in self.snapshots if f <= self.confirmed]:
+            del self.snapshots[frame]
+            self.predicted.pop(frame, None)
+        return events
+
+    def stats(self) -> dict:
+        return {
+            "frame": self.frame,
+            "rollbacks": self.rollbacks,
+            "resimulated": self.resimulated,
+            "max_depth": self.max_depth,
+            "stalls": self.stalls,
+        }
+
+
+# ---------------- Transport ----------------
+PKT_SYNC, PKT_INPUT = 0, 1
+SYNC = struct.Struct("<BIB")      # type, seed, seen peer
+INPUT = struct.Struct("<BiIB")    # type, ack (last confirmed remote frame), first frame, count
+MAX_INPUTS_PER_PACKET = 64
+
+
+class UdpLink:
+    # Non-blocking UDP socket with optional simulated latency, jitter and packet loss.
+    # Loss is applied on send, delay on receive; `clock` may be a virtual clock for tests.
+    def __init__(self, local_addr: tuple, remote_addr: tuple, latency: float = 0.0, jitter: float = 0.0,
+                 loss: float = 0.0, seed=None, clock=time.monotonic):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(local_addr)
+        self.sock.setblocking(False)
+        self.remote_addr = remote_addr
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.delayed = []
+        self.seq = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, data: bytes):
+        self.sent += 1
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        try:
+            self.sock.sendto(data, self.remote_addr)
+        except OSError:
+            self.dropped += 1
+
+    def receive(self) -> list:
+        now = self.clock()
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break  # e.g. ICMP port unreachable before the peer is up
+            due = now + self.latency + self.rng.uniform(0.0, self.jitter)
+            heapq.heappush(self.delayed, (due, self.seq, data))
+            self.seq += 1
+        out = []
+        while self.delayed and self.delayed[0][0] <= now:
+            out.append(heapq.heappop(self.delayed)[2])
+        return out
+
+    def close(self):
+        self.sock.close()
+
+
+class NetPeer:
+    # Glues a RollbackSession to a UdpLink: encodes local inputs, feeds received ones back
+    def __init__(self, session: RollbackSession, link: UdpLink):
+        self.session = session
+        self.link = link
+        self.peer_ack = session.delay - 1  # last of our frames the peer confirmed
+
+    def poll(self):
+        for data in self.link.receive():
+            if not data or data[0] != PKT_INPUT or len(data) < INPUT.size:
+                continue
+            _, ack, first, count = INPUT.unpack_from(data)
+            self.peer_ack = max(self.peer_ack, ack)
+            for k, inp in enumerate(data[INPUT.size:INPUT.size + count]):
+                self.session.on_remote_input(first + k, inp)
+
+    def send_inputs(self):
+        # everything the peer has not confirmed yet, so a lost packet is covered by the next one
+        s = self.session
+        first = self.peer_ack + 1
+        last = min(s.latest_local_frame, first + MAX_INPUTS_PER_PACKET - 1)
+        if last < first:
+            return
+        local = s.inputs[s.local]
+        payload = bytes(local[f] for f in range(first, last + 1))
+        self.link.send(INPUT.pack(PKT_INPUT, s.confirmed, first, len(payload)) + payload)
+
+
+def handshake(link: UdpLink, player: int, seed: int, timeout: float = 30.0) -> int:
+    # exchange SYNC packets until both sides have heard each other; player 1's seed wins
+    deadline = time.monotonic() + timeout
+    agreed = seed if player == 0 else None
+    seen = False
+    while time.monotonic() < deadline:
+        link.send(SYNC.pack(PKT_SYNC, seed, seen))
+        for data in link.receive():
+            if data and data[0] == PKT_SYNC and len(data) >= SYNC.size:
+                _, their_seed, they_saw = SYNC.unpack_from(data)
+                seen = True
+                if player == 1:
+                    agreed = their_seed
+                if they_saw:
+                    for _ in range(5):  # make sure the peer sees us too
+                        link.send(SYNC.pack(PKT_SYNC, seed, True))
+                    return agreed
+        time.sleep(0.05)
+    raise TimeoutError("no answer from the remote peer")
+
+
+# ---------------- Loopback harness ----------------
+
+def scripted_inputs(rng: random.Random):
+    # held inputs of random length, closer to real play than per-frame noise
+    while True:
+        inp = rng.getrandbits(len(sf.ACTIONS)) & rng.getrandbits(len(sf.ACTIONS))
+        for _ in range(rng.randint(4, 30)):
+            yield inp
+
+
+def run_loopback(frames: int = 3600, latency_ms: float = 40, jitter_ms: float = 20, loss: float = 0.05,
+                 window: int = 8, input_delay: int = 2, seed: int = 1, port: int = 47000) -> dict:
+    # two peers in one process, talking UDP over localhost on a virtual 60 Hz clock
+    sprites = sf.load_sprites()
+    now = [0.0]
+    clock = lambda: now[0]
+    peers = []
+    for player in (0, 1):
+        link = UdpLink(("127.0.0.1", port + player), ("127.0.0.1", port + 1 - player),
+                       latency=latency_ms / 1000.0, jitter=jitter_ms / 1000.0, loss=loss,
+                       seed=seed * 2 + player, clock=clock)
+        _, match = sf.start_match("two", sprites, seed)
+        peers.append(NetPeer(RollbackSession(match, player, window, input_delay), link))
+    scripts = [scripted_inputs(random.Random(seed * 10 + p)) for p in (0, 1)]
+    pending = [next(scripts[0]), next(scripts[1])]
+
+    rollback_time = 0.0
+    tick = 0
+    try:
+        # run until both peers simulated and confirmed every frame
+        while any(p.session.frame < frames or p.session.confirmed < frames - 1 or p.session.rollback_from is not None
+                  for p in peers):
+            now[0] = tick / sf.FPS
+            for k, peer in enumerate(peers):
+                peer.poll()
+                if peer.session.frame < frames:
+                    t0 = time.perf_counter()
+                    if peer.session.advance(pending[k]) is not None:
+                        pending[k] = next(scripts[k])
+                    rollback_time += time.perf_counter() - t0
+                else:
+                    peer.session.rollback()
+                peer.send_inputs()
+            tick += 1
+            if tick > frames * 20:
+                raise RuntimeError("loopback did not converge")
+    finally:
+        for peer in peers:
+            peer.link.close()
+
+    a, b = (sf.snapshot(p.session.match) for p in peers)
+    result = {
+        "frames": frames,
+        "ticks": tick,
+        "in_sync": a == b,
+        "ms_per_frame": rollback_time / (2 * frames) * 1e3,
+        "sent": sum(p.link.sent for p in peers),
+        "dropped": sum(p.link.dropped for p in peers),
+    }
+    for k, peer in enumerate(peers):
+        result.update({f"p{k + 1}_{name}": v for name, v in peer.session.stats().items()})
+    return result
+
+
+def resim_cost(frames: int = 8, repeats: int = 2000, seed: int = 1) -> dict:
+    # worst case per displayed frame: restore a snapshot and re-simulate `frames` frames
+    sprites = sf.load_sprites()
+    _, match = sf.start_match("single", sprites, seed)
+    match.fighters[0].is_bot = True
+    for _ in range(120):
+        sf.step(match, 0, 0)
+    snap = sf.snapshot(match)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        sf.restore(match, snap)
+        for _ in range(frames):
+            sf.snapshot(match)
+            sf.step(match, 0, 0)
+    return {"frames": frames, "ms": (time.perf_counter() - t0) / repeats * 1e3}
+
+
+# ---------------- Online play ----------------
+
+def netplay_loop(screen, peer: NetPeer, stage: str, sprites: dict):
+    session = peer.session
+    background = sf.load_stage(stage)
+    views = sf.fighter_views(session.match, sf.load_sprites(sf.RENDER_SCALE), sf.RENDER_SCALE)
+    renderer = sf.FightRenderer(screen, background, views)
+    clock = pygame.time.Clock()
+    # local player always uses the player 1 keys, whichever side they play
+    buffer = sf.InputBuffer(sf.CONTROLS["player1"])
+    while True:
+        peer.poll()
+        local = buffer.tick(pygame.key.get_pressed(), session.match.fighters[session.local].facing_right)
+        events = session.advance(local)
+        if events is not None:
+            sf.play_events(events)
+        peer.send_inputs()
+        renderer.draw(session.match)
+        if session.match.over and session.confirmed >= session.match.tick - 1:
+            sf.show_winner(screen, session.match)
+            return
+        for event in pygame.event.get():
+            buffer.feed(event)
+            if event.type == pygame.QUIT:
+                return
+            elif event.type == pygame.VIDEOEXPOSE:
+                renderer.full_redraw = True
+        clock.tick(sf.FPS)
+
+
+def parse_addr(text: str) -> tuple:
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="School Fighter rollback netplay over UDP")
+    parser.add_argument("--player", type=int, choices=(1, 2), help="side to play (1 hosts the seed)")
+    parser.add_argument("--bind", default="127.0.0.1:47001", help="local address")
+    parser.add_argument("--remote", default="127.0.0.1:47002", help="peer address")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--window", type=int, default=8, help="max frames simulated ahead of the peer")
+    parser.add_argument("--delay", type=int, default=2, help="local input delay in frames")
+    parser.add_argument("--latency", type=float, help="simulated extra one-way latency (ms, default 0, 40 in loopback)")
+    parser.add_argument("--jitter", type=float, help="simulated jitter (ms, default 0, 20 in loopback)")
+    parser.add_argument("--loss", type=float, help="simulated packet loss (0..1, default 0, 0.05 in loopback)")
+    parser.add_argument("--loopback", action="store_true", help="run both peers headless and check they stay in sync")
+    parser.add_argument("--frames", type=int, default=3600, help="loopback length")
+    args = parser.parse_args()
+    # unset link options: a bad link for the loopback check, a clean one online; an explicit 0
+    # is kept, so the loopback can also check a clean link
+    for name, loopback, online in (("latency", 40.0, 0.0), ("jitter", 20.0, 0.0), ("loss", 0.05, 0.0)):
+        if getattr(args, name) is None:
+            setattr(args, name, loopback if args.loopback else online)
+
+    if args.loopback:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        pygame.init()
+        pygame.display.set_mode((1, 1))
+        print("resim:", resim_cost(args.window))
+        result = run_loopback(args.frames, args.latency, args.jitter, args.loss, args.window, args.delay,
+                              1 if args.seed is None else args.seed)
+        for k, v in result.items():
+            print(f"{k:>16}: {v:.4f}" if isinstance(v, float) else f"{k:>16}: {v}")
+        return 0 if result["in_sync"] else 1
+
+    if args.player is None:
+        parser.error("--player is required unless --loopback is given")
+    pygame.init()
+    try:
+        pygame.mixer.init()
+    except Exception:
+        pass
+    screen = sf.open_display()
+    pygame.display.set_caption(f"School Fighter - online, player {args.player}")
+    sf.audio_manager = sf.AudioManager(sf.SOUND_PATH, os.path.join(sf.SOUND_PATH, "background_music.mp3"))
+
+    link = UdpLink(parse_addr(args.bind), parse_addr(args.remote), args.latency / 1000.0,
+                   args.jitter / 1000.0, args.loss)
+    seed = args.seed if args.seed is not None else random.getrandbits(32)
+    seed = handshake(link, args.player - 1, seed)
+    sprites = sf.load_sprites()
+    stage, match = sf.start_match("two", sprites, seed)
+    peer = NetPeer(RollbackSession(match, args.player - 1, args.window, args.delay), link)
+    try:
+        netplay_loop(screen, peer, stage, sprites)
+    finally:
+        print(peer.session.stats())
+        link.close()
+        pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import argparse
+import glob
+import gzip
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zlib
+from collections import Counter
+
+# Aggregates the per-match telemetry files the game writes (TELEMETRY_PATH) into one
+# report: results per mode, wins per fighter slot, and what each move was worth.
+# Needs no pygame; files are read in parallel.
+
+
+def summarize(path: str) -> Counter:
+    # one file -> flat counters, summed across files by the driver
+    out = Counter(files=1)
+    mode = "?"
+    fps = 60
+    try:
+        with gzip.open(path, "rt") as fh:
+            for line in fh:
+                rec = json.loads(line)
+                kind = rec["kind"]
+                if kind == "match":
+                    mode = rec["mode"]
+                    fps = rec.get("fps", fps)
+                    out["matches:" + mode] += 1
+                elif kind == "result":
+                    out["finished:" + mode] += 1
+                    out["ticks:" + mode] += rec["ticks"]
+                    out["seconds:" + mode] += rec["ticks"] / fps
+                    winner = rec["winner"]
+                    out["win:" + ("none" if winner is None else str(winner))] += 1
+                else:
+                    out["kind:" + kind] += 1
+                    move = rec.get("move")
+                    if move is not None:
+                        out[f"{kind}:{move}"] += 1
+                        out[f"damage:{kind}:{move}"] += rec.get("v", 0)
+    except (OSError, EOFError, zlib.error, ValueError, KeyError):
+        out["torn"] += 1  # interrupted write: what was read so far still counts
+    return out
+
+
+def report(totals: Counter, elapsed: float) -> dict:
+    modes = sorted(k.split(":", 1)[1] for k in totals if k.startswith("matches:"))
+    finished = sum(totals["finished:" + m] for m in modes)
+    out = {
+        "files": totals["files"],
+        "torn": totals["torn"],
+        "seconds": elapsed,
+        "modes": {
+            m: {
+                "matches": totals["matches:" + m],
+                "finished": totals["finished:" + m],
+                "mean_ticks": totals["ticks:" + m] / max(1, totals["finished:" + m]),
+                "mean_seconds": totals["seconds:" + m] / max(1, totals["finished:" + m]),
+            }
+            for m in modes
+        },
+        "wins": {k.split(":", 1)[1]: v / max(1, finished) for k, v in sorted(totals.items()) if k.startswith("win:")},
+        "per_match": {k.split(":", 1)[1]: v / max(1, finished) for k, v in sorted(totals.items()) if k.startswith("kind:")},
+        "moves": {},
+    }
+    for key, count in sorted(totals.items()):
+        kind, _, move = key.partition(":")
+        if kind in ("attack", "hit", "block", "projectile_hit") and move:
+            entry = out["moves"].setdefault(move, {})
+            entry[kind] = count
+            if kind != "attack":
+                entry[kind + "_damage"] = totals[f"damage:{kind}:{move}"]
+    for move, entry in out["moves"].items():
+        # share of started melee attacks that connected, blocked or not (specials land as projectile_hit)
+        if entry.get("attack") and move != "special":
+            entry["landed"] = (entry.get("hit", 0) + entry.get("block", 0)) / entry["attack"]
+    return out
+
+
+def print_report(r: dict):
+    print(f"{r['files']} files ({r['torn']} torn) in {r['seconds']:.1f}s")
+    for mode, m in r["modes"].items():
+        print(f"  {mode:<8} {m['matches']:>7} matches, {m['finished']:>7} finished, "
+              f"{m['mean_seconds']:.1f}s mean length")
+    print("wins by fighter slot: " + ", ".join(f"{k}={v:.1%}" for k, v in r["wins"].items()))
+    print("per finished match: " + ", ".join(f"{k}={v:.2f}" for k, v in r["per_match"].items()))
+    for move, entry in r["moves"].items():
+        print(f"  {move:<10} " + ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                                          for k, v in entry.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate School Fighter match telemetry")
+    parser.add_argument("paths", nargs="*", default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), "telemetry")],
+                        help="telemetry files or directories (default: SchoolFighter/telemetry)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files += sorted(glob.glob(os.path.join(path, "*.jsonl.gz"))) if os.path.isdir(path) else [path]
+    t0 = time.perf_counter()
+    totals = Counter()
+    if args.workers > 1 and len(files) > 1:
+        with multiprocessing.get_context("spawn").Pool(args.workers) as pool:
+            for part in pool.imap_unordered(summarize, files, chunksize=max(1, len(files) // (args.workers * 8))):
+                totals.update(part)
+    else:
+        for path in files:
+            totals.update(summarize(path))
+    r = report(totals, time.perf_counter() - t0)
+    if args.json:
+        print(json.dumps(r, indent=2))
+    else:
+        print_report(r)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
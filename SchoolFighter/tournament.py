@@ -0,0 +1,257 @@
+import argparse
+import copy
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# headless workers: no window, no audio device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+LAUNCH_DIR = os.getcwd()  # --out is relative to where the command was run
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import pygame
+import School_fighter1 as sf
+
+# named balance knobs a sweep may override: fields of the roster data (fighters.json) for
+# every fighter ("*"). Any other roster field can be swept by its dotted path, e.g.
+# fighters.player2.bot_speed
+TUNABLES = {
+    "ATTACK_DURATION_FRAMES": ("fighters.*.actions.punch.duration", "fighters.*.actions.kick.duration",
+                               "fighters.*.actions.special.duration"),
+    "BOT_SPEED": ("fighters.*.bot_speed",),
+    "PROJECTILE_SPEED": ("projectiles.*.speed",),
+    "PUNCH_DAMAGE": ("fighters.*.actions.punch.damage",),
+    "KICK_DAMAGE": ("fighters.*.actions.kick.damage",),
+    "SPECIAL_DAMAGE": ("projectiles.*.damage",),
+}
+# roster fields bot-vs-bot matches never read: bots move at bot_speed and never jump or block
+# (so BLOCK_DIVISOR is out too). A sweep over them would only relabel identical matches
+BOT_UNREAD = ("walk_speed", "jump_velocity", "max_jumps", "block")
+MOVE_NAMES = ("punch", "kick", "special")
+# the shipped roster with bases merged in, so every fighter spells out every field
+SHIPPED = copy.deepcopy(sf.ROSTER_DATA)
+SHIPPED["fighters"] = sf.resolve_fighters(SHIPPED["fighters"])
+
+
+def field_paths(name: str) -> list:
+    return [path.split(".") for path in TUNABLES.get(name, (name,))]
+
+
+def get_field(node, path: list):
+    for key in path:
+        node = next(iter(node.values())) if key == "*" else node[key]
+    return node
+
+
+def set_field(node, path: list, value):
+    key, rest = path[0], path[1:]
+    for k in (node if key == "*" else (key,)):
+        if rest:
+            set_field(node[k], rest, value)
+        else:
+            node[k] = value
+
+
+DEFAULTS = {name: get_field(SHIPPED, field_paths(name)[0]) for name in TUNABLES}
+
+# ---------------- Worker ----------------
+_sprites = None
+_applied = None
+
+
+def init_worker():
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+
+
+def apply_params(params: dict):
+    # a tuned copy of the roster, recompiled by the next new_match()
+    global _applied
+    if params == _applied:
+        return
+    data = copy.deepcopy(SHIPPED)
+    for name, value in params.items():
+        for path in field_paths(name):
+            set_field(data, path, value)
+    sf.set_roster(data)
+    _applied = dict(params)
+
+
+def play_match(task: tuple) -> dict:
+    global _sprites
+    match_id, seed, params, max_ticks = task
+    apply_params(params)
+    if _sprites is None:
+        _sprites = sf.load_sprites()
+    m = sf.new_match("single", _sprites, seed=seed)
+    m.fighters[0].is_bot = True
+    damage = [[0] * len(MOVE_NAMES) for _ in m.fighters]
+    while not m.over and m.tick < max_ticks:
+        # a hit counts only the health it took, like batch_sim: the KO blow of 15 on 5 HP is 5
+        left = [f.health for f in m.fighters]
+        for ev in sf.step(m, 0, 0):
+            if ev[0] == "hit":
+                dealt = min(ev[3], left[ev[5]])
+                left[ev[5]] -= dealt
+                damage[ev[1]][MOVE_NAMES.index(ev[2])] += dealt
+            elif ev[0] == "projectile_hit":
+                dealt = min(ev[3], left[ev[4]])
+                left[ev[4]] -= dealt
+                damage[ev[1]][2] += dealt
+    row = {"id": match_id, "seed": seed}
+    row.update({name: params.get(name, DEFAULTS[name]) for name in TUNABLES})
+    row.update({name: value for name, value in params.items() if name not in TUNABLES})
+    # 1 / 2 = winning player, 0 = timed out
+    row["winner"] = 0 if m.winner is None else m.winner + 1
+    row["ticks"] = m.tick
+    for i in (0, 1):
+        for k, move in enumerate(MOVE_NAMES):
+            row[f"p{i + 1}_{move}"] = damage[i][k]
+    return row
+
+
+# ---------------- Driver ----------------
+
+def parse_grid(specs: list) -> dict:
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        name = name.strip()
+        if "." not in name:
+            name = name.upper()
+        try:
+            if name not in TUNABLES:
+                get_field(SHIPPED, field_paths(name)[0])
+        except (KeyError, TypeError, StopIteration):
+            raise SystemExit(f"unknown parameter {name!r}, expected one of {', '.join(TUNABLES)} "
+                             "or a roster field path") from None
+        if any(key in BOT_UNREAD for path in field_paths(name) for key in path):
+            raise SystemExit(f"{name!r} is never read in bot-vs-bot matches: bots move at bot_speed "
+                             "and never jump or block")
+        grid[name] = [int(v) for v in values.split(",") if v.strip()]
+    return grid
+
+
+def build_tasks(grid: dict, repeats: int, seed: int, max_ticks: int) -> list:
+    names = sorted(grid)
+    tasks = []
+    for combo in itertools.product(*(grid[n] for n in names)):
+        params = dict(zip(names, combo))
+        # the id names the parameters, not a grid position: a resumed sweep with a changed
+        # grid never mistakes another point's results for its own
+        key = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        for r in range(repeats):
+            # the seed depends on the repeat only: every grid point plays the same matches, so
+            # results differ by the parameters alone, and reruns replay them exactly
+            tasks.append((f"{key}#{r}", seed * 1_000_003 + r, params, max_ticks))
+    return tasks
+
+
+def result_fields(grid: dict) -> list:
+    # the columns play_match() rows have, in order
+    return (["id", "seed", *TUNABLES, *(name for name in sorted(grid) if name not in TUNABLES), "winner", "ticks"]
+            + [f"p{i}_{move}" for i in (1, 2) for move in MOVE_NAMES])
+
+
+def finished_ids(path: str, fmt: str, fields: list) -> set:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return set()
+    with open(path, newline="") as fh:
+        if fmt == "csv":
+            reader = csv.DictReader(fh)
+            if reader.fieldnames != fields:
+                raise SystemExit(f"{path} has columns {reader.fieldnames}, this sweep writes {fields}; "
+                                 "resume with the same --grid names or pick another --out")
+            # a torn last row has missing trailing fields
+            return {row["id"] for row in reader if None not in row.values()}
+        done = set()
+        for line in fh:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                pass  # torn last line from an interrupted run
+        return done
+
+
+class ResultWriter:
+    # streams rows as they arrive; appends so an interrupted sweep can resume
+    def __init__(self, path: str, fmt: str):
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        torn = False
+        if not fresh:
+            with open(path, "rb") as fh:
+                fh.seek(-1, os.SEEK_END)
+                torn = fh.read(1) != b"\n"
+        self.fh = open(path, "a", newline="")
+        if torn:
+            self.fh.write("\n")  # keep the interrupted line from swallowing the next row
+        self.fmt = fmt
+        self.csv = None
+        self.fresh = fresh
+
+    def write(self, row: dict):
+        if self.fmt == "csv":
+            if self.csv is None:
+                self.csv = csv.DictWriter(self.fh, fieldnames=list(row))
+                if self.fresh:
+                    self.csv.writeheader()
+            self.csv.writerow(row)
+        else:
+            self.fh.write(json.dumps(row) + "\n")
+        self.fh.flush()
+
+    def close(self):
+        self.fh.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless bot-vs-bot balance tournament")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=v1,v2",
+                        help=f"parameter values to sweep, any of: {', '.join(TUNABLES)}, "
+                             "or a roster field such as fighters.player2.bot_speed")
+    parser.add_argument("--repeats", type=int, default=100, help="matches per grid point")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-ticks", type=int, default=sf.FPS * 120)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--out", default="tournament.jsonl", help="results file (.jsonl or .csv)")
+    args = parser.parse_args()
+    args.out = os.path.join(LAUNCH_DIR, args.out)
+
+    fmt = "csv" if args.out.endswith(".csv") else "jsonl"
+    grid = parse_grid(args.grid)
+    tasks = build_tasks(grid, args.repeats, args.seed, args.max_ticks)
+    done = finished_ids(args.out, fmt, result_fields(grid))
+    todo = [t for t in tasks if t[0] not in done]
+    print(f"{len(tasks)} matches, {len(tasks) - len(todo)} already in {args.out}, {args.workers} workers")
+
+    writer = ResultWriter(args.out, fmt)
+    t0 = time.perf_counter()
+    n = 0
+    # spawn, not fork: SDL state does not survive fork() cleanly
+    pool = multiprocessing.get_context("spawn").Pool(args.workers, initializer=init_worker)
+    try:
+        # tasks of one grid point are adjacent, so chunks rarely re-apply parameters
+        chunk = max(1, min(32, len(todo) // (args.workers * 8) or 1))
+        for row in pool.imap_unordered(play_match, todo, chunksize=chunk):
+            writer.write(row)
+            n += 1
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        print(f"interrupted after {n} matches; rerun the same command to resume")
+        return 1
+    finally:
+        pool.join()
+        writer.close()
+    elapsed = time.perf_counter() - t0
+    print(f"{n} matches in {elapsed:.1f}s ({n / max(elapsed, 1e-9):.0f} matches/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())